@@ -9,9 +9,15 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from pydantic import BaseModel
 
+from .logging_config import setup_logging
+from .metricas import instrumentar_app
+from .rastreamento import configurar_rastreamento, rastrear_app
+
 # --- Configuração ---
 # Carregamos os segredos e configurações a partir das variáveis de ambiente definidas no .env
+# Com SECRET_KEY_FILE, a chave é lida do arquivo a cada token emitido, para acompanhar as rotações
 SECRET_KEY = os.getenv("SECRET_KEY")
+SECRET_KEY_FILE = os.getenv("SECRET_KEY_FILE")
 ALGORITHM = os.getenv("JWT_ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 # O token expirará em 60 minutos (1 hora)
 
@@ -22,11 +28,15 @@ class Token(BaseModel):
     token_type: str
 
 # --- Instância do FastAPI ---
+setup_logging("auth-service")
+configurar_rastreamento("auth-service")
 app = FastAPI(
     title="Auth Service",
     description="Serviço para autenticação e geração de tokens JWT.",
     version="1.0.0"
 )
+instrumentar_app(app)
+rastrear_app(app)
 
 # --- Funções de Lógica de Negócio ---
 
@@ -58,7 +68,11 @@ def create_access_token(data: dict):
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     # Codifica o token com nosso payload, chave secreta e algoritmo
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    secret_key = SECRET_KEY
+    if SECRET_KEY_FILE:
+        with open(SECRET_KEY_FILE) as f:
+            secret_key = f.read().strip()
+    encoded_jwt = jwt.encode(to_encode, secret_key, algorithm=ALGORITHM)
     return encoded_jwt
 
 # --- Endpoint da API ---
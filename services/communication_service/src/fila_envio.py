@@ -0,0 +1,92 @@
+# Em services/communication_service/src/fila_envio.py
+
+import asyncio
+import logging
+import os
+import time
+
+from opentelemetry import context, trace
+
+from .metricas import ENVIO_NOTIFICACAO, FALHAS_NOTIFICACAO
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+# Configuração da fila interna de envio em lote
+NOTIFICACOES_LOTE = int(os.getenv("NOTIFICACOES_LOTE", "500"))
+NOTIFICACOES_FILA_MAX = int(os.getenv("NOTIFICACOES_FILA_MAX", "20"))  # Lotes aguardando envio
+NOTIFICACOES_WORKERS = int(os.getenv("NOTIFICACOES_WORKERS", "4"))
+
+async def entregar(paciente_id: str, mensagem: str):
+    """Entrega (simulada) de uma notificação ao paciente."""
+    logger.info("Notificação para o paciente %s: \"%s\"", paciente_id, mensagem)
+
+class FilaEnvio:
+    """
+    Fila assíncrona interna para o envio em lote. Os endpoints colocam lotes de
+    notificações na fila e recebem um Future que é resolvido quando o lote inteiro
+    foi entregue; alguns workers no event loop consomem a fila. Como a fila é
+    limitada, um cliente que manda mais rápido do que conseguimos entregar é
+    freado pelo próprio 'await' de enfileirar.
+    """
+
+    def __init__(self, tamanho_max: int = NOTIFICACOES_FILA_MAX, workers: int = NOTIFICACOES_WORKERS):
+        self.tamanho_max = tamanho_max
+        self.n_workers = workers
+        self._fila: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+
+    async def enfileirar(self, notificacoes: list) -> asyncio.Future:
+        """Coloca um lote [(paciente_id, mensagem)] na fila. O Future devolve quantas foram entregues."""
+        concluido = asyncio.get_running_loop().create_future()
+        # O worker entrega o lote dentro do trace da requisição que o enfileirou
+        await self._fila.put((notificacoes, concluido, context.get_current()))
+        return concluido
+
+    async def _processar(self):
+        while True:
+            notificacoes, concluido, contexto = await self._fila.get()
+            span = tracer.start_span("fila_envio.entregar_lote", context=contexto,
+                                     attributes={"notificacoes.quantidade": len(notificacoes)})
+            try:
+                for paciente_id, mensagem in notificacoes:
+                    inicio = time.perf_counter()
+                    try:
+                        await entregar(paciente_id, mensagem)
+                    except Exception:
+                        FALHAS_NOTIFICACAO.inc()
+                        raise
+                    finally:
+                        ENVIO_NOTIFICACAO.observe(time.perf_counter() - inicio)
+                if not concluido.done():
+                    concluido.set_result(len(notificacoes))
+            except Exception as e:
+                logger.error("Erro ao entregar um lote de %s notificações: %s", len(notificacoes), e)
+                span.record_exception(e)
+                span.set_status(trace.StatusCode.ERROR)
+                if not concluido.done():
+                    concluido.set_exception(e)
+            finally:
+                span.end()
+                self._fila.task_done()
+
+    def iniciar(self):
+        """Cria a fila e os workers no event loop corrente. Chamado no startup do app."""
+        if self._workers:
+            return
+        self._fila = asyncio.Queue(maxsize=self.tamanho_max)
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._processar()) for _ in range(self.n_workers)]
+
+    async def parar(self):
+        """Espera os lotes já aceitos serem entregues e encerra os workers."""
+        if not self._workers:
+            return
+        await self._fila.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+# Instância única do processo
+fila_envio = FilaEnvio()
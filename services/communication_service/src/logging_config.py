@@ -0,0 +1,174 @@
+# Em services/communication_service/src/logging_config.py
+# O mesmo arquivo está em src/ de cada serviço (auth, regulation, review e
+# communication); mantenha as cópias iguais.
+"""
+Logging estruturado e fora da thread da requisição.
+
+setup_logging(servico) instala no logger raiz um QueueHandler: quem loga só
+enfileira o registro, e uma thread (QueueListener) formata e escreve no stdout.
+A mensagem é montada só nessa thread, então use a formatação preguiçosa do
+logging (logger.info("Oferta %s reservada", oferta_id)) em vez de f-strings, e
+passe valores simples (ids, números, textos), não objetos do ORM, que podem
+mudar ou ir ao banco antes de serem formatados.
+
+Cada módulo usa o próprio logger (logging.getLogger(__name__)), o que permite
+ajustar o nível por módulo. Variáveis de ambiente:
+    LOG_NIVEL       nível do logger raiz (padrão INFO)
+    LOG_NIVEIS      níveis por módulo, ex.: "src.agent=WARNING,sqlalchemy.engine=INFO"
+    LOG_AMOSTRAGEM  fração das linhas abaixo de WARNING mantidas, por módulo,
+                    ex.: "src.agent=0.05,src.fila_envio=0.01" (avisos e erros nunca são amostrados)
+    LOG_FORMATO     json (padrão, uma linha JSON por registro) ou texto
+    LOG_FILA_MAX    tamanho máximo da fila (padrão 10000); com a fila cheia o
+                    registro é descartado em vez de segurar a requisição
+Cada linha JSON leva o trace_id/span_id do span corrente, quando houver.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from opentelemetry import trace
+
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+LOG_NIVEIS = os.getenv("LOG_NIVEIS", "")
+LOG_AMOSTRAGEM = os.getenv("LOG_AMOSTRAGEM", "")
+LOG_FORMATO = os.getenv("LOG_FORMATO", "json").lower()
+LOG_FILA_MAX = int(os.getenv("LOG_FILA_MAX", "10000"))
+
+FORMATO_TEXTO = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Atributos que todo LogRecord tem; o resto veio de extra={...} e vai para o JSON
+_ATRIBUTOS_PADRAO = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "trace_id", "span_id"}
+
+def _pares(texto: str):
+    """'a=1,b=2' -> {'a': '1', 'b': '2'}"""
+    pares = {}
+    for item in texto.split(","):
+        if "=" in item:
+            nome, valor = item.split("=", 1)
+            pares[nome.strip()] = valor.strip()
+    return pares
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por registro."""
+
+    def __init__(self, servico: str | None = None):
+        super().__init__()
+        self.servico = servico
+
+    def format(self, record):
+        dados = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensagem": record.getMessage(),
+        }
+        if self.servico:
+            dados["servico"] = self.servico
+        if getattr(record, "trace_id", None):
+            dados["trace_id"] = record.trace_id
+            dados["span_id"] = record.span_id
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO:
+                dados[chave] = valor
+        if record.exc_info:
+            dados["excecao"] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+class FiltroAmostragem(logging.Filter):
+    """Mantém só uma fração das linhas abaixo de WARNING dos módulos configurados."""
+
+    def __init__(self, taxas: dict):
+        super().__init__()
+        self.taxas = taxas
+        self._por_logger = {}
+
+    def _taxa(self, nome: str) -> float:
+        taxa = self._por_logger.get(nome)
+        if taxa is None:
+            # A configuração de "src" vale para "src.agent", como nos níveis do logging
+            taxa, partes = 1.0, nome.split(".")
+            for i in range(len(partes), 0, -1):
+                prefixo = ".".join(partes[:i])
+                if prefixo in self.taxas:
+                    taxa = self.taxas[prefixo]
+                    break
+            self._por_logger[nome] = taxa
+        return taxa
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        taxa = self._taxa(record.name)
+        return taxa >= 1.0 or random.random() < taxa
+
+class FiltroContexto(logging.Filter):
+    """Anota o registro com o trace corrente (precisa rodar na thread de quem loga)."""
+
+    def filter(self, record):
+        contexto = trace.get_current_span().get_span_context()
+        if contexto.is_valid:
+            record.trace_id = format(contexto.trace_id, "032x")
+            record.span_id = format(contexto.span_id, "016x")
+        return True
+
+class HandlerFila(QueueHandler):
+    """
+    QueueHandler que não formata nada na thread de quem loga: o registro vai
+    para a fila como está e a mensagem é montada pelo QueueListener.
+    """
+
+    descartados = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            HandlerFila.descartados += 1
+
+_handler = None
+_listener = None
+
+def _parar():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def setup_logging(servico: str | None = None):
+    """Configura o logger raiz (pode ser chamada de novo; a configuração anterior é trocada)."""
+    global _handler, _listener
+
+    logger = logging.getLogger()
+    _parar()
+    if _handler is not None:
+        logger.removeHandler(_handler)
+
+    logger.setLevel(LOG_NIVEL)
+    for nome, nivel in _pares(LOG_NIVEIS).items():
+        logging.getLogger(nome).setLevel(nivel.upper())
+
+    # Quem escreve de fato é a thread do listener
+    saida = logging.StreamHandler(sys.stdout)
+    saida.setFormatter(FormatadorJSON(servico) if LOG_FORMATO == "json" else logging.Formatter(FORMATO_TEXTO))
+
+    _handler = HandlerFila(queue.Queue(maxsize=LOG_FILA_MAX))
+    _handler.addFilter(FiltroAmostragem({nome: float(taxa) for nome, taxa in _pares(LOG_AMOSTRAGEM).items()}))
+    _handler.addFilter(FiltroContexto())
+    logger.addHandler(_handler)
+
+    _listener = QueueListener(_handler.queue, saida, respect_handler_level=True)
+    _listener.start()
+    return logger
+
+# Esvazia a fila ao sair do processo
+atexit.register(_parar)
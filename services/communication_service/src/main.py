@@ -1,23 +1,44 @@
 # Cole este código final em services/communication_service/src/main.py
 
+import asyncio
+import json
 import logging
 from typing import Annotated
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
+from pydantic import ValidationError
 import os
 
 # Nossas importações de segurança
 from . import security
 from .schemas import NotificationRequest
+from .fila_envio import entregar, fila_envio, NOTIFICACOES_FILA_MAX, NOTIFICACOES_LOTE
+from .metricas import instrumentar_app
+from .rastreamento import configurar_rastreamento, rastrear_app
+from .logging_config import setup_logging
 
-# Configuração básica de logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging("communication-service")
 logger = logging.getLogger(__name__)
 
+configurar_rastreamento("communication-service")
 app = FastAPI(
     title="Communication Service",
     description="Serviço para enviar notificações simuladas aos pacientes.",
     version="1.0.0"
 )
+instrumentar_app(app)
+rastrear_app(app)
+security.instrumentar_recarga_chaves(app)
+
+@app.on_event("startup")
+async def on_startup():
+    security.carregar_chaves()
+    fila_envio.iniciar()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await fila_envio.parar()
 '''
 @app.get("/debug-env")
 def debug_environment():
@@ -46,11 +67,180 @@ async def send_notification(
     current_user = auth_info["payload"]
     
     # A CORREÇÃO ESTÁ AQUI: Acessamos o atributo '.username' diretamente
-    logger.info(f"Notificação solicitada pelo usuário autenticado: '{current_user.username}'")
-    
-    logger.info(f"--- SIMULANDO ENVIO DE NOTIFICAÇÃO ---")
-    logger.info(f"Para: Paciente ID {request.paciente_id}")
-    logger.info(f"Mensagem: \"{request.mensagem}\"")
-    logger.info(f"------------------------------------")
+    logger.info("Notificação solicitada pelo usuário autenticado: '%s'", current_user.username)
+
+    # Mesma entrega (simulada) do envio em lote: uma linha, amostrável em LOG_AMOSTRAGEM
+    await entregar(request.paciente_id, request.mensagem)
     
-    return {"status": "success", "message": "Notification processed."}
\ No newline at end of file
+    return {"status": "success", "message": "Notification processed."}
+
+# Corpo máximo do envio em lote; acima dele a leitura para e o excedente é rejeitado
+NOTIFICACOES_CORPO_MAX_BYTES = int(os.getenv("NOTIFICACOES_CORPO_MAX_BYTES", str(64 * 1024 * 1024)))
+
+CORPO_INVALIDO = "Corpo inválido: envie um array JSON ou NDJSON."
+CORPO_MUITO_GRANDE = f"Corpo maior que o limite de {NOTIFICACOES_CORPO_MAX_BYTES} bytes."
+
+class RespostaDuplex(StreamingResponse):
+    """
+    StreamingResponse cujo gerador lê o próprio corpo da requisição
+    (request.stream()) enquanto a resposta é enviada. A StreamingResponse
+    comum escuta a desconexão do cliente lendo o receive em paralelo, o que
+    roubaria as mensagens do corpo; aqui a desconexão chega pelo próprio
+    request.stream(), como ClientDisconnect.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+def _e_ndjson(request: Request) -> bool:
+    content_type = request.headers.get("content-type", "")
+    return "ndjson" in content_type or "jsonlines" in content_type
+
+async def _ler_corpo(request: Request):
+    """
+    Pedaços do corpo, conforme chegam. Ao passar de NOTIFICACOES_CORPO_MAX_BYTES,
+    entrega o que cabe no limite e levanta HTTPException 413.
+    """
+    lidos = 0
+    async for pedaco in request.stream():
+        if lidos + len(pedaco) > NOTIFICACOES_CORPO_MAX_BYTES:
+            yield pedaco[:NOTIFICACOES_CORPO_MAX_BYTES - lidos]
+            raise HTTPException(status_code=413, detail=CORPO_MUITO_GRANDE)
+        lidos += len(pedaco)
+        yield pedaco
+
+async def _ler_ndjson(request: Request):
+    """Gera (índice, linha) do corpo NDJSON, linha a linha, conforme chega."""
+    indice = 0
+    resto = b""
+    async for pedaco in _ler_corpo(request):
+        *linhas, resto = (resto + pedaco).split(b"\n")
+        for linha in linhas:
+            if linha.strip():
+                yield indice, linha
+                indice += 1
+    if resto.strip():
+        yield indice, resto
+
+async def _ler_array(request: Request) -> list:
+    """Itens de um corpo em array JSON, que só pode ser interpretado inteiro."""
+    corpo = b"".join([pedaco async for pedaco in _ler_corpo(request)])
+    try:
+        itens = json.loads(corpo)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=CORPO_INVALIDO)
+    if not isinstance(itens, list):
+        raise HTTPException(status_code=400, detail=CORPO_INVALIDO)
+    return itens
+
+async def _enumerar(itens: list):
+    for indice, item in enumerate(itens):
+        yield indice, item
+
+def _descrever_erro(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, erro['loc'])) or 'item'}: {erro['msg']}" for erro in e.errors())
+
+async def _confirmar(numero: int, inicio: int, quantidade: int, rejeitadas: list, concluido):
+    """Confirmação (dict) de um lote, esperando a entrega dele terminar."""
+    confirmacao = {"lote": numero, "inicio": inicio, "quantidade": quantidade,
+                   "enviadas": 0, "rejeitadas": rejeitadas}
+    if concluido is not None:
+        try:
+            confirmacao["enviadas"] = await concluido
+        except Exception as e:
+            confirmacao["erro"] = str(e)
+    return confirmacao
+
+async def _enviar_e_confirmar(itens, usuario: str):
+    """
+    Consome os itens (índice, item) conforme chegam: valida, agrupa em lotes de
+    NOTIFICACOES_LOTE e enfileira cada lote na fila de envio. Emite (NDJSON) a
+    confirmação de cada lote, na ordem, assim que ele é entregue, enquanto o
+    resto do corpo ainda está sendo lido, e um resumo no fim. Só o lote em
+    montagem fica em memória, além dos que já estão na fila (limitada) de envio.
+    """
+    # Lotes enfileirados, na ordem: (número, início, quantidade, rejeitadas, Future ou None); None no fim.
+    # Limitada como a fila de envio: se o cliente não lê as confirmações, a leitura do corpo também para.
+    pendentes = asyncio.Queue(maxsize=NOTIFICACOES_FILA_MAX)
+    resumo = {"resumo": True, "lotes": 0, "enviadas": 0, "rejeitadas": 0}
+
+    async def _ler():
+        recebidas = 0
+        lote, rejeitadas, inicio = [], [], 0
+
+        async def _fechar_lote(fim: int):
+            concluido = await fila_envio.enfileirar(lote) if lote else None
+            await pendentes.put((resumo["lotes"], inicio, fim - inicio, rejeitadas, concluido))
+            resumo["lotes"] += 1
+
+        try:
+            async for indice, item in itens:
+                recebidas = indice + 1
+                try:
+                    if isinstance(item, bytes):
+                        notificacao = NotificationRequest.model_validate_json(item)
+                    else:
+                        notificacao = NotificationRequest.model_validate(item)
+                    lote.append((notificacao.paciente_id, notificacao.mensagem))
+                except ValidationError as e:
+                    rejeitadas.append({"indice": indice, "erro": _descrever_erro(e)})
+
+                if recebidas - inicio >= NOTIFICACOES_LOTE:
+                    await _fechar_lote(recebidas)
+                    lote, rejeitadas, inicio = [], [], recebidas
+        except HTTPException as e:
+            # A resposta já começou: o erro vai no resumo, e o que já foi lido segue para entrega
+            resumo["erro"] = e.detail
+        except ClientDisconnect:
+            resumo["erro"] = "O cliente desconectou antes do fim do corpo."
+            logger.warning("Envio em lote de '%s' interrompido: o cliente desconectou.", usuario)
+        try:
+            if lote or rejeitadas:
+                await _fechar_lote(recebidas)
+        finally:
+            await pendentes.put(None)
+        logger.info("Lote recebido de '%s': %s notificações em %s lotes.", usuario, recebidas, resumo["lotes"])
+
+    leitura = asyncio.create_task(_ler())
+    try:
+        while (pendente := await pendentes.get()) is not None:
+            confirmacao = await _confirmar(*pendente)
+            resumo["enviadas"] += confirmacao["enviadas"]
+            resumo["rejeitadas"] += len(confirmacao["rejeitadas"])
+            yield json.dumps(confirmacao, ensure_ascii=False) + "\n"
+        await leitura
+    finally:
+        # Resposta interrompida: para de ler o corpo (os lotes já enfileirados são entregues)
+        leitura.cancel()
+    yield json.dumps(resumo, ensure_ascii=False) + "\n"
+
+@app.post("/notifications/send-batch")
+async def send_notifications_batch(
+    request: Request,
+    auth_info: dict = Depends(security.get_current_user)
+):
+    """
+    Recebe várias notificações numa só chamada, como array JSON ou NDJSON
+    (Content-Type: application/x-ndjson). O token é validado uma única vez.
+    A resposta é NDJSON, com uma confirmação por lote de NOTIFICACOES_LOTE
+    (incluindo os itens rejeitados na validação) e um resumo no fim.
+    Em NDJSON o corpo é lido enquanto a resposta é enviada: cada lote é
+    enfileirado assim que se completa e confirmado assim que é entregue.
+    O corpo é limitado a NOTIFICACOES_CORPO_MAX_BYTES (413 quando o
+    Content-Length já passa do limite; no meio do NDJSON, a leitura para e o
+    erro vai no resumo).
+    """
+    current_user = auth_info["payload"]
+    logger.info("Envio em lote solicitado pelo usuário autenticado: '%s'", current_user.username)
+
+    tamanho = request.headers.get("content-length")
+    if tamanho is not None and tamanho.isdigit() and int(tamanho) > NOTIFICACOES_CORPO_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=CORPO_MUITO_GRANDE)
+
+    if _e_ndjson(request):
+        itens = _ler_ndjson(request)
+    else:
+        itens = _enumerar(await _ler_array(request))
+    return RespostaDuplex(_enviar_e_confirmar(itens, current_user.username), media_type="application/x-ndjson")
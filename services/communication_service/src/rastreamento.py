@@ -0,0 +1,83 @@
+# Em services/communication_service/src/rastreamento.py
+# O mesmo arquivo está em src/ de cada serviço (auth, regulation, review e
+# communication); mantenha as cópias iguais.
+"""
+Rastreamento distribuído (OpenTelemetry).
+
+    configurar_rastreamento(servico) liga o exportador escolhido em RASTREAMENTO_EXPORTADOR
+    rastrear_app(app)                um span por requisição, continuando o traceparent recebido
+    rastrear_engine(engine)          um span por comando SQL
+    rastrear_cliente(client)         um span por chamada httpx, enviando o traceparent adiante
+
+RASTREAMENTO_EXPORTADOR:
+    nenhum   (padrão) nada é instalado; os spans manuais não custam quase nada
+    arquivo  um span por linha, em JSON, em RASTREAMENTO_ARQUIVO, para inspeção offline
+    otlp     OTLP/HTTP para um coletor (OTEL_EXPORTER_OTLP_ENDPOINT, padrão http://localhost:4318)
+RASTREAMENTO_AMOSTRAGEM: fração dos traces iniciados aqui que são gravados (padrão 1.0);
+um trace que chega com traceparent segue a decisão de quem o iniciou.
+"""
+
+import os
+
+from opentelemetry import context, propagate, trace
+
+RASTREAMENTO_EXPORTADOR = os.getenv("RASTREAMENTO_EXPORTADOR", "nenhum").lower()
+RASTREAMENTO_ARQUIVO = os.getenv("RASTREAMENTO_ARQUIVO", "rastros.jsonl")
+RASTREAMENTO_AMOSTRAGEM = float(os.getenv("RASTREAMENTO_AMOSTRAGEM", "1.0"))
+
+# Rotas de infraestrutura que não geram traces
+ROTAS_IGNORADAS = "metrics,saude,pronto"
+
+def ativo() -> bool:
+    return RASTREAMENTO_EXPORTADOR in ("arquivo", "otlp")
+
+def configurar_rastreamento(servico: str):
+    """Instala o TracerProvider com o exportador configurado. Sem exportador, não faz nada."""
+    if not ativo():
+        return
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    provedor = TracerProvider(
+        resource=Resource.create({"service.name": servico}),
+        sampler=ParentBased(TraceIdRatioBased(RASTREAMENTO_AMOSTRAGEM)),
+    )
+    if RASTREAMENTO_EXPORTADOR == "arquivo":
+        arquivo = open(RASTREAMENTO_ARQUIVO, "a", encoding="utf-8", buffering=1)
+        exportador = ConsoleSpanExporter(out=arquivo, formatter=lambda span: span.to_json(indent=None) + "\n")
+    else:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exportador = OTLPSpanExporter()
+    provedor.add_span_processor(BatchSpanProcessor(exportador))
+    trace.set_tracer_provider(provedor)
+
+def rastrear_app(app):
+    if ativo():
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+        # Sem os spans de cada leitura/escrita do ASGI: só o da requisição
+        FastAPIInstrumentor.instrument_app(app, excluded_urls=ROTAS_IGNORADAS, exclude_spans=["receive", "send"])
+
+def rastrear_engine(engine):
+    """Spans dos comandos SQL da engine (para uma AsyncEngine, a engine síncrona por baixo dela)."""
+    if ativo():
+        from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+        SQLAlchemyInstrumentor().instrument(engine=getattr(engine, "sync_engine", engine))
+
+def rastrear_cliente(client):
+    if ativo():
+        from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+        HTTPXClientInstrumentor.instrument_client(client)
+
+def traceparent_atual() -> str | None:
+    """Cabeçalho traceparent do span corrente, para continuar o trace depois (ex.: na outbox)."""
+    portador = {}
+    propagate.inject(portador)
+    return portador.get("traceparent")
+
+def contexto_de(traceparent: str | None):
+    """Contexto OpenTelemetry a partir de um traceparent guardado (o contexto vazio se não houver)."""
+    if not traceparent:
+        return context.Context()
+    return propagate.extract({"traceparent": traceparent})
@@ -0,0 +1,111 @@
+# Em services/regulation_service/benchmarks/contagem_consultas.py
+"""
+Verificação do número de comandos SQL por aprovação.
+
+Aprova solicitações pelo endpoint real (PUT /solicitacoes/{id}/status com
+status ACEITA) e conta os comandos SQL emitidos em cada requisição. Falha
+(código de saída != 0) se alguma aprovação passar do limite, para que um
+N+1 reintroduzido no caminho ACEITA -> marcação -> notificação apareça logo.
+
+Unidades e procedimentos vêm do cache de referência, então os comandos esperados
+com o inventário carregado, quando a primeira oferta tentada tem vaga, são:
+    1. SELECT da solicitação
+    2. SELECT das k ofertas candidatas
+    3. UPDATE ... RETURNING que reserva a vaga
+    4. INSERT da marcação
+    5. INSERT da notificação na outbox
+    6. UPDATE da solicitação
+Sem o inventário, o agente faz mais um SELECT para buscar as ofertas candidatas.
+
+Uso (a partir de services/regulation_service; precisa do pacote aiosqlite para SQLite):
+    python -m benchmarks.contagem_consultas
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+import httpx
+from jose import jwt
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.bench_async import url_async
+from benchmarks.bench_reserva import preparar_banco
+
+# Limite de comandos SQL por aprovação (com e sem o inventário em memória)
+CONSULTAS_POR_APROVACAO = 6
+CONSULTAS_POR_APROVACAO_SEM_INVENTARIO = 7
+
+async def _aprovar(app, ids, comandos):
+    token = jwt.encode({"sub": "contagem"}, os.environ["SECRET_KEY"], algorithm=os.environ["JWT_ALGORITHM"])
+    headers = {"Authorization": f"Bearer {token}"}
+    por_aprovacao = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://teste") as client:
+        for solicitacao_id in ids:
+            comandos.clear()
+            resposta = await client.put(f"/solicitacoes/{solicitacao_id}/status", json={"status": "ACEITA"}, headers=headers)
+            resposta.raise_for_status()
+            por_aprovacao.append((solicitacao_id, resposta.json()["status"], list(comandos)))
+    return por_aprovacao
+
+def rodar(url, n_aprovacoes, com_inventario):
+    os.environ.setdefault("SECRET_KEY", "contagem-consultas")
+    os.environ.setdefault("JWT_ALGORITHM", "HS256")
+    from src import main
+    from src.inventario import inventario
+    from src.referencias import referencias
+
+    preparar_banco(url, n_ofertas=200, vagas_por_oferta=4, n_solicitacoes=n_aprovacoes, seed=42)
+
+    engine_sync = create_engine(url)
+    db = sessionmaker(bind=engine_sync)()
+    referencias.carregar(db)
+    if com_inventario:
+        inventario.sincronizar(db)
+    else:
+        inventario.pronto = False
+    db.close()
+
+    engine = create_async_engine(url_async(url))
+    comandos = []
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, sql, params, context, executemany: comandos.append(sql.split()[0]))
+    Session = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def get_db():
+        async with Session() as sessao:
+            yield sessao
+
+    main.app.dependency_overrides[main.get_db] = get_db
+    try:
+        return asyncio.run(_aprovar(main.app, range(1, n_aprovacoes + 1), comandos))
+    finally:
+        main.app.dependency_overrides.clear()
+        engine_sync.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Conta os comandos SQL emitidos por aprovação de solicitação.")
+    parser.add_argument("--url", default="sqlite:///bench_consultas.db", help="URL SQLAlchemy síncrona do banco de teste (será recriado!)")
+    parser.add_argument("--aprovacoes", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    falhou = False
+    for com_inventario, limite in ((True, CONSULTAS_POR_APROVACAO), (False, CONSULTAS_POR_APROVACAO_SEM_INVENTARIO)):
+        resultados = rodar(args.url, args.aprovacoes, com_inventario)
+        maximo = max(len(comandos) for _, _, comandos in resultados)
+        print(f"inventário={'sim' if com_inventario else 'não'}  máximo de comandos por aprovação: {maximo} (limite {limite})")
+        for solicitacao_id, status, comandos in resultados:
+            if len(comandos) > limite:
+                falhou = True
+                print(f"  solicitação {solicitacao_id} ({status}): {len(comandos)} comandos -> {' '.join(comandos)}")
+
+    if falhou:
+        sys.exit("ERRO: alguma aprovação passou do limite de comandos SQL.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# Em services/regulation_service/benchmarks/verificar_listagens.py
+"""
+Verificação das listagens paginadas (GET /solicitacoes, /ofertas e /marcacoes).
+
+Recria o banco pelas migrações e o semeia com os dados de demonstração
+(src.inicializacao.semear, o mesmo do regulation_init), cujas ofertas não têm
+horário. Cria e aprova algumas solicitações pelo endpoint real e percorre cada
+listagem página a página, seguindo o proximo_cursor. Falha (código de saída
+!= 0) se alguma página não responder 200, se a ordem da listagem não for a
+esperada ou se o total de linhas não bater com o banco.
+
+Uso (a partir de services/regulation_service; precisa do pacote aiosqlite para SQLite):
+    python -m benchmarks.verificar_listagens
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+import httpx
+from jose import jwt
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.bench_async import url_async
+from benchmarks.explain_indices import recriar
+from src import models
+from src.inicializacao import semear
+
+# Listagem -> (modelo contado no banco, chave de ordenação de cada item, ordem decrescente?)
+LISTAGENS = {
+    "/solicitacoes": (models.Solicitacao, lambda item: item["id"], True),
+    "/ofertas": (models.OfertaProgramada, lambda item: (item["data_agendamento"], item["id"]), False),
+    "/marcacoes": (models.Marcacao, lambda item: item["id"], True),
+}
+
+async def _percorrer(client, headers, rota, limite):
+    """Todas as páginas de uma listagem. Retorna (itens, páginas) ou levanta RuntimeError na primeira resposta com erro."""
+    itens, paginas, cursor = [], 0, None
+    while True:
+        params = {"limite": limite}
+        if cursor:
+            params["cursor"] = cursor
+        resposta = await client.get(rota, params=params, headers=headers)
+        if resposta.status_code != 200:
+            raise RuntimeError(f"{rota} (página {paginas + 1}): {resposta.status_code} {resposta.text[:300]}")
+        pagina = resposta.json()
+        itens += pagina["itens"]
+        paginas += 1
+        cursor = pagina["proximo_cursor"]
+        if cursor is None:
+            return itens, paginas
+
+async def _verificar(app, n_solicitacoes, limite):
+    token = jwt.encode({"sub": "listagens"}, os.environ["SECRET_KEY"], algorithm=os.environ["JWT_ALGORITHM"])
+    headers = {"Authorization": f"Bearer {token}"}
+    resultados = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://teste") as client:
+        for i in range(n_solicitacoes):
+            resposta = await client.post("/solicitacoes", headers=headers, json={
+                "paciente_id": f"PACIENTE_{i}", "unidade_solicitante_id_cnes": f"CNES_{i % 10 + 1}",
+                "procedimento_id": f"PROC_{i % 4 + 1}",
+            })
+            resposta.raise_for_status()
+            if i % 2 == 0:
+                resposta = await client.put(f"/solicitacoes/{resposta.json()['id']}/status",
+                                            json={"status": "ACEITA"}, headers=headers)
+                resposta.raise_for_status()
+        for rota in LISTAGENS:
+            resultados[rota] = await _percorrer(client, headers, rota, limite)
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description="Percorre as listagens paginadas sobre os dados de demonstração.")
+    parser.add_argument("--url", default="sqlite:///bench_listagens.db", help="URL SQLAlchemy síncrona do banco de teste (será recriado!)")
+    parser.add_argument("--solicitacoes", type=int, default=40)
+    parser.add_argument("--limite", type=int, default=7, help="Itens por página (pequeno, para forçar várias páginas)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SECRET_KEY", "verificar-listagens")
+    os.environ.setdefault("JWT_ALGORITHM", "HS256")
+    from src import main as servico
+    from src.inventario import inventario
+    from src.referencias import referencias
+
+    recriar(args.url)
+    semear(args.url)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    engine_sync = create_engine(args.url)
+    with engine_sync.connect() as conexao:
+        sem_horario = conexao.execute(select(func.count()).where(models.OfertaProgramada.horario.is_(None))).scalar()
+    db = sessionmaker(bind=engine_sync)()
+    referencias.carregar(db)
+    inventario.sincronizar(db)
+    db.close()
+
+    engine = create_async_engine(url_async(args.url))
+    Session = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def get_db():
+        async with Session() as sessao:
+            yield sessao
+
+    servico.app.dependency_overrides[servico.get_db] = get_db
+    try:
+        resultados = asyncio.run(_verificar(servico.app, args.solicitacoes, args.limite))
+    except RuntimeError as e:
+        sys.exit(f"ERRO: {e}")
+    finally:
+        servico.app.dependency_overrides.clear()
+
+    print(f"ofertas sem horário nos dados de demonstração: {sem_horario}")
+    falhas = []
+    with engine_sync.connect() as conexao:
+        for rota, (itens, paginas) in resultados.items():
+            modelo, chave, decrescente = LISTAGENS[rota]
+            total = conexao.execute(select(func.count()).select_from(modelo)).scalar()
+            chaves = [chave(item) for item in itens]
+            ordenada = chaves == sorted(chaves, reverse=decrescente) and len(set(chaves)) == len(chaves)
+            print(f"{'ok  ' if ordenada and len(itens) == total else 'FALHA'} {rota}: {len(itens)} itens "
+                  f"(banco: {total}) em {paginas} páginas")
+            if not ordenada or len(itens) != total:
+                falhas.append(rota)
+    engine_sync.dispose()
+
+    if falhas:
+        sys.exit(f"ERRO: listagem incompleta ou fora de ordem: {', '.join(falhas)}.")
+
+if __name__ == "__main__":
+    main()
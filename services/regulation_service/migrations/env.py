@@ -0,0 +1,44 @@
+# Em services/regulation_service/migrations/env.py
+
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+from src import models
+from src.database import SQLALCHEMY_DATABASE_URL
+
+config = context.config
+
+# Quem chama o alembic pelo código (src/inicializacao.py) mantém o próprio logging
+if config.config_file_name is not None and config.attributes.get("configurar_logging", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = models.Base.metadata
+
+def _url():
+    """URL do banco: 'alembic -x url=...' tem prioridade sobre as variáveis de ambiente."""
+    return context.get_x_argument(as_dictionary=True).get("url") or config.get_main_option("sqlalchemy.url") or SQLALCHEMY_DATABASE_URL
+
+def run_migrations_offline():
+    """Gera o SQL das migrações sem conectar no banco ('alembic upgrade head --sql')."""
+    context.configure(url=_url(), target_metadata=target_metadata, literal_binds=True,
+                      dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    url = _url()
+    engine = create_engine(url, poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        # O SQLite não tem ALTER TABLE completo; o modo batch recria a tabela quando preciso
+        context.configure(connection=connection, target_metadata=target_metadata,
+                          render_as_batch=url.startswith("sqlite"))
+        with context.begin_transaction():
+            context.run_migrations()
+    engine.dispose()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
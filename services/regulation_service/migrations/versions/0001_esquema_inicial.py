@@ -0,0 +1,81 @@
+"""Esquema inicial (as tabelas que o create_all do startup criava)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+É exatamente o esquema do create_all antigo (sem a outbox, que vem na 0002).
+Bancos já criados por ele devem ser marcados com 'alembic stamp 0001' antes do
+primeiro 'alembic upgrade head'; o comando de inicialização faz isso sozinho.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "unidades",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("cnes_id", sa.String(), nullable=False),
+        sa.Column("nome", sa.String(), nullable=False),
+        sa.Column("latitude", sa.Float(), nullable=False),
+        sa.Column("longitude", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_unidades_id", "unidades", ["id"])
+    op.create_index("ix_unidades_cnes_id", "unidades", ["cnes_id"], unique=True)
+
+    op.create_table(
+        "procedimentos",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("procedimento_id", sa.String(), nullable=False),
+        sa.Column("nome", sa.String(), nullable=False),
+    )
+    op.create_index("ix_procedimentos_id", "procedimentos", ["id"])
+    op.create_index("ix_procedimentos_procedimento_id", "procedimentos", ["procedimento_id"], unique=True)
+
+    op.create_table(
+        "solicitacoes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("paciente_id", sa.String(), nullable=False),
+        sa.Column("unidade_solicitante_id_cnes", sa.String(), nullable=False),
+        sa.Column("procedimento_id", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("justificativa", sa.String(), nullable=True),
+        sa.Column("data_criacao", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("data_atualizacao", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_solicitacoes_id", "solicitacoes", ["id"])
+    op.create_index("ix_solicitacoes_paciente_id", "solicitacoes", ["paciente_id"])
+
+    op.create_table(
+        "ofertas_programadas",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("unidade_id", sa.Integer(), sa.ForeignKey("unidades.id"), nullable=False),
+        sa.Column("procedimento_id", sa.Integer(), sa.ForeignKey("procedimentos.id"), nullable=False),
+        sa.Column("data_agendamento", sa.Date(), nullable=False),
+        sa.Column("vagas_disponiveis", sa.Integer(), nullable=True),
+        sa.Column("horario", sa.String(), nullable=True),
+    )
+    op.create_index("ix_ofertas_programadas_id", "ofertas_programadas", ["id"])
+
+    op.create_table(
+        "marcacoes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("solicitacao_id", sa.Integer(), sa.ForeignKey("solicitacoes.id"), nullable=False),
+        sa.Column("oferta_id", sa.Integer(), sa.ForeignKey("ofertas_programadas.id"), nullable=False),
+        sa.Column("data_criacao", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("status_confirmacao_paciente", sa.String(), nullable=True),
+    )
+    op.create_index("ix_marcacoes_id", "marcacoes", ["id"])
+
+def downgrade():
+    op.drop_table("marcacoes")
+    op.drop_table("ofertas_programadas")
+    op.drop_table("solicitacoes")
+    op.drop_table("procedimentos")
+    op.drop_table("unidades")
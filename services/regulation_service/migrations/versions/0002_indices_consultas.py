@@ -0,0 +1,57 @@
+"""Outbox de notificações e índices das consultas quentes: ofertas abertas, marcações por solicitação e fila por status
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+No Postgres os índices são criados com CREATE INDEX CONCURRENTLY, fora de
+transação, para não bloquear as escritas nas tabelas durante a migração.
+IF NOT EXISTS: bancos criados pelo create_all com os modelos atuais já os têm.
+
+A tabela notificacoes_outbox não existia no create_all antigo (o esquema da
+0001); pelo mesmo motivo, só é criada se ainda não existir.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table("notificacoes_outbox"):
+        op.create_table(
+            "notificacoes_outbox",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("paciente_id", sa.String(), nullable=False),
+            sa.Column("mensagem", sa.String(), nullable=False),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("tentativas", sa.Integer(), nullable=False),
+            sa.Column("proxima_tentativa", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.Column("ultimo_erro", sa.String(), nullable=True),
+            sa.Column("data_criacao", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("data_envio", sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index("ix_notificacoes_outbox_id", "notificacoes_outbox", ["id"])
+
+    with op.get_context().autocommit_block():
+        # Consulta do agente: procedimento_id = ? AND data_agendamento >= hoje AND vagas_disponiveis > 0
+        op.create_index(
+            "ix_ofertas_abertas", "ofertas_programadas", ["procedimento_id", "data_agendamento"],
+            postgresql_where=sa.text("vagas_disponiveis > 0"), sqlite_where=sa.text("vagas_disponiveis > 0"),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index("ix_marcacoes_solicitacao_id", "marcacoes", ["solicitacao_id"],
+                        postgresql_concurrently=True, if_not_exists=True)
+        # Fila: status = 'EM FILA' AND procedimento_id = ? AND id > ? ORDER BY id
+        op.create_index("ix_solicitacoes_status_procedimento", "solicitacoes", ["status", "procedimento_id", "id"],
+                        postgresql_concurrently=True, if_not_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_solicitacoes_status_procedimento", table_name="solicitacoes", postgresql_concurrently=True)
+        op.drop_index("ix_marcacoes_solicitacao_id", table_name="marcacoes", postgresql_concurrently=True)
+        op.drop_index("ix_ofertas_abertas", table_name="ofertas_programadas", postgresql_concurrently=True)
+    op.drop_table("notificacoes_outbox")
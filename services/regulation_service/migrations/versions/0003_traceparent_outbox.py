@@ -0,0 +1,27 @@
+"""traceparent na outbox de notificações
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+Guarda o trace da requisição que gravou a notificação, para que o envio feito
+depois pelo despachante apareça no mesmo trace.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Bancos criados pelo create_all com os modelos atuais já têm a coluna
+    colunas = {coluna["name"] for coluna in sa.inspect(op.get_bind()).get_columns("notificacoes_outbox")}
+    if "traceparent" not in colunas:
+        op.add_column("notificacoes_outbox", sa.Column("traceparent", sa.String(), nullable=True))
+
+def downgrade():
+    with op.batch_alter_table("notificacoes_outbox") as batch:
+        batch.drop_column("traceparent")
@@ -0,0 +1,43 @@
+"""Índices das listagens paginadas de solicitações, ofertas e marcações
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+As listagens (GET /solicitacoes, /ofertas e /marcacoes) são paginadas por chave:
+cada filtro precisa de um índice que já entregue as linhas na ordem da listagem,
+para que a página continue do cursor sem ordenar nem pular linhas.
+Como na 0002, CONCURRENTLY no Postgres e IF NOT EXISTS para bancos criados pelo create_all.
+"""
+
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+# (nome, tabela, colunas)
+INDICES = [
+    # WHERE <filtro> = ? AND id < :cursor ORDER BY id DESC
+    ("ix_solicitacoes_lista_status", "solicitacoes", ["status", "id"]),
+    ("ix_solicitacoes_lista_procedimento", "solicitacoes", ["procedimento_id", "id"]),
+    ("ix_solicitacoes_lista_unidade", "solicitacoes", ["unidade_solicitante_id_cnes", "id"]),
+    ("ix_solicitacoes_data_criacao", "solicitacoes", ["data_criacao"]),
+    # WHERE <filtro> = ? AND (data_agendamento, id) > (:data, :id) ORDER BY data_agendamento, id
+    ("ix_ofertas_lista_data", "ofertas_programadas", ["data_agendamento", "id"]),
+    ("ix_ofertas_lista_procedimento", "ofertas_programadas", ["procedimento_id", "data_agendamento", "id"]),
+    ("ix_ofertas_lista_unidade", "ofertas_programadas", ["unidade_id", "data_agendamento", "id"]),
+    ("ix_marcacoes_lista_status", "marcacoes", ["status_confirmacao_paciente", "id"]),
+    ("ix_marcacoes_oferta_id", "marcacoes", ["oferta_id"]),
+]
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for nome, tabela, colunas in INDICES:
+            op.create_index(nome, tabela, colunas, postgresql_concurrently=True, if_not_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for nome, tabela, _ in reversed(INDICES):
+            op.drop_index(nome, table_name=tabela, postgresql_concurrently=True)
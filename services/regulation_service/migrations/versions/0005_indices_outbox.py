@@ -0,0 +1,40 @@
+"""Índices parciais da outbox de notificações: pendentes e enviadas
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+O despachante consulta a outbox a cada OUTBOX_INTERVALO_SEGUNDOS
+(status = 'PENDENTE' AND proxima_tentativa <= agora ORDER BY id), e a limpeza
+apaga as ENVIADAS mais antigas que OUTBOX_RETENCAO_HORAS. Os índices parciais
+cobrem só as linhas de cada consulta, então nenhuma delas varre a tabela.
+Como na 0002, CONCURRENTLY no Postgres e IF NOT EXISTS para bancos criados pelo create_all.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+# (nome, colunas, condição)
+INDICES = [
+    ("ix_outbox_pendentes", ["proxima_tentativa", "id"], "status = 'PENDENTE'"),
+    ("ix_outbox_enviadas", ["data_envio"], "status = 'ENVIADA'"),
+]
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for nome, colunas, condicao in INDICES:
+            op.create_index(
+                nome, "notificacoes_outbox", colunas,
+                postgresql_where=sa.text(condicao), sqlite_where=sa.text(condicao),
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for nome, _, _ in reversed(INDICES):
+            op.drop_index(nome, table_name="notificacoes_outbox", postgresql_concurrently=True)
@@ -1,23 +1,199 @@
+import logging
+import os
+import time
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from . import models, crud
-from .logging_config import logger
-from math import radians, sin, cos, sqrt, atan2
 from datetime import date
-from . import communication_client
+import numpy as np
+from opentelemetry import trace
+from scipy.optimize import linear_sum_assignment
+from . import notificacoes
+from .inventario import inventario, Candidatos
+from .geo import haversine_distance, haversine_distances
+from .indice_espacial import indice_unidades
+from .referencias import referencias
+from .metricas import CANDIDATOS_AGENTE, DECISAO_AGENTE
 
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """Calcula a distância em km entre dois pontos geográficos."""
-    R = 6371  # Raio da Terra em km
+# Raio máximo (km) entre o paciente e a unidade da oferta. 0 = sem limite.
+AGENTE_RAIO_KM = float(os.getenv("AGENTE_RAIO_KM", "0"))
 
-    dLat = radians(lat2 - lat1)
-    dLon = radians(lon2 - lon1)
-    lat1 = radians(lat1)
-    lat2 = radians(lat2)
+# Quantos candidatos o agente tenta reservar antes de ranquear de novo
+AGENTE_CANDIDATOS_RESERVA = int(os.getenv("AGENTE_CANDIDATOS_RESERVA", "5"))
 
-    a = sin(dLat / 2)**2 + cos(lat1) * cos(lat2) * sin(dLon / 2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
 
-    return R * c
+# Quantas vezes um lote é recalculado quando outro processo ocupa as vagas escolhidas
+MAX_TENTATIVAS_LOTE = 3
+
+# Estratégias de alocação em lote aceitas por find_best_slots_batch
+ESTRATEGIAS_LOTE = ("prioridade", "custo_minimo")
+
+# Tamanho máximo da matriz de custos da alocação global; acima disso usamos a gulosa
+AGENTE_LOTE_MAX_CELULAS = int(os.getenv("AGENTE_LOTE_MAX_CELULAS", "4000000"))
+
+def rank_candidates(datas, distancias, k=1):
+    """
+    Retorna os índices dos k melhores candidatos, ordenados por (data, distância).
+    Usa argmin/argpartition em vez de ordenar todos os candidatos.
+    """
+    n = len(datas)
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+
+    if k == 1:
+        # Só precisamos do grupo da data mais próxima e, dentro dele, da menor distância
+        no_primeiro_dia = np.flatnonzero(datas == datas.min())
+        return no_primeiro_dia[[np.argmin(distancias[no_primeiro_dia])]]
+
+    k = min(k, n)
+    # Pontuação composta em que a data sempre domina a distância
+    escala = float(distancias.max()) + 1.0
+    pontuacao = (datas - datas.min()) * escala + distancias
+    melhores = np.argpartition(pontuacao, k - 1)[:k] if k < n else np.arange(n)
+    return melhores[np.lexsort((distancias[melhores], datas[melhores]))]
+
+def _buscar_candidatos(db: Session, procedimento_id: int, hoje: date):
+    """
+    Busca as ofertas válidas já com as coordenadas da unidade, numa única consulta,
+    e devolve as colunas como arrays.
+    """
+    linhas = db.query(
+        models.OfertaProgramada.id,
+        models.OfertaProgramada.data_agendamento,
+        models.OfertaProgramada.unidade_id,
+        models.OfertaProgramada.vagas_disponiveis,
+    ).filter(
+        models.OfertaProgramada.procedimento_id == procedimento_id,
+        models.OfertaProgramada.data_agendamento >= hoje,
+        models.OfertaProgramada.vagas_disponiveis > 0
+    ).all()
+
+    if not linhas:
+        return None
+
+    ids, datas, unidade_ids, vagas = zip(*linhas)
+    unidade_ids = np.array(unidade_ids, dtype=np.int64)
+    # As coordenadas vêm do cache de referência, sem JOIN com a tabela de unidades
+    referencias.recarregar_se_expirado(db)
+    lats, lons = referencias.coordenadas(unidade_ids)
+    if np.isnan(lats).any():
+        referencias.carregar(db)
+        lats, lons = referencias.coordenadas(unidade_ids)
+    return Candidatos(
+        np.array(ids, dtype=np.int64),
+        np.array(datas, dtype="datetime64[D]").astype(np.int64),
+        unidade_ids,
+        lats,
+        lons,
+        np.array(vagas, dtype=np.int64),
+    )
+
+def _candidatos_do_procedimento(db: Session, procedimento_id: int, hoje: date):
+    """
+    Ofertas válidas (procedimento correto, data futura, vagas > 0) do procedimento.
+    Responde a partir do inventário em memória; o banco só é consultado se ele
+    ainda não foi carregado.
+    """
+    if inventario.pronto:
+        return inventario.candidatos(procedimento_id, hoje)
+    return _buscar_candidatos(db, procedimento_id, hoje)
+
+def _filtrar_por_raio(candidatos, paciente_lat, paciente_lon, raio_km):
+    """
+    Mantém só os candidatos cujas unidades estão a até 'raio_km' do paciente.
+    Usa o índice espacial para descobrir as unidades próximas sem calcular a
+    distância para todas elas.
+    """
+    if indice_unidades.pronto:
+        unidades_proximas, _ = indice_unidades.no_raio(paciente_lat, paciente_lon, raio_km)
+        dentro = np.isin(candidatos.unidade_ids, unidades_proximas)
+    else:
+        dentro = haversine_distances(paciente_lat, paciente_lon, candidatos.lats, candidatos.lons) <= raio_km
+
+    if not dentro.any():
+        return None
+    return candidatos.filtrar(dentro)
+
+def _ranquear_ofertas(db: Session, solicitacao: models.Solicitacao, k: int):
+    """
+    Ranqueia as ofertas válidas para a solicitação e devolve os ids e as
+    distâncias das k melhores, da melhor para a pior (ou None se não houver).
+    """
+    unidade_solicitante, procedimento = _referencias_da_solicitacao(solicitacao, db)
+    if not _referencias_validas(solicitacao, unidade_solicitante, procedimento):
+        return None
+
+    # Busca todas as ofertas válidas (procedimento correto, data futura, vagas > 0)
+    candidatos = _candidatos_do_procedimento(db, procedimento.id, date.today())
+    return _ranquear_candidatos(candidatos, unidade_solicitante, procedimento, k)
+
+def _referencias_da_solicitacao(solicitacao: models.Solicitacao, db: Session | None = None):
+    """
+    Unidade solicitante e procedimento da solicitação, a partir do cache de referência.
+    Sem sessão, responde só com o cache (None se faltar algo ou se ele tiver expirado).
+    """
+    if db is not None:
+        referencias.recarregar_se_expirado(db)
+    elif referencias.expirado:
+        return None, None
+    # Simular a localização do paciente (em um sistema real, viria de um cadastro)
+    # Para o MVP, vamos usar a localização da unidade solicitante como proxy.
+    unidade_solicitante = referencias.unidade_por_cnes(solicitacao.unidade_solicitante_id_cnes, db)
+    procedimento = referencias.procedimento_por_codigo(solicitacao.procedimento_id, db)
+    return unidade_solicitante, procedimento
+
+def _referencias_validas(solicitacao: models.Solicitacao, unidade_solicitante, procedimento):
+    if not unidade_solicitante:
+        logger.warning("Não foi possível encontrar a unidade solicitante com CNES %s. Abortando.", solicitacao.unidade_solicitante_id_cnes)
+        return False
+    if not procedimento:
+        logger.warning("Procedimento com ID %s não encontrado. Abortando.", solicitacao.procedimento_id)
+        return False
+    return True
+
+def _mensagem_da_oferta(oferta: models.OfertaProgramada, db: Session | None = None):
+    """Mensagem de agendamento da oferta, com os nomes vindos do cache (None se faltar algo sem sessão)."""
+    unidade = referencias.unidade(oferta.unidade_id, db)
+    procedimento = referencias.procedimento(oferta.procedimento_id, db)
+    if unidade is None or procedimento is None:
+        return None
+    return notificacoes.mensagem_agendamento(procedimento.nome, oferta.data_agendamento, unidade.nome)
+
+def _ranquear_candidatos(candidatos, unidade_solicitante, procedimento, k: int):
+    """Parte do ranqueamento que não acessa o banco, comum às versões síncrona e assíncrona."""
+    n_candidatos = len(candidatos.ids) if candidatos is not None else 0
+    inicio = time.perf_counter()
+    try:
+        with tracer.start_as_current_span("agente.ranquear", attributes={"agente.candidatos": n_candidatos, "agente.k": k}):
+            return _escolher_candidatos(candidatos, unidade_solicitante, procedimento, k)
+    finally:
+        DECISAO_AGENTE.labels("unitario").observe(time.perf_counter() - inicio)
+        CANDIDATOS_AGENTE.labels("unitario").observe(n_candidatos)
+
+def _escolher_candidatos(candidatos, unidade_solicitante, procedimento, k: int):
+    """Filtra pelo raio e devolve (ids, distâncias) das k melhores ofertas, ou None."""
+    if candidatos is None:
+        logger.info("Nenhuma oferta encontrada para o procedimento %s.", procedimento.nome)
+        return None
+
+    paciente_lat = unidade_solicitante.latitude
+    paciente_lon = unidade_solicitante.longitude
+
+    # Descarta as ofertas em unidades fora do raio configurado antes de ranquear
+    if AGENTE_RAIO_KM > 0:
+        candidatos = _filtrar_por_raio(candidatos, paciente_lat, paciente_lon, AGENTE_RAIO_KM)
+        if candidatos is None:
+            logger.info("Nenhuma oferta para o procedimento %s a até %.0f km do paciente.", procedimento.nome, AGENTE_RAIO_KM)
+            return None
+
+    # Calcula a distância para todas as ofertas de uma vez e escolhe a melhor:
+    # primeiro pela data mais próxima, depois pela menor distância
+    distancias = haversine_distances(paciente_lat, paciente_lon, candidatos.lats, candidatos.lons)
+    melhores = rank_candidates(candidatos.datas, distancias, k=k)
+
+    return candidatos.ids[melhores], distancias[melhores]
 
 def find_best_slot(db: Session, solicitacao: models.Solicitacao):
     """
@@ -27,57 +203,264 @@ def find_best_slot(db: Session, solicitacao: models.Solicitacao):
     2. Data mais próxima a partir de hoje.
     3. Menor distância como critério de desempate.
     """
-    logger.info(f"Agente iniciado para a solicitação ID: {solicitacao.id}")
-    
-    # Simular a localização do paciente (em um sistema real, viria de um cadastro)
-    # Para o MVP, vamos usar a localização da unidade solicitante como proxy.
-    unidade_solicitante = db.query(models.Unidade).filter(
-        models.Unidade.cnes_id == solicitacao.unidade_solicitante_id_cnes
-    ).first()
-    
-    if not unidade_solicitante:
-        logger.warning(f"Não foi possível encontrar a unidade solicitante com CNES {solicitacao.unidade_solicitante_id_cnes}. Abortando.")
+    logger.info("Agente iniciado para a solicitação ID: %s", solicitacao.id)
+
+    ranking = _ranquear_ofertas(db, solicitacao, k=1)
+    if ranking is None:
         return None
 
-    paciente_lat = unidade_solicitante.latitude
-    paciente_lon = unidade_solicitante.longitude
+    ids, distancias = ranking
+    melhor_oferta = db.get(models.OfertaProgramada, int(ids[0]))
+    logger.info("Melhor oferta encontrada: ID %s na data %s (Distância: %.2f km)", melhor_oferta.id, melhor_oferta.data_agendamento, distancias[0])
+    
+    return melhor_oferta
 
-    # Encontra o procedimento no banco
-    procedimento = db.query(models.Procedimento).filter(
-        models.Procedimento.procedimento_id == solicitacao.procedimento_id
-    ).first()
+def schedule_best_slot(db: Session, solicitacao: models.Solicitacao):
+    """
+    Agenda a solicitação na melhor oferta que ainda tiver vaga.
+    A vaga é reservada de forma atômica no banco (crud.create_marcacao); se outro
+    worker ocupar a última vaga antes, o agente tenta o próximo candidato do ranking.
+    A notificação ao paciente é gravada na outbox junto com a marcação.
+    Retorna a solicitação agendada ou None se não houver vaga.
+    """
+    logger.info("Agente iniciado para a solicitação ID: %s", solicitacao.id)
 
-    if not procedimento:
-        logger.warning(f"Procedimento com ID {solicitacao.procedimento_id} não encontrado. Abortando.")
+    tentadas = set()
+    while True:
+        ranking = _ranquear_ofertas(db, solicitacao, k=AGENTE_CANDIDATOS_RESERVA)
+        if ranking is None:
+            return None
+
+        novas = [(int(oferta_id), distancia) for oferta_id, distancia in zip(*ranking) if int(oferta_id) not in tentadas]
+        if not novas:
+            return None
+
+        # Todas as ofertas candidatas numa única consulta
+        ofertas = crud.get_ofertas(db, [oferta_id for oferta_id, _ in novas])
+        for oferta_id, distancia in novas:
+            tentadas.add(oferta_id)
+            oferta = ofertas[oferta_id]
+            mensagem = _mensagem_da_oferta(oferta, db)
+            agendada = crud.create_marcacao(db=db, solicitacao=solicitacao, oferta=oferta, mensagem=mensagem)
+            if agendada:
+                logger.info("Vaga reservada na oferta ID %s na data %s (Distância: %.2f km)", oferta.id, oferta.data_agendamento, distancia)
+                return agendada
+            logger.info("Oferta ID %s esgotada por outra requisição. Tentando o próximo candidato...", oferta_id)
+        # Todas as k melhores esgotaram; o inventário já foi atualizado, então o
+        # próximo ranking traz novos candidatos (ou nenhum)
+
+# --- Versões assíncronas, usadas pelos endpoints (AsyncSession) ---
+
+async def _ranquear_ofertas_async(db: AsyncSession, solicitacao: models.Solicitacao, k: int):
+    """
+    Versão assíncrona de _ranquear_ofertas. Unidade e procedimento vêm do cache
+    de referência; o banco só é consultado se ele estiver expirado ou incompleto.
+    """
+    unidade_solicitante, procedimento = _referencias_da_solicitacao(solicitacao)
+    if unidade_solicitante is None or procedimento is None:
+        unidade_solicitante, procedimento = await db.run_sync(
+            lambda sessao: _referencias_da_solicitacao(solicitacao, sessao)
+        )
+    if not _referencias_validas(solicitacao, unidade_solicitante, procedimento):
         return None
 
-    # Busca todas as ofertas válidas (procedimento correto, data futura, vagas > 0)
     hoje = date.today()
-    ofertas_validas = db.query(models.OfertaProgramada).join(models.Unidade).filter(
-        models.OfertaProgramada.procedimento_id == procedimento.id,
-        models.OfertaProgramada.data_agendamento >= hoje,
-        models.OfertaProgramada.vagas_disponiveis > 0
-    ).all()
+    if inventario.pronto:
+        candidatos = inventario.candidatos(procedimento.id, hoje)
+    else:
+        candidatos = await db.run_sync(_buscar_candidatos, procedimento.id, hoje)
+    return _ranquear_candidatos(candidatos, unidade_solicitante, procedimento, k)
+
+async def find_best_slot_async(db: AsyncSession, solicitacao: models.Solicitacao):
+    """Versão assíncrona de find_best_slot."""
+    logger.info("Agente iniciado para a solicitação ID: %s", solicitacao.id)
 
-    if not ofertas_validas:
-        logger.info(f"Nenhuma oferta encontrada para o procedimento {procedimento.nome}.")
+    ranking = await _ranquear_ofertas_async(db, solicitacao, k=1)
+    if ranking is None:
         return None
 
-    # Calcula a distância para cada oferta e armazena os candidatos
-    candidatos = []
-    for oferta in ofertas_validas:
-        unidade_oferta = db.query(models.Unidade).get(oferta.unidade_id)
-        distancia = haversine_distance(paciente_lat, paciente_lon, unidade_oferta.latitude, unidade_oferta.longitude)
-        candidatos.append({
-            "oferta": oferta,
-            "data": oferta.data_agendamento,
-            "distancia": distancia
-        })
-    
-    # Ordena os candidatos: primeiro pela data mais próxima, depois pela menor distância
-    candidatos_ordenados = sorted(candidatos, key=lambda c: (c['data'], c['distancia']))
-    
-    melhor_oferta = candidatos_ordenados[0]["oferta"]
-    logger.info(f"Melhor oferta encontrada: ID {melhor_oferta.id} na data {melhor_oferta.data_agendamento} (Distância: {candidatos_ordenados[0]['distancia']:.2f} km)")
-    
-    return melhor_oferta
\ No newline at end of file
+    ids, distancias = ranking
+    melhor_oferta = await db.get(models.OfertaProgramada, int(ids[0]))
+    logger.info("Melhor oferta encontrada: ID %s na data %s (Distância: %.2f km)", melhor_oferta.id, melhor_oferta.data_agendamento, distancias[0])
+
+    return melhor_oferta
+
+async def schedule_best_slot_async(db: AsyncSession, solicitacao: models.Solicitacao):
+    """Versão assíncrona de schedule_best_slot."""
+    logger.info("Agente iniciado para a solicitação ID: %s", solicitacao.id)
+
+    tentadas = set()
+    while True:
+        ranking = await _ranquear_ofertas_async(db, solicitacao, k=AGENTE_CANDIDATOS_RESERVA)
+        if ranking is None:
+            return None
+
+        novas = [(int(oferta_id), distancia) for oferta_id, distancia in zip(*ranking) if int(oferta_id) not in tentadas]
+        if not novas:
+            return None
+
+        # Todas as ofertas candidatas numa única consulta
+        ofertas = await crud.get_ofertas_async(db, [oferta_id for oferta_id, _ in novas])
+        for oferta_id, distancia in novas:
+            tentadas.add(oferta_id)
+            oferta = ofertas[oferta_id]
+            # O banco só é consultado se o cache de referência não tiver a unidade ou o procedimento
+            mensagem = _mensagem_da_oferta(oferta) or await db.run_sync(lambda sessao: _mensagem_da_oferta(oferta, sessao))
+            agendada = await crud.create_marcacao_async(db=db, solicitacao=solicitacao, oferta=oferta, mensagem=mensagem)
+            if agendada:
+                logger.info("Vaga reservada na oferta ID %s na data %s (Distância: %.2f km)", oferta.id, oferta.data_agendamento, distancia)
+                return agendada
+            logger.info("Oferta ID %s esgotada por outra requisição. Tentando o próximo candidato...", oferta_id)
+
+def _alocar_por_prioridade(candidatos: Candidatos, distancias, grupo):
+    """
+    Alocação gulosa: na ordem de prioridade, cada solicitação fica com a melhor
+    oferta que ainda tem vaga. 'distancias' é a matriz solicitações x ofertas.
+    """
+    vagas = candidatos.vagas.copy()
+    alocacoes, sem_vaga = [], []
+    for i, solicitacao in enumerate(grupo):
+        livres = np.flatnonzero((vagas > 0) & np.isfinite(distancias[i]))
+        if len(livres) == 0:
+            sem_vaga.append(solicitacao)
+            continue
+        melhor = livres[rank_candidates(candidatos.datas[livres], distancias[i][livres])[0]]
+        vagas[melhor] -= 1
+        alocacoes.append((solicitacao, int(candidatos.ids[melhor])))
+    return alocacoes, sem_vaga
+
+def _alocar_custo_minimo(candidatos: Candidatos, distancias, grupo):
+    """
+    Alocação global: minimiza o total de dias de espera do lote e, em seguida,
+    a distância total, resolvendo um problema de atribuição (húngaro).
+    """
+    # Se há mais solicitações do que vagas, só as de maior prioridade concorrem
+    total_vagas = int(candidatos.vagas.sum())
+    grupo, excedentes = grupo[:total_vagas], list(grupo[total_vagas:])
+    distancias = distancias[:len(grupo)]
+    m = len(grupo)
+
+    # Cada solicitação só precisa das suas m melhores ofertas: com m solicitações,
+    # pelo menos uma delas sempre terá vaga sobrando para ela
+    colunas = set()
+    for linha in distancias:
+        permitidas = np.flatnonzero(np.isfinite(linha) & (candidatos.vagas > 0))
+        colunas.update(permitidas[rank_candidates(candidatos.datas[permitidas], linha[permitidas], k=m)].tolist())
+    colunas = np.array(sorted(colunas), dtype=np.intp)
+
+    # Uma coluna por vaga (no máximo m por oferta)
+    copias = np.repeat(colunas, np.minimum(candidatos.vagas[colunas], m))
+    if len(copias) == 0:
+        return [], list(grupo) + excedentes
+    if m * len(copias) > AGENTE_LOTE_MAX_CELULAS:
+        logger.warning("Lote grande demais para a alocação global (%s x %s). Usando a alocação por prioridade.", m, len(copias))
+        alocacoes, sem_vaga = _alocar_por_prioridade(candidatos, distancias, grupo)
+        return alocacoes, sem_vaga + excedentes
+
+    # Custo em que um dia a menos de espera sempre vale mais que qualquer ganho de distância
+    dist = distancias[:, copias]
+    permitido = np.isfinite(dist)
+    dias = (candidatos.datas[copias] - candidatos.datas[copias].min()).astype(np.float64)
+    escala = m * (float(dist[permitido].max()) + 1.0)
+    custo = dias * escala + np.where(permitido, dist, 0.0)
+    # Penalidade maior que qualquer soma de custos permitidos: prioriza alocar o máximo possível
+    custo[~permitido] = (float(custo.max()) + 1.0) * (m + 1)
+
+    linhas, colunas_escolhidas = linear_sum_assignment(custo)
+    oferta_da_linha = {
+        int(i): int(candidatos.ids[copias[j]])
+        for i, j in zip(linhas, colunas_escolhidas) if permitido[i, j]
+    }
+
+    alocacoes, sem_vaga = [], []
+    for i, solicitacao in enumerate(grupo):
+        if i in oferta_da_linha:
+            alocacoes.append((solicitacao, oferta_da_linha[i]))
+        else:
+            sem_vaga.append(solicitacao)
+    return alocacoes, sem_vaga + excedentes
+
+@tracer.start_as_current_span("agente.alocar_lote")
+def find_best_slots_batch(db: Session, solicitacoes: list[models.Solicitacao], estrategia: str = "prioridade"):
+    """
+    Versão em lote do agente. Aloca vagas para várias solicitações de uma só vez,
+    carregando unidades, procedimentos e ofertas de cada procedimento uma única vez.
+    Estratégias:
+    - "prioridade": gulosa, as solicitações mais antigas escolhem primeiro.
+    - "custo_minimo": atribuição global que minimiza espera e depois distância.
+    Retorna (alocações [(solicitação, id da oferta)], solicitações sem vaga).
+    As vagas não são reservadas aqui; isso é feito por crud.create_marcacoes_em_lote.
+    """
+    logger.info("Agente iniciado para um lote de %s solicitações (estratégia: %s).", len(solicitacoes), estrategia)
+    inicio = time.perf_counter()
+
+    # Prioridade: ordem de chegada das solicitações
+    solicitacoes = sorted(solicitacoes, key=lambda s: s.id)
+
+    # Unidades e procedimentos vêm do cache de referência (o banco só é consultado
+    # para códigos que ainda não estão nele)
+    referencias.recarregar_se_expirado(db)
+    unidades = {}
+    for codigo in {s.unidade_solicitante_id_cnes for s in solicitacoes}:
+        unidade = referencias.unidade_por_cnes(codigo, db)
+        if unidade is not None:
+            unidades[codigo] = unidade
+    procedimentos = {}
+    for codigo in {s.procedimento_id for s in solicitacoes}:
+        procedimento = referencias.procedimento_por_codigo(codigo, db)
+        if procedimento is not None:
+            procedimentos[codigo] = procedimento
+
+    alocacoes, sem_vaga = [], []
+    por_procedimento: dict[int, list] = {}
+    for solicitacao in solicitacoes:
+        procedimento = procedimentos.get(solicitacao.procedimento_id)
+        if solicitacao.unidade_solicitante_id_cnes not in unidades or procedimento is None:
+            logger.warning("Solicitação %s com unidade ou procedimento desconhecido. Ficará em fila.", solicitacao.id)
+            sem_vaga.append(solicitacao)
+            continue
+        por_procedimento.setdefault(procedimento.id, []).append(solicitacao)
+
+    hoje = date.today()
+    alocar = _alocar_custo_minimo if estrategia == "custo_minimo" else _alocar_por_prioridade
+    for procedimento_id, grupo in por_procedimento.items():
+        candidatos = _candidatos_do_procedimento(db, procedimento_id, hoje)
+        CANDIDATOS_AGENTE.labels("lote").observe(len(candidatos.ids) if candidatos is not None else 0)
+        if candidatos is None:
+            sem_vaga.extend(grupo)
+            continue
+
+        # Distâncias calculadas uma vez por unidade solicitante; fora do raio vira infinito
+        distancias_por_cnes = {}
+        for codigo in {s.unidade_solicitante_id_cnes for s in grupo}:
+            unidade = unidades[codigo]
+            d = haversine_distances(unidade.latitude, unidade.longitude, candidatos.lats, candidatos.lons)
+            if AGENTE_RAIO_KM > 0:
+                d = np.where(d <= AGENTE_RAIO_KM, d, np.inf)
+            distancias_por_cnes[codigo] = d
+        distancias = np.vstack([distancias_por_cnes[s.unidade_solicitante_id_cnes] for s in grupo])
+
+        alocadas, sem_vaga_grupo = alocar(candidatos, distancias, grupo)
+        alocacoes.extend(alocadas)
+        sem_vaga.extend(sem_vaga_grupo)
+
+    DECISAO_AGENTE.labels("lote").observe(time.perf_counter() - inicio)
+    logger.info("Lote processado: %s solicitações alocadas, %s sem vaga.", len(alocacoes), len(sem_vaga))
+    return alocacoes, sem_vaga
+
+def schedule_batch(db: Session, solicitacoes: list[models.Solicitacao], estrategia: str = "prioridade"):
+    """
+    Aloca e grava um lote de solicitações (find_best_slots_batch + crud.create_marcacoes_em_lote).
+    Se outro processo ocupar alguma das vagas escolhidas, recarrega o inventário e
+    recalcula o lote. As notificações dos agendados são gravadas na outbox na
+    mesma transação. Retorna (alocações, sem vaga) ou None se não conseguiu gravar.
+    """
+    for tentativa in range(MAX_TENTATIVAS_LOTE):
+        alocacoes, sem_vaga = find_best_slots_batch(db, solicitacoes, estrategia)
+        pacientes = {s: s.paciente_id for s, _ in alocacoes}
+        mensagens = notificacoes.mensagens_de_agendamento(db, alocacoes, pacientes)
+        if crud.create_marcacoes_em_lote(db, alocacoes, sem_vaga, mensagens) is not None:
+            return alocacoes, sem_vaga
+        logger.warning("Conflito de vagas ao gravar o lote (tentativa %s). Recalculando...", tentativa + 1)
+        inventario.sincronizar(db)
+    return None
\ No newline at end of file
@@ -1,30 +1,75 @@
 # Em services/regulation_service/src/communication_client.py
 
 import httpx
-from .logging_config import logger
+import logging
+import os
+import time
+from .metricas import ENVIO_NOTIFICACAO, FALHAS_NOTIFICACAO
+from .rastreamento import rastrear_cliente
 
-COMMUNICATION_SERVICE_URL = "http://communication_service:8000/notifications/send"
+logger = logging.getLogger(__name__)
 
-def send_notification(paciente_id: str, mensagem: str, token: str):
+COMMUNICATION_SERVICE_URL = os.getenv("COMMUNICATION_SERVICE_URL", "http://communication_service:8000/notifications/send")
+
+# Configuração do pool de conexões com o communication-service
+COMM_MAX_CONEXOES = int(os.getenv("COMM_MAX_CONEXOES", "100"))
+COMM_MAX_KEEPALIVE = int(os.getenv("COMM_MAX_KEEPALIVE", "20"))
+COMM_KEEPALIVE_SEGUNDOS = float(os.getenv("COMM_KEEPALIVE_SEGUNDOS", "30"))
+COMM_TIMEOUT_SEGUNDOS = float(os.getenv("COMM_TIMEOUT_SEGUNDOS", "5"))
+# O HTTP/2 é negociado via TLS (ALPN); em http:// o httpx continua em HTTP/1.1 com keep-alive
+COMM_HTTP2 = os.getenv("COMM_HTTP2", "true").lower() in ("1", "true", "sim")
+
+# Cliente único do processo, criado no startup e reaproveitado por todos os envios
+_client: httpx.AsyncClient | None = None
+
+async def iniciar():
+    """Cria o cliente HTTP compartilhado (com pool de conexões). Chamado no startup do app."""
+    global _client
+    _client = httpx.AsyncClient(
+        http2=COMM_HTTP2,
+        limits=httpx.Limits(
+            max_connections=COMM_MAX_CONEXOES,
+            max_keepalive_connections=COMM_MAX_KEEPALIVE,
+            keepalive_expiry=COMM_KEEPALIVE_SEGUNDOS,
+        ),
+        timeout=COMM_TIMEOUT_SEGUNDOS,
+    )
+    # Cada chamada vira um span e leva o traceparent ao communication-service
+    rastrear_cliente(_client)
+
+async def encerrar():
+    """Fecha o cliente. Chamado no shutdown do app, depois de parar o despachante da outbox."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+
+async def enviar(paciente_id: str, mensagem: str, token: str):
     """
     Chama a API do communication-service para enviar uma notificação.
+    Levanta httpx.HTTPError em caso de falha, para que quem chamou decida se tenta de novo.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {"paciente_id": paciente_id, "mensagem": mensagem}
+
+    inicio = time.perf_counter()
+    try:
+        response = await _client.post(COMMUNICATION_SERVICE_URL, json=payload, headers=headers)
+        response.raise_for_status()
+    except Exception:
+        FALHAS_NOTIFICACAO.inc()
+        raise
+    finally:
+        ENVIO_NOTIFICACAO.observe(time.perf_counter() - inicio)
+
+async def send_notification(paciente_id: str, mensagem: str, token: str):
+    """
+    Envia uma notificação e devolve True/False em vez de levantar exceções.
     """
     try:
-        headers = {"Authorization": f"Bearer {token}"}
-        payload = {"paciente_id": paciente_id, "mensagem": mensagem}
-        
-        with httpx.Client() as client:
-            # A CORREÇÃO FINAL ESTÁ AQUI: Adicionando 'headers=headers'
-            response = client.post(
-                COMMUNICATION_SERVICE_URL, 
-                json=payload, 
-                headers=headers, # <-- ESTE PARÂMETRO ESTAVA FALTANDO
-                timeout=5.0
-            )
-            response.raise_for_status()
-        
-        logger.info(f"Solicitação de notificação enviada com sucesso para o paciente {paciente_id}.")
+        await enviar(paciente_id, mensagem, token)
+        logger.info("Solicitação de notificação enviada com sucesso para o paciente %s.", paciente_id)
         return True
-    except httpx.RequestError as e:
-        logger.error(f"Erro ao tentar se comunicar com o communication-service: {e}")
-        return False
\ No newline at end of file
+    except httpx.HTTPError as e:
+        logger.error("Erro ao tentar se comunicar com o communication-service: %s", e)
+        return False
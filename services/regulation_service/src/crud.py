@@ -1,7 +1,14 @@
 # Cole este código em services/regulation_service/src/crud.py
 
+from collections import Counter
+from datetime import date, timedelta
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from . import models, schemas
+from .inventario import inventario
+from .referencias import referencias
+from .rastreamento import traceparent_atual
 
 def create_solicitacao(db: Session, solicitacao: schemas.SolicitacaoCreate):
     """
@@ -29,9 +36,17 @@ def get_solicitacao(db: Session, solicitacao_id: int):
     return db.query(models.Solicitacao).filter(models.Solicitacao.id == solicitacao_id).first()
 
 
-def update_solicitacao_status(db: Session, solicitacao_id: int, status_update: schemas.SolicitacaoStatusUpdate):
+def add_notificacao(db: Session, paciente_id: str, mensagem: str):
+    """
+    Registra uma notificação na outbox, dentro da transação corrente.
+    Ela só será enviada se a transação for confirmada. Não faz commit.
+    """
+    db.add(models.NotificacaoOutbox(paciente_id=paciente_id, mensagem=mensagem, traceparent=traceparent_atual()))
+
+def update_solicitacao_status(db: Session, solicitacao_id: int, status_update: schemas.SolicitacaoStatusUpdate, mensagem: str | None = None):
     """
     Atualiza o status e a justificativa de uma solicitação.
+    Se 'mensagem' for informada, a notificação ao paciente é gravada na mesma transação.
     """
     # Primeiro, busca a solicitação no banco
     db_solicitacao = get_solicitacao(db, solicitacao_id)
@@ -40,6 +55,9 @@ def update_solicitacao_status(db: Session, solicitacao_id: int, status_update: s
         # Atualiza os campos
         db_solicitacao.status = status_update.status
         db_solicitacao.justificativa = status_update.justificativa
+
+        if mensagem:
+            add_notificacao(db, db_solicitacao.paciente_id, mensagem)
         
         # Comita a transação
         db.commit()
@@ -48,40 +66,332 @@ def update_solicitacao_status(db: Session, solicitacao_id: int, status_update: s
         
     return db_solicitacao
 
-def create_marcacao(db: Session, solicitacao: models.Solicitacao, oferta: models.OfertaProgramada):
-    """Cria a marcação, vincula à solicitação e atualiza status."""
+def reservar_vaga(db: Session, oferta_id: int, quantidade: int = 1):
+    """
+    Reserva vagas de uma oferta de forma atômica, com um único
+    UPDATE ... WHERE vagas_disponiveis >= quantidade RETURNING.
+    Dois workers nunca conseguem ocupar a mesma vaga: quem perder a corrida
+    não altera nenhuma linha. Retorna as vagas restantes ou None se não havia
+    vagas suficientes. Não faz commit.
+    """
+    return db.execute(
+        update(models.OfertaProgramada)
+        .where(
+            models.OfertaProgramada.id == oferta_id,
+            models.OfertaProgramada.vagas_disponiveis >= quantidade
+        )
+        .values(vagas_disponiveis=models.OfertaProgramada.vagas_disponiveis - quantidade)
+        .returning(models.OfertaProgramada.vagas_disponiveis)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+
+def create_marcacao(db: Session, solicitacao: models.Solicitacao, oferta: models.OfertaProgramada, mensagem: str | None = None):
+    """
+    Cria a marcação, vincula à solicitação e atualiza status.
+    Se 'mensagem' for informada, a notificação ao paciente é gravada na mesma transação.
+    Retorna None, sem alterar nada, se a oferta não tiver mais vagas.
+    """
     
+    # Reserva a vaga antes de qualquer outra escrita. Se não havia vaga, o UPDATE
+    # não alterou nada e não há o que desfazer.
+    vagas_restantes = reservar_vaga(db, oferta.id)
+    if vagas_restantes is None:
+        inventario.atualizar_vagas(oferta.id, 0)
+        return None
+
     # Cria a marcação
     db_marcacao = models.Marcacao(solicitacao_id=solicitacao.id, oferta_id=oferta.id)
     db.add(db_marcacao)
     
     # Atualiza o status da solicitação para AGENDADA
     solicitacao.status = "AGENDADA"
-    
-    # Decrementa o número de vagas disponíveis
-    if oferta.vagas_disponiveis > 0:
-        oferta.vagas_disponiveis -= 1
+
+    if mensagem:
+        add_notificacao(db, solicitacao.paciente_id, mensagem)
         
     db.commit()
     db.refresh(solicitacao)
+
+    # Mantém o inventário em memória do agente em dia com a nova vaga ocupada
+    inventario.atualizar_vagas(oferta.id, vagas_restantes)
     
     return solicitacao
 
+def create_marcacoes_em_lote(db: Session, alocacoes: list, sem_vaga: list[models.Solicitacao], mensagens: list | None = None):
+    """
+    Grava o resultado de uma alocação em lote numa única transação: decrementa as
+    vagas, insere todas as marcações e as notificações [(paciente_id, mensagem)]
+    e atualiza o status das solicitações.
+    As vagas só são decrementadas se ainda existirem; se outro processo ocupou
+    alguma delas, a transação inteira é desfeita e a função retorna None.
+    """
+    vagas_restantes = {}
+    por_oferta = Counter(oferta_id for _, oferta_id in alocacoes)
+    # Ordem fixa de atualização evita deadlocks entre lotes concorrentes
+    for oferta_id in sorted(por_oferta):
+        restante = reservar_vaga(db, oferta_id, por_oferta[oferta_id])
+        if restante is None:
+            db.rollback()
+            return None
+        vagas_restantes[oferta_id] = restante
+
+    if alocacoes:
+        db.execute(insert(models.Marcacao), [
+            {"solicitacao_id": solicitacao.id, "oferta_id": oferta_id}
+            for solicitacao, oferta_id in alocacoes
+        ])
+    if mensagens:
+        traceparent = traceparent_atual()
+        db.execute(insert(models.NotificacaoOutbox), [
+            {"paciente_id": paciente_id, "mensagem": mensagem, "traceparent": traceparent}
+            for paciente_id, mensagem in mensagens
+        ])
+    for solicitacao, _ in alocacoes:
+        solicitacao.status = "AGENDADA"
+    for solicitacao in sem_vaga:
+        solicitacao.status = "EM FILA"
+
+    db.commit()
+
+    for oferta_id, restante in vagas_restantes.items():
+        inventario.atualizar_vagas(oferta_id, restante)
+
+    return [solicitacao for solicitacao, _ in alocacoes] + list(sem_vaga)
+
 def create_oferta(db: Session, oferta: schemas.OfertaCreate):
     """Cria uma nova oferta de vaga."""
     db_oferta = models.OfertaProgramada(**oferta.model_dump())
     db.add(db_oferta)
     db.commit()
     db.refresh(db_oferta)
+
+    # Disponibiliza a nova oferta imediatamente para o agente
+    unidade = referencias.unidade(db_oferta.unidade_id, db)
+    if unidade:
+        inventario.registrar_oferta(db_oferta, unidade)
     return db_oferta
 
+def get_ofertas(db: Session, oferta_ids: list[int]):
+    """Busca várias ofertas numa única consulta. Retorna {id: oferta}."""
+    ofertas = db.execute(
+        select(models.OfertaProgramada).where(models.OfertaProgramada.id.in_(oferta_ids))
+    ).scalars().all()
+    return {oferta.id: oferta for oferta in ofertas}
+
 def get_marcacao(db: Session, marcacao_id: int):
     """Busca uma marcação pelo seu ID."""
     return db.query(models.Marcacao).filter(models.Marcacao.id == marcacao_id).first()
 
+def get_marcacao_da_solicitacao(db: Session, solicitacao_id: int):
+    """Busca a marcação mais recente de uma solicitação (usa o índice de marcacoes.solicitacao_id)."""
+    return db.query(models.Marcacao).filter(
+        models.Marcacao.solicitacao_id == solicitacao_id
+    ).order_by(models.Marcacao.id.desc()).first()
+
 def update_marcacao_status_paciente(db: Session, db_marcacao: models.Marcacao, status: str):
     """Atualiza o status de confirmação do paciente em uma marcação."""
     db_marcacao.status_confirmacao_paciente = status
     db.commit()
     db.refresh(db_marcacao)
-    return db_marcacao
\ No newline at end of file
+    return db_marcacao
+
+
+# --- Listagens paginadas por chave (keyset) ---
+# Cada consulta segue a ordem de um índice e recebe em 'apos' a chave da última
+# linha já vista (ver paginacao.py). Só as colunas mostradas pelas listagens são lidas.
+
+COLUNAS_SOLICITACAO = (
+    models.Solicitacao.id, models.Solicitacao.paciente_id, models.Solicitacao.unidade_solicitante_id_cnes,
+    models.Solicitacao.procedimento_id, models.Solicitacao.status, models.Solicitacao.data_criacao,
+)
+# Exportação: a linha inteira, para auditoria
+COLUNAS_EXPORTACAO_SOLICITACAO = COLUNAS_SOLICITACAO + (
+    models.Solicitacao.justificativa, models.Solicitacao.data_atualizacao,
+)
+COLUNAS_OFERTA = (
+    models.OfertaProgramada.id, models.OfertaProgramada.unidade_id, models.OfertaProgramada.procedimento_id,
+    models.OfertaProgramada.data_agendamento, models.OfertaProgramada.vagas_disponiveis, models.OfertaProgramada.horario,
+)
+COLUNAS_MARCACAO = (
+    models.Marcacao.id, models.Marcacao.solicitacao_id, models.Marcacao.oferta_id,
+    models.Marcacao.status_confirmacao_paciente, models.Marcacao.data_criacao,
+    models.OfertaProgramada.unidade_id, models.OfertaProgramada.procedimento_id,
+    models.OfertaProgramada.data_agendamento, models.OfertaProgramada.horario,
+)
+
+def consulta_solicitacoes(status: str | None = None, procedimento_id: str | None = None,
+                          unidade_solicitante_id_cnes: str | None = None, desde: date | None = None,
+                          ate: date | None = None, apos: int | None = None, colunas=COLUNAS_SOLICITACAO):
+    """Solicitações filtradas, das mais recentes para as mais antigas (id decrescente). 'desde'/'ate' valem para data_criacao."""
+    consulta = select(*colunas)
+    if status is not None:
+        consulta = consulta.where(models.Solicitacao.status == status)
+    if procedimento_id is not None:
+        consulta = consulta.where(models.Solicitacao.procedimento_id == procedimento_id)
+    if unidade_solicitante_id_cnes is not None:
+        consulta = consulta.where(models.Solicitacao.unidade_solicitante_id_cnes == unidade_solicitante_id_cnes)
+    if desde is not None:
+        consulta = consulta.where(models.Solicitacao.data_criacao >= desde)
+    if ate is not None:
+        consulta = consulta.where(models.Solicitacao.data_criacao < ate + timedelta(days=1))
+    if apos is not None:
+        consulta = consulta.where(models.Solicitacao.id < apos)
+    return consulta.order_by(models.Solicitacao.id.desc())
+
+def consulta_ofertas(procedimento_id: int | None = None, unidade_id: int | None = None, com_vagas: bool | None = None,
+                     desde: date | None = None, ate: date | None = None, apos: tuple[date, int] | None = None):
+    """Ofertas filtradas, em ordem de data de agendamento (e id). 'apos' é (data_agendamento, id)."""
+    oferta = models.OfertaProgramada
+    consulta = select(*COLUNAS_OFERTA)
+    if procedimento_id is not None:
+        consulta = consulta.where(oferta.procedimento_id == procedimento_id)
+    if unidade_id is not None:
+        consulta = consulta.where(oferta.unidade_id == unidade_id)
+    if com_vagas is not None:
+        consulta = consulta.where(oferta.vagas_disponiveis > 0 if com_vagas else oferta.vagas_disponiveis <= 0)
+    if desde is not None:
+        consulta = consulta.where(oferta.data_agendamento >= desde)
+    if ate is not None:
+        consulta = consulta.where(oferta.data_agendamento <= ate)
+    if apos is not None:
+        consulta = consulta.where(tuple_(oferta.data_agendamento, oferta.id) > tuple_(*apos))
+    return consulta.order_by(oferta.data_agendamento, oferta.id)
+
+def consulta_marcacoes(status: str | None = None, procedimento_id: int | None = None, unidade_id: int | None = None,
+                       desde: date | None = None, ate: date | None = None, apos: int | None = None):
+    """
+    Marcações filtradas, das mais recentes para as mais antigas (id decrescente), com
+    a unidade, o procedimento e a data da oferta. 'status' é o status de confirmação
+    do paciente; 'desde'/'ate' valem para a data de agendamento.
+    """
+    oferta = models.OfertaProgramada
+    consulta = select(*COLUNAS_MARCACAO).join(oferta, models.Marcacao.oferta_id == oferta.id)
+    if status is not None:
+        consulta = consulta.where(models.Marcacao.status_confirmacao_paciente == status)
+    if procedimento_id is not None:
+        consulta = consulta.where(oferta.procedimento_id == procedimento_id)
+    if unidade_id is not None:
+        consulta = consulta.where(oferta.unidade_id == unidade_id)
+    if desde is not None:
+        consulta = consulta.where(oferta.data_agendamento >= desde)
+    if ate is not None:
+        consulta = consulta.where(oferta.data_agendamento <= ate)
+    if apos is not None:
+        consulta = consulta.where(models.Marcacao.id < apos)
+    return consulta.order_by(models.Marcacao.id.desc())
+
+def get_pagina(db: Session, consulta, limite: int):
+    """Executa uma consulta de listagem. Retorna (linhas, há_mais); busca uma linha a mais só para saber se há próxima página."""
+    linhas = db.execute(consulta.limit(limite + 1)).all()
+    return linhas[:limite], len(linhas) > limite
+
+
+# --- Versões assíncronas, usadas pelos endpoints (AsyncSession) ---
+# Mesma lógica das funções acima. A sessão é criada com expire_on_commit=False e
+# os modelos usam eager_defaults, então nenhuma delas precisa de refresh depois do commit.
+
+async def create_solicitacao_async(db: AsyncSession, solicitacao: schemas.SolicitacaoCreate):
+    """Versão assíncrona de create_solicitacao."""
+    db_solicitacao = models.Solicitacao(
+        paciente_id=solicitacao.paciente_id,
+        unidade_solicitante_id_cnes=solicitacao.unidade_solicitante_id_cnes,
+        procedimento_id=solicitacao.procedimento_id,
+        status="PENDENTE"
+    )
+    db.add(db_solicitacao)
+    await db.commit()
+    return db_solicitacao
+
+async def get_solicitacao_async(db: AsyncSession, solicitacao_id: int):
+    """Versão assíncrona de get_solicitacao."""
+    return await db.get(models.Solicitacao, solicitacao_id)
+
+async def update_solicitacao_status_async(db: AsyncSession, solicitacao_id: int, status_update: schemas.SolicitacaoStatusUpdate, mensagem: str | None = None):
+    """Versão assíncrona de update_solicitacao_status."""
+    db_solicitacao = await get_solicitacao_async(db, solicitacao_id)
+
+    if db_solicitacao:
+        db_solicitacao.status = status_update.status
+        db_solicitacao.justificativa = status_update.justificativa
+
+        if mensagem:
+            add_notificacao(db, db_solicitacao.paciente_id, mensagem)
+
+        await db.commit()
+
+    return db_solicitacao
+
+async def reservar_vaga_async(db: AsyncSession, oferta_id: int, quantidade: int = 1):
+    """Versão assíncrona de reservar_vaga. Não faz commit."""
+    resultado = await db.execute(
+        update(models.OfertaProgramada)
+        .where(
+            models.OfertaProgramada.id == oferta_id,
+            models.OfertaProgramada.vagas_disponiveis >= quantidade
+        )
+        .values(vagas_disponiveis=models.OfertaProgramada.vagas_disponiveis - quantidade)
+        .returning(models.OfertaProgramada.vagas_disponiveis)
+        .execution_options(synchronize_session=False)
+    )
+    return resultado.scalar_one_or_none()
+
+async def create_marcacao_async(db: AsyncSession, solicitacao: models.Solicitacao, oferta: models.OfertaProgramada, mensagem: str | None = None):
+    """Versão assíncrona de create_marcacao. Retorna None se a oferta não tiver mais vagas."""
+    vagas_restantes = await reservar_vaga_async(db, oferta.id)
+    if vagas_restantes is None:
+        inventario.atualizar_vagas(oferta.id, 0)
+        return None
+
+    db.add(models.Marcacao(solicitacao_id=solicitacao.id, oferta_id=oferta.id))
+    solicitacao.status = "AGENDADA"
+
+    if mensagem:
+        add_notificacao(db, solicitacao.paciente_id, mensagem)
+
+    await db.commit()
+
+    inventario.atualizar_vagas(oferta.id, vagas_restantes)
+
+    return solicitacao
+
+async def create_oferta_async(db: AsyncSession, oferta: schemas.OfertaCreate):
+    """Versão assíncrona de create_oferta."""
+    db_oferta = models.OfertaProgramada(**oferta.model_dump())
+    db.add(db_oferta)
+    await db.commit()
+
+    unidade = referencias.unidade(db_oferta.unidade_id)
+    if unidade is None:
+        unidade = await db.run_sync(lambda sessao: referencias.unidade(db_oferta.unidade_id, sessao))
+    if unidade:
+        inventario.registrar_oferta(db_oferta, unidade)
+    return db_oferta
+
+async def get_ofertas_async(db: AsyncSession, oferta_ids: list[int]):
+    """Versão assíncrona de get_ofertas."""
+    ofertas = (await db.execute(
+        select(models.OfertaProgramada).where(models.OfertaProgramada.id.in_(oferta_ids))
+    )).scalars().all()
+    return {oferta.id: oferta for oferta in ofertas}
+
+async def get_marcacao_async(db: AsyncSession, marcacao_id: int):
+    """Versão assíncrona de get_marcacao."""
+    return await db.get(models.Marcacao, marcacao_id)
+
+async def get_marcacao_da_solicitacao_async(db: AsyncSession, solicitacao_id: int):
+    """Versão assíncrona de get_marcacao_da_solicitacao."""
+    return (await db.execute(
+        select(models.Marcacao).where(models.Marcacao.solicitacao_id == solicitacao_id)
+        .order_by(models.Marcacao.id.desc()).limit(1)
+    )).scalars().first()
+
+async def update_marcacao_status_paciente_async(db: AsyncSession, db_marcacao: models.Marcacao, status: str):
+    """Versão assíncrona de update_marcacao_status_paciente."""
+    db_marcacao.status_confirmacao_paciente = status
+    await db.commit()
+    return db_marcacao
+
+async def get_pagina_async(db: AsyncSession, consulta, limite: int):
+    """Versão assíncrona de get_pagina."""
+    linhas = (await db.execute(consulta.limit(limite + 1))).all()
+    return linhas[:limite], len(linhas) > limite
@@ -1,17 +1,20 @@
-from faker import Faker
+import logging
 from sqlalchemy.orm import Session
 from . import models
-from .logging_config import logger
 from random import choice, randint
 from datetime import date, timedelta
 
-fake = Faker('pt_BR')
+logger = logging.getLogger(__name__)
 
 def generate_fake_data(db: Session):
     if db.query(models.Unidade).count() > 0:
         logger.info("Dados já existem no banco. Geração de dados pulada.")
         return
 
+    # Importado aqui: o Faker é pesado e só é usado ao semear o banco (src/inicializacao.py)
+    from faker import Faker
+    fake = Faker('pt_BR')
+
     logger.info("Gerando dados sintéticos...")
 
     # Gerar Unidades de Saúde (usando um método mais robusto do Faker)
@@ -39,11 +42,13 @@ def generate_fake_data(db: Session):
     db.commit()
 
     # Gerar Ofertas Programadas (Agenda)
+    # Busca os procedimentos uma única vez, fora do laço
     ofertas = []
     today = date.today()
+    todos_procedimentos = db.query(models.Procedimento).all()
     for unidade in db.query(models.Unidade).all():
         for _ in range(5):
-            proc = choice(db.query(models.Procedimento).all())
+            proc = choice(todos_procedimentos)
             data_oferta = today + timedelta(days=randint(1, 30))
             oferta = models.OfertaProgramada(
                 unidade_id=unidade.id,
@@ -55,4 +60,5 @@ def generate_fake_data(db: Session):
     db.add_all(ofertas)
     db.commit()
 
-    logger.info("Geração de dados sintéticos concluída.")
\ No newline at end of file
+    logger.info("Geração de dados sintéticos concluída.")
+    # Para volumes maiores (testes de carga), use o gerador em massa: python -m src.gerador_massa
\ No newline at end of file
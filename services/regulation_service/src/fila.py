@@ -0,0 +1,133 @@
+# Em services/regulation_service/src/fila.py
+
+import logging
+import os
+import queue
+import threading
+from sqlalchemy.orm import Session
+from . import models, agent
+from .referencias import referencias
+
+logger = logging.getLogger(__name__)
+
+# Máximo de solicitações EM FILA reprocessadas por vez. Mantém cada passo curto
+# para que a criação de ofertas nunca espere por um reprocessamento grande.
+FILA_LOTE_MAX = int(os.getenv("FILA_LOTE_MAX", "50"))
+# Lote que não pôde ser agendado (conflitos persistentes): volta para a fila
+# depois de um backoff exponencial e é descartado após FILA_MAX_TENTATIVAS.
+FILA_MAX_TENTATIVAS = int(os.getenv("FILA_MAX_TENTATIVAS", "5"))
+FILA_BACKOFF_BASE_SEGUNDOS = float(os.getenv("FILA_BACKOFF_BASE_SEGUNDOS", "1"))
+FILA_BACKOFF_MAX_SEGUNDOS = float(os.getenv("FILA_BACKOFF_MAX_SEGUNDOS", "60"))
+
+def calcular_backoff(tentativas: int) -> float:
+    """Espera antes de repetir um lote que já falhou 'tentativas' vezes."""
+    return min(FILA_BACKOFF_BASE_SEGUNDOS * (2 ** (tentativas - 1)), FILA_BACKOFF_MAX_SEGUNDOS)
+
+class ReprocessadorFila:
+    """
+    Reprocessa de forma incremental as solicitações EM FILA quando surgem novas vagas.
+    Cada nova oferta gera um item (procedimento, vagas); um worker em segundo plano
+    considera apenas as solicitações em fila daquele procedimento, em ordem de
+    chegada, em lotes de no máximo FILA_LOTE_MAX. Se ainda sobrarem vagas, o
+    restante volta para o fim da fila de trabalho, continuando de onde parou.
+    Um lote que não consegue ser agendado volta depois de um backoff, sem
+    segurar o worker, e é descartado depois de FILA_MAX_TENTATIVAS.
+    """
+
+    def __init__(self, tamanho_lote: int = FILA_LOTE_MAX):
+        self.tamanho_lote = tamanho_lote
+        self._itens = queue.Queue()
+        self._thread = None
+        self._esperas = set()
+        self._trava = threading.Lock()
+
+    def enfileirar(self, procedimento_id: int, vagas: int, apos_id: int = 0, tentativas: int = 0):
+        """Agenda o reprocessamento da fila de um procedimento que ganhou 'vagas' novas."""
+        if vagas > 0:
+            self._itens.put((procedimento_id, vagas, apos_id, tentativas))
+
+    def _reenfileirar(self, codigo: str, procedimento_id: int, vagas: int, apos_id: int, tentativas: int):
+        """Devolve o item à fila depois do backoff, ou o descarta se já esgotou as tentativas."""
+        if tentativas >= FILA_MAX_TENTATIVAS:
+            logger.error("Reprocessamento da fila do procedimento %s descartado após %s tentativas (%s vagas a partir da solicitação %s).",
+                         codigo, tentativas, vagas, apos_id)
+            return
+        espera = calcular_backoff(tentativas)
+        logger.warning("Não foi possível reprocessar a fila do procedimento %s. Nova tentativa em %.1fs.", codigo, espera)
+
+        def _devolver():
+            with self._trava:
+                self._esperas.discard(timer)
+            self.enfileirar(procedimento_id, vagas, apos_id, tentativas)
+
+        timer = threading.Timer(espera, _devolver)
+        timer.daemon = True
+        with self._trava:
+            self._esperas.add(timer)
+        timer.start()
+
+    def processar_item(self, db: Session, procedimento_id: int, vagas: int, apos_id: int = 0, tentativas: int = 0):
+        """Executa um passo do reprocessamento. Retorna quantas solicitações foram agendadas."""
+        procedimento = referencias.procedimento(procedimento_id, db)
+        if procedimento is None:
+            return 0
+
+        limite = min(vagas, self.tamanho_lote)
+        solicitacoes = db.query(models.Solicitacao).filter(
+            models.Solicitacao.status == "EM FILA",
+            models.Solicitacao.procedimento_id == procedimento.procedimento_id,
+            models.Solicitacao.id > apos_id
+        ).order_by(models.Solicitacao.id).limit(limite).all()
+
+        if not solicitacoes:
+            return 0
+
+        ultimo_id = solicitacoes[-1].id
+
+        resultado = agent.schedule_batch(db, solicitacoes, "prioridade")
+        if resultado is None:
+            self._reenfileirar(procedimento.procedimento_id, procedimento_id, vagas, apos_id, tentativas + 1)
+            return 0
+        alocacoes, _ = resultado
+
+        logger.info("Fila do procedimento %s: %s de %s solicitações agendadas.", procedimento.procedimento_id, len(alocacoes), len(solicitacoes))
+
+        # Lote cheio e ainda há vagas: continua depois, a partir da última solicitação vista
+        if len(solicitacoes) == limite and vagas - len(alocacoes) > 0:
+            self.enfileirar(procedimento_id, vagas - len(alocacoes), ultimo_id)
+
+        return len(alocacoes)
+
+    def iniciar(self, session_factory):
+        """Inicia o worker que drena os itens de reprocessamento."""
+        if self._thread is not None:
+            return
+
+        def _loop():
+            while True:
+                item = self._itens.get()
+                if item is None:
+                    break
+                db = session_factory()
+                try:
+                    self.processar_item(db, *item)
+                except Exception as e:
+                    logger.error("Erro ao reprocessar a fila de solicitações: %s", e)
+                finally:
+                    db.close()
+
+        self._thread = threading.Thread(target=_loop, name="reprocessador-fila", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        with self._trava:
+            esperas, self._esperas = self._esperas, set()
+        for timer in esperas:
+            timer.cancel()
+        if self._thread is not None:
+            self._itens.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+# Instância única do processo, alimentada pelo endpoint de criação de ofertas
+reprocessador_fila = ReprocessadorFila()
@@ -0,0 +1,33 @@
+# Em services/regulation_service/src/geo.py
+
+from math import radians, sin, cos, sqrt, atan2
+import numpy as np
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """Calcula a distância em km entre dois pontos geográficos."""
+    R = 6371  # Raio da Terra em km
+
+    dLat = radians(lat2 - lat1)
+    dLon = radians(lon2 - lon1)
+    lat1 = radians(lat1)
+    lat2 = radians(lat2)
+
+    a = sin(dLat / 2)**2 + cos(lat1) * cos(lat2) * sin(dLon / 2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+
+    return R * c
+
+def haversine_distances(lat, lon, lats, lons):
+    """Versão vetorizada de haversine_distance: distâncias em km de um ponto para vários."""
+    R = 6371  # Raio da Terra em km
+
+    # Mesma sequência de operações da versão escalar, para que empates sejam resolvidos igual
+    dLat = np.radians(lats - lat)
+    dLon = np.radians(lons - lon)
+    lat1 = np.radians(lat)
+    lats2 = np.radians(lats)
+
+    a = np.sin(dLat / 2)**2 + np.cos(lat1) * np.cos(lats2) * np.sin(dLon / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return R * c
@@ -0,0 +1,279 @@
+# Em services/regulation_service/src/gerador_massa.py
+"""
+Gerador de dados sintéticos em massa, para testes de carga em escala nacional.
+
+Gera unidades (concentradas em torno das capitais, proporcionalmente à
+população), procedimentos (com demanda concentrada em poucos deles, como na
+vida real), ofertas (passadas, já esgotadas, e futuras, com vagas),
+solicitações históricas em todos os status e as marcações das agendadas e
+concluídas.
+
+Os dados são gerados em blocos com NumPy e gravados com COPY (Postgres com
+psycopg2) ou com INSERTs em lote do SQLAlchemy Core (demais bancos), um bloco
+por transação. Cada bloco tem o seu gerador aleatório derivado da seed, então
+a mesma seed com os mesmos parâmetros sempre produz exatamente os mesmos dados.
+
+As tabelas precisam existir (alembic upgrade head) e estar vazias, ou use --limpar.
+
+Uso (a partir de services/regulation_service):
+    python -m src.gerador_massa --unidades 40000 --procedimentos 500 --ofertas 5000000 --solicitacoes 2000000
+    python -m src.gerador_massa --url sqlite:///teste.db --ofertas 100000 --solicitacoes 50000 --limpar
+"""
+
+import argparse
+import csv
+import io
+import sys
+import time
+from datetime import date
+
+import numpy as np
+from sqlalchemy import create_engine, inspect, insert, text
+
+from . import models
+from .database import SQLALCHEMY_DATABASE_URL
+
+# Linhas geradas e gravadas por bloco (e por transação)
+BLOCO_LINHAS = 50_000
+
+# Capitais: (nome, latitude, longitude, população aproximada em milhões)
+CAPITAIS = [
+    ("São Paulo", -23.55, -46.63, 11.5), ("Rio de Janeiro", -22.91, -43.17, 6.2),
+    ("Brasília", -15.79, -47.88, 2.8), ("Fortaleza", -3.73, -38.52, 2.4),
+    ("Salvador", -12.97, -38.50, 2.4), ("Belo Horizonte", -19.92, -43.94, 2.3),
+    ("Manaus", -3.12, -60.02, 2.1), ("Curitiba", -25.43, -49.27, 1.8),
+    ("Recife", -8.05, -34.88, 1.5), ("Goiânia", -16.68, -49.25, 1.4),
+    ("Belém", -1.46, -48.49, 1.3), ("Porto Alegre", -30.03, -51.23, 1.3),
+    ("São Luís", -2.53, -44.30, 1.0), ("Maceió", -9.67, -35.74, 1.0),
+    ("Campo Grande", -20.47, -54.62, 0.9), ("Teresina", -5.09, -42.80, 0.9),
+    ("Natal", -5.79, -35.21, 0.8), ("João Pessoa", -7.12, -34.86, 0.8),
+    ("Cuiabá", -15.60, -56.10, 0.6), ("Aracaju", -10.91, -37.07, 0.6),
+    ("Florianópolis", -27.60, -48.55, 0.5), ("Porto Velho", -8.76, -63.90, 0.5),
+    ("Macapá", -0.03, -51.07, 0.5), ("Rio Branco", -9.97, -67.81, 0.4),
+    ("Vitória", -20.32, -40.34, 0.4), ("Boa Vista", 2.82, -60.67, 0.4),
+    ("Palmas", -10.18, -48.33, 0.3),
+]
+
+NOMES_PROCEDIMENTOS = [
+    "CONSULTA CARDIOLOGIA", "RAIO-X DE TORAX", "EXAME DE SANGUE", "FISIOTERAPIA MOTORA",
+    "CONSULTA ORTOPEDIA", "ULTRASSONOGRAFIA ABDOMINAL", "TOMOGRAFIA", "RESSONANCIA MAGNETICA",
+    "CONSULTA OFTALMOLOGIA", "MAMOGRAFIA", "ELETROCARDIOGRAMA", "CONSULTA DERMATOLOGIA",
+    "ENDOSCOPIA", "COLONOSCOPIA", "CONSULTA NEUROLOGIA", "CONSULTA ENDOCRINOLOGIA",
+]
+
+HORARIOS = np.array([f"{h:02d}:{m:02d}" for h in range(7, 18) for m in (0, 30)], dtype=object)
+
+# Distribuição dos status das solicitações históricas
+STATUS_SOLICITACAO = np.array(["AGENDADA", "CONCLUIDA", "CANCELADA", "NEGADA", "EM FILA", "PENDENTE"], dtype=object)
+PROB_STATUS = [0.35, 0.30, 0.08, 0.07, 0.10, 0.10]
+
+TABELAS = ["marcacoes", "solicitacoes", "ofertas_programadas", "procedimentos", "unidades"]
+
+def _rng(seed, tabela, bloco):
+    """Gerador aleatório próprio de cada bloco de cada tabela."""
+    return np.random.default_rng([seed, TABELAS.index(tabela), bloco])
+
+def _blocos(total):
+    for bloco, inicio in enumerate(range(0, total, BLOCO_LINHAS)):
+        yield bloco, inicio, min(inicio + BLOCO_LINHAS, total)
+
+def _popularidade(n, expoente=0.8):
+    """Pesos tipo Zipf: poucos procedimentos concentram a maior parte da demanda."""
+    pesos = 1.0 / np.arange(1, n + 1) ** expoente
+    return pesos / pesos.sum()
+
+# --- Geração das colunas de cada bloco ---
+
+def _unidades(rng, inicio, fim):
+    n = fim - inicio
+    pesos = np.array([c[3] for c in CAPITAIS])
+    capital = rng.choice(len(CAPITAIS), size=n, p=pesos / pesos.sum())
+    lats = np.array([c[1] for c in CAPITAIS])[capital] + rng.normal(0, 0.4, n)
+    lons = np.array([c[2] for c in CAPITAIS])[capital] + rng.normal(0, 0.4, n)
+    ids = np.arange(inicio + 1, fim + 1)
+    nomes = np.array([c[0] for c in CAPITAIS], dtype=object)[capital]
+    return {
+        "id": ids,
+        "cnes_id": np.array([f"CNES_{i}" for i in ids.tolist()], dtype=object),
+        "nome": np.array([f"Unidade de Saúde {i} - {cidade}" for i, cidade in zip(ids.tolist(), nomes)], dtype=object),
+        "latitude": np.round(lats, 6),
+        "longitude": np.round(lons, 6),
+    }
+
+def _procedimentos(rng, inicio, fim):
+    ids = np.arange(inicio + 1, fim + 1)
+    base = len(NOMES_PROCEDIMENTOS)
+    return {
+        "id": ids,
+        "procedimento_id": np.array([f"PROC_{i}" for i in ids.tolist()], dtype=object),
+        "nome": np.array([NOMES_PROCEDIMENTOS[(i - 1) % base] + ("" if i <= base else f" {(i - 1) // base + 1}")
+                          for i in ids.tolist()], dtype=object),
+    }
+
+def _ofertas(rng, inicio, fim, n_unidades, pesos_procedimentos, hoje, dias_historico, dias_futuro):
+    n = fim - inicio
+    dias = rng.integers(-dias_historico, dias_futuro + 1, n)
+    vagas = rng.integers(1, 6, n)
+    # Ofertas passadas já foram consumidas; parte das futuras também já lotou
+    vagas[(dias < 1) | (rng.random(n) < 0.2)] = 0
+    return {
+        "id": np.arange(inicio + 1, fim + 1),
+        "unidade_id": rng.integers(1, n_unidades + 1, n),
+        "procedimento_id": rng.choice(len(pesos_procedimentos), size=n, p=pesos_procedimentos) + 1,
+        "data_agendamento": np.datetime64(hoje, "D") + dias,
+        "vagas_disponiveis": vagas,
+        "horario": HORARIOS[rng.integers(0, len(HORARIOS), n)],
+    }
+
+def _solicitacoes(rng, inicio, fim, n_unidades, pesos_procedimentos, n_pacientes, hoje, dias_historico):
+    n = fim - inicio
+    procedimentos = rng.choice(len(pesos_procedimentos), size=n, p=pesos_procedimentos) + 1
+    status = STATUS_SOLICITACAO[rng.choice(len(STATUS_SOLICITACAO), size=n, p=PROB_STATUS)]
+    criacao = (np.datetime64(hoje, "s") - rng.integers(0, max(dias_historico, 1) * 86400, n).astype("timedelta64[s]"))
+    atualizacao = criacao + rng.integers(600, 3 * 86400, n).astype("timedelta64[s]")
+    atualizacao[status == "PENDENTE"] = np.datetime64("NaT")
+    justificativa = np.full(n, None, dtype=object)
+    justificativa[status == "NEGADA"] = "Sem indicação clínica para o procedimento."
+    justificativa[status == "CANCELADA"] = "Agendamento recusado pelo paciente."
+    return {
+        "id": np.arange(inicio + 1, fim + 1),
+        "paciente_id": np.array([f"PACIENTE_{p}" for p in rng.integers(1, n_pacientes + 1, n).tolist()], dtype=object),
+        "unidade_solicitante_id_cnes": np.array([f"CNES_{u}" for u in rng.integers(1, n_unidades + 1, n).tolist()], dtype=object),
+        "procedimento_id": np.array([f"PROC_{p}" for p in procedimentos.tolist()], dtype=object),
+        "status": status,
+        "justificativa": justificativa,
+        "data_criacao": criacao,
+        "data_atualizacao": atualizacao,
+    }, procedimentos
+
+def _marcacoes(rng, solicitacoes, procedimentos, ofertas_por_procedimento, proxima_id):
+    """Uma marcação, numa oferta do mesmo procedimento, para cada solicitação agendada ou concluída."""
+    ordem, inicio_grupo, tamanho_grupo = ofertas_por_procedimento
+    status = solicitacoes["status"]
+    com_marcacao = np.flatnonzero(((status == "AGENDADA") | (status == "CONCLUIDA")) & (tamanho_grupo[procedimentos] > 0))
+    procs = procedimentos[com_marcacao]
+    sorteio = (rng.random(len(com_marcacao)) * tamanho_grupo[procs]).astype(np.int64)
+    confirmacao = np.where(status[com_marcacao] == "CONCLUIDA", "CONFIRMADO",
+                           np.where(rng.random(len(com_marcacao)) < 0.5, "CONFIRMADO", "PENDENTE")).astype(object)
+    return {
+        "id": np.arange(proxima_id, proxima_id + len(com_marcacao)),
+        "solicitacao_id": solicitacoes["id"][com_marcacao],
+        "oferta_id": ordem[inicio_grupo[procs] + sorteio] + 1,
+        "data_criacao": solicitacoes["data_atualizacao"][com_marcacao],
+        "status_confirmacao_paciente": confirmacao,
+    }
+
+# --- Escrita ---
+
+def _escrever(conexao, tabela: str, colunas: dict):
+    """Grava um bloco: COPY no Postgres (psycopg2), INSERT em lote nos demais."""
+    nomes = list(colunas)
+    linhas = zip(*(c.tolist() for c in colunas.values()))
+    if conexao.dialect.driver == "psycopg2":
+        # No CSV do COPY, um campo vazio sem aspas é NULL
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(linhas)
+        buffer.seek(0)
+        cursor = conexao.connection.cursor()
+        cursor.copy_expert(f"COPY {tabela} ({', '.join(nomes)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.close()
+        return
+    conexao.execute(insert(models.Base.metadata.tables[tabela]), [dict(zip(nomes, valores)) for valores in linhas])
+
+def _preparar(engine, limpar: bool):
+    existentes = set(inspect(engine).get_table_names())
+    faltando = [t for t in TABELAS if t not in existentes]
+    if faltando:
+        sys.exit(f"Tabelas inexistentes: {', '.join(faltando)}. Rode 'alembic upgrade head' antes.")
+    with engine.begin() as conexao:
+        if limpar:
+            for tabela in TABELAS:
+                conexao.execute(text(f"DELETE FROM {tabela}"))
+        ocupadas = [t for t in TABELAS if conexao.execute(text(f"SELECT 1 FROM {t} LIMIT 1")).first()]
+    if ocupadas:
+        sys.exit(f"As tabelas {', '.join(ocupadas)} já têm dados. Use --limpar para apagá-los antes.")
+
+def _finalizar(engine):
+    """No Postgres, ajusta as sequências dos ids (gravados explicitamente) e atualiza as estatísticas."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conexao:
+        for tabela in TABELAS:
+            conexao.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{tabela}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {tabela}"
+            ))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexao:
+        conexao.execute(text("ANALYZE"))
+
+def gerar(engine, n_unidades, n_procedimentos, n_ofertas, n_solicitacoes, seed=42,
+          dias_historico=365, dias_futuro=60, hoje=None, limpar=False):
+    """Gera e grava toda a massa de dados. Retorna {tabela: linhas gravadas}."""
+    hoje = hoje or date.today()
+    _preparar(engine, limpar)
+    pesos_procedimentos = _popularidade(n_procedimentos)
+    totais = dict.fromkeys(TABELAS, 0)
+
+    def _gravar(tabela, colunas):
+        with engine.begin() as conexao:
+            _escrever(conexao, tabela, colunas)
+        totais[tabela] += len(colunas["id"])
+
+    for bloco, inicio, fim in _blocos(n_unidades):
+        _gravar("unidades", _unidades(_rng(seed, "unidades", bloco), inicio, fim))
+    for bloco, inicio, fim in _blocos(n_procedimentos):
+        _gravar("procedimentos", _procedimentos(_rng(seed, "procedimentos", bloco), inicio, fim))
+
+    # O procedimento de cada oferta fica em memória para sortear as ofertas das marcações
+    procedimento_da_oferta = np.zeros(n_ofertas, dtype=np.int32)
+    for bloco, inicio, fim in _blocos(n_ofertas):
+        colunas = _ofertas(_rng(seed, "ofertas_programadas", bloco), inicio, fim, n_unidades,
+                           pesos_procedimentos, hoje, dias_historico, dias_futuro)
+        procedimento_da_oferta[inicio:fim] = colunas["procedimento_id"]
+        _gravar("ofertas_programadas", colunas)
+
+    ordem = np.argsort(procedimento_da_oferta, kind="stable")
+    tamanho_grupo = np.bincount(procedimento_da_oferta, minlength=n_procedimentos + 1)
+    inicio_grupo = np.concatenate(([0], np.cumsum(tamanho_grupo)[:-1]))
+    ofertas_por_procedimento = (ordem, inicio_grupo, tamanho_grupo)
+
+    n_pacientes = max(n_solicitacoes // 3, 1)
+    for bloco, inicio, fim in _blocos(n_solicitacoes):
+        rng = _rng(seed, "solicitacoes", bloco)
+        solicitacoes, procedimentos = _solicitacoes(rng, inicio, fim, n_unidades, pesos_procedimentos,
+                                                    n_pacientes, hoje, dias_historico)
+        _gravar("solicitacoes", solicitacoes)
+        marcacoes = _marcacoes(_rng(seed, "marcacoes", bloco), solicitacoes, procedimentos,
+                               ofertas_por_procedimento, totais["marcacoes"] + 1)
+        if len(marcacoes["id"]):
+            _gravar("marcacoes", marcacoes)
+
+    _finalizar(engine)
+    return totais
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos em massa para o regulation-service.")
+    parser.add_argument("--url", default=SQLALCHEMY_DATABASE_URL, help="URL SQLAlchemy síncrona (padrão: a do serviço)")
+    parser.add_argument("--unidades", type=int, default=5000)
+    parser.add_argument("--procedimentos", type=int, default=200)
+    parser.add_argument("--ofertas", type=int, default=1_000_000)
+    parser.add_argument("--solicitacoes", type=int, default=500_000, help="Solicitações históricas")
+    parser.add_argument("--dias-historico", type=int, default=365)
+    parser.add_argument("--dias-futuro", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--limpar", action="store_true", help="Apaga os dados existentes antes de gerar")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    inicio = time.perf_counter()
+    totais = gerar(engine, args.unidades, args.procedimentos, args.ofertas, args.solicitacoes, seed=args.seed,
+                   dias_historico=args.dias_historico, dias_futuro=args.dias_futuro, limpar=args.limpar)
+    duracao = time.perf_counter() - inicio
+    engine.dispose()
+
+    for tabela in reversed(TABELAS):
+        print(f"{tabela:>20}: {totais[tabela]:>10,} linhas")
+    total = sum(totais.values())
+    print(f"{total:,} linhas em {duracao:.1f} s ({total / duracao:,.0f} linhas/s)")
+
+if __name__ == "__main__":
+    main()
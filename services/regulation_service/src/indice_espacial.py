@@ -0,0 +1,132 @@
+# Em services/regulation_service/src/indice_espacial.py
+
+import logging
+import os
+import threading
+from math import cos, radians, floor
+import numpy as np
+from sqlalchemy.orm import Session
+from . import models
+from .geo import haversine_distances
+
+logger = logging.getLogger(__name__)
+
+# Tamanho (em graus) de cada célula da grade. 0.5° ≈ 55 km de latitude.
+INDICE_CELULA_GRAUS = float(os.getenv("INDICE_CELULA_GRAUS", "0.5"))
+
+KM_POR_GRAU = 111.195  # Comprimento de 1° de latitude (R * pi / 180)
+MAX_DISTANCIA_KM = 20016  # Meia circunferência da Terra
+
+class IndiceEspacial:
+    """
+    Índice espacial das unidades em uma grade regular de latitude/longitude
+    (equivalente a um geohash de precisão fixa). Cada célula guarda as unidades
+    que caem nela, então as consultas só calculam distâncias para as células
+    próximas ao ponto, em vez de para todas as unidades.
+    """
+
+    def __init__(self, tamanho_celula: float = INDICE_CELULA_GRAUS):
+        self.tamanho_celula = tamanho_celula
+        self._lock = threading.Lock()
+        self._construir(np.empty(0, np.int64), np.empty(0), np.empty(0))
+        self.pronto = False
+
+    def _celula(self, lat, lon):
+        return (np.floor(np.asarray(lat) / self.tamanho_celula).astype(np.int64),
+                np.floor(np.asarray(lon) / self.tamanho_celula).astype(np.int64))
+
+    def _construir(self, ids, lats, lons):
+        # Ordena as unidades por célula para que cada célula seja uma fatia contígua
+        linhas, colunas = self._celula(lats, lons)
+        ordem = np.lexsort((colunas, linhas))
+        self.ids = np.asarray(ids, dtype=np.int64)[ordem]
+        self.lats = np.asarray(lats, dtype=np.float64)[ordem]
+        self.lons = np.asarray(lons, dtype=np.float64)[ordem]
+
+        linhas, colunas = linhas[ordem], colunas[ordem]
+        inicio_celula = np.flatnonzero(
+            np.r_[True, (linhas[1:] != linhas[:-1]) | (colunas[1:] != colunas[:-1])]
+        ) if len(ordem) else np.empty(0, np.int64)
+        fim_celula = np.r_[inicio_celula[1:], len(ordem)]
+        self._celulas = {
+            (int(linhas[i]), int(colunas[i])): (int(i), int(f))
+            for i, f in zip(inicio_celula, fim_celula)
+        }
+
+    def construir(self, ids, lats, lons):
+        """Reconstrói o índice a partir das colunas de unidades (ids, latitudes, longitudes)."""
+        with self._lock:
+            self._construir(ids, lats, lons)
+            self.pronto = True
+
+    def adicionar(self, unidade_id: int, lat: float, lon: float):
+        """Inclui uma unidade sem reconstruir o índice: ela entra no fim da fatia da sua célula."""
+        celula = tuple(int(v) for v in self._celula(lat, lon))
+        with self._lock:
+            if (self.ids == unidade_id).any():
+                return
+            fatia = self._celulas.get(celula)
+            pos = fatia[1] if fatia else len(self.ids)
+            self.ids = np.insert(self.ids, pos, unidade_id)
+            self.lats = np.insert(self.lats, pos, lat)
+            self.lons = np.insert(self.lons, pos, lon)
+            if fatia:
+                # As células a partir da posição inserida andam uma casa
+                self._celulas = {c: (i + (i >= pos), f + (f >= pos)) for c, (i, f) in self._celulas.items()}
+            else:
+                self._celulas[celula] = (pos, pos + 1)
+
+    def carregar(self, db: Session):
+        """Reconstrói o índice a partir da tabela de unidades."""
+        linhas = db.query(models.Unidade.id, models.Unidade.latitude, models.Unidade.longitude).all()
+        ids, lats, lons = zip(*linhas) if linhas else ((), (), ())
+        self.construir(ids, lats, lons)
+        logger.info("Índice espacial construído com %s unidades em %s células.", len(linhas), len(self._celulas))
+
+    def _posicoes_no_raio(self, lat, lon, raio_km):
+        """Posições (nos arrays internos) das unidades nas células que cobrem o raio."""
+        # Um grau de longitude encolhe com cos(lat): usamos a latitude mais extrema da faixa
+        dlat = raio_km / KM_POR_GRAU
+        cos_lat = cos(radians(min(abs(lat) + dlat, 90.0)))
+        dlon = dlat / cos_lat if cos_lat > 1e-6 else 360.0
+
+        linha_min, linha_max = floor((lat - dlat) / self.tamanho_celula), floor((lat + dlat) / self.tamanho_celula)
+        coluna_min, coluna_max = floor((lon - dlon) / self.tamanho_celula), floor((lon + dlon) / self.tamanho_celula)
+
+        # Se a caixa cruza o antimeridiano ou cobre mais células do que existem,
+        # é mais simples (e barato) olhar todas as unidades
+        n_celulas = (linha_max - linha_min + 1) * (coluna_max - coluna_min + 1)
+        if lon - dlon < -180.0 or lon + dlon > 180.0 or n_celulas >= len(self._celulas):
+            return np.arange(len(self.ids))
+
+        fatias = []
+        for linha in range(linha_min, linha_max + 1):
+            for coluna in range(coluna_min, coluna_max + 1):
+                fatia = self._celulas.get((linha, coluna))
+                if fatia:
+                    fatias.append(np.arange(*fatia))
+        return np.concatenate(fatias) if fatias else np.empty(0, np.int64)
+
+    def no_raio(self, lat: float, lon: float, raio_km: float):
+        """Unidades a até 'raio_km' do ponto: (ids, distâncias em km), ordenadas por distância."""
+        with self._lock:
+            posicoes = self._posicoes_no_raio(lat, lon, raio_km)
+            distancias = haversine_distances(lat, lon, self.lats[posicoes], self.lons[posicoes])
+            dentro = distancias <= raio_km
+            ids, distancias = self.ids[posicoes][dentro], distancias[dentro]
+        ordem = np.argsort(distancias, kind="stable")
+        return ids[ordem], distancias[ordem]
+
+    def mais_proximos(self, lat: float, lon: float, k: int):
+        """As k unidades mais próximas do ponto: (ids, distâncias em km), ordenadas por distância."""
+        # Aumenta o raio até encontrar k unidades; a consulta por raio é exata,
+        # então as k primeiras dentro dele são de fato as k mais próximas.
+        raio = self.tamanho_celula * KM_POR_GRAU
+        while True:
+            ids, distancias = self.no_raio(lat, lon, raio)
+            if len(ids) >= k or raio >= MAX_DISTANCIA_KM:
+                return ids[:k], distancias[:k]
+            raio *= 2
+
+# Instância única do processo com todas as unidades cadastradas
+indice_unidades = IndiceEspacial()
@@ -0,0 +1,106 @@
+# Em services/regulation_service/src/inicializacao.py
+"""
+Inicialização do banco do regulation-service.
+
+Comando único, rodado uma vez por deploy antes de subir os workers (no
+docker-compose, o serviço regulation_init). Aplica as migrações e, se
+pedido, gera os dados sintéticos de demonstração. Os workers não criam
+tabelas nem geram dados no startup, então sobem rápido e vários podem subir
+ao mesmo tempo sem disputar o DDL.
+
+Uso (a partir de services/regulation_service):
+    python -m src.inicializacao             # alembic upgrade head
+    python -m src.inicializacao --semear    # e gera os dados de demonstração, se o banco estiver vazio
+"""
+
+import argparse
+import logging
+import os
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from .database import SQLALCHEMY_DATABASE_URL
+from .logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+# Chave do advisory lock que serializa inicializações concorrentes no Postgres
+CHAVE_LOCK_INICIALIZACAO = 724_015
+
+# Revisão que corresponde às tabelas criadas pelo antigo create_all do startup
+REVISAO_ESQUEMA_INICIAL = "0001"
+TABELAS_ESQUEMA_INICIAL = {"unidades", "procedimentos", "solicitacoes", "ofertas_programadas", "marcacoes"}
+
+def _config_alembic(url: str):
+    cfg = Config(str(RAIZ / "alembic.ini"))
+    cfg.set_main_option("script_location", str(RAIZ / "migrations"))
+    cfg.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    # Mantém a configuração de logging do serviço
+    cfg.attributes["configurar_logging"] = False
+    return cfg
+
+def migrar(url: str = SQLALCHEMY_DATABASE_URL):
+    """Aplica as migrações pendentes (alembic upgrade head)."""
+    cfg = _config_alembic(url)
+    engine = create_engine(url)
+    try:
+        tabelas = set(inspect(engine).get_table_names())
+    finally:
+        engine.dispose()
+    # Banco criado pelo create_all antigo: já tem o esquema inicial, só não está registrado.
+    # O que veio depois (outbox, colunas e índices) as migrações seguintes criam se faltar.
+    if "unidades" in tabelas and "alembic_version" not in tabelas:
+        faltando = TABELAS_ESQUEMA_INICIAL - tabelas
+        if faltando:
+            raise RuntimeError(f"Banco sem histórico de migrações e sem parte do esquema inicial: {', '.join(sorted(faltando))}.")
+        logger.info("Banco sem histórico de migrações; marcando como revisão %s.", REVISAO_ESQUEMA_INICIAL)
+        command.stamp(cfg, REVISAO_ESQUEMA_INICIAL)
+    command.upgrade(cfg, "head")
+    logger.info("Migrações aplicadas.")
+
+def semear(url: str = SQLALCHEMY_DATABASE_URL):
+    """Gera os dados sintéticos de demonstração (não faz nada se já houver unidades)."""
+    from .data_generator import generate_fake_data
+    engine = create_engine(url)
+    db = sessionmaker(bind=engine)()
+    try:
+        generate_fake_data(db)
+    finally:
+        db.close()
+        engine.dispose()
+
+def inicializar(url: str = SQLALCHEMY_DATABASE_URL, com_dados: bool = False):
+    """Migra (e opcionalmente semeia) o banco; no Postgres, uma inicialização por vez."""
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conexao:
+            if engine.dialect.name == "postgresql":
+                conexao.execute(text("SELECT pg_advisory_lock(:chave)"), {"chave": CHAVE_LOCK_INICIALIZACAO})
+            try:
+                migrar(url)
+                if com_dados:
+                    semear(url)
+            finally:
+                if engine.dialect.name == "postgresql":
+                    conexao.execute(text("SELECT pg_advisory_unlock(:chave)"), {"chave": CHAVE_LOCK_INICIALIZACAO})
+    finally:
+        engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra (e opcionalmente semeia) o banco do regulation-service.")
+    parser.add_argument("--url", default=SQLALCHEMY_DATABASE_URL, help="URL SQLAlchemy síncrona (padrão: a do serviço)")
+    parser.add_argument("--semear", action="store_true",
+                        default=os.getenv("SEMEAR_DADOS", "false").lower() in ("1", "true", "sim"),
+                        help="Gera os dados de demonstração se o banco estiver vazio (ou SEMEAR_DADOS=true)")
+    args = parser.parse_args()
+    setup_logging("regulation-init")
+    inicializar(args.url, com_dados=args.semear)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# Em services/regulation_service/src/inventario.py
+
+import logging
+import os
+import threading
+from datetime import date
+from typing import NamedTuple
+import numpy as np
+from sqlalchemy.orm import Session
+from . import models
+from .referencias import referencias
+
+logger = logging.getLogger(__name__)
+
+# Intervalo (em segundos) entre as ressincronizações completas com o banco
+INVENTARIO_SYNC_SEGUNDOS = float(os.getenv("INVENTARIO_SYNC_SEGUNDOS", "60"))
+
+def _dia(data: date) -> int:
+    """Converte uma data no mesmo inteiro (dias desde 1970-01-01) usado nos arrays."""
+    return int(np.datetime64(data, "D").astype(np.int64))
+
+class Candidatos(NamedTuple):
+    """Colunas das ofertas candidatas de um procedimento, usadas pelo agente para ranquear."""
+    ids: np.ndarray
+    datas: np.ndarray  # Dias desde 1970-01-01
+    unidade_ids: np.ndarray
+    lats: np.ndarray
+    lons: np.ndarray
+    vagas: np.ndarray
+
+    def filtrar(self, mascara):
+        """Devolve só as linhas selecionadas pela máscara (ou pelos índices)."""
+        return Candidatos(*(coluna[mascara] for coluna in self))
+
+class _OfertasDoProcedimento:
+    """Colunas das ofertas abertas de um procedimento, ordenadas por data de agendamento."""
+
+    def __init__(self, ids, datas, unidade_ids, lats, lons, vagas):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.datas = np.asarray(datas, dtype=np.int64)
+        self.unidade_ids = np.asarray(unidade_ids, dtype=np.int64)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.vagas = np.asarray(vagas, dtype=np.int64)
+
+    def inserir(self, oferta_id, dia, unidade_id, lat, lon, vagas):
+        # 'right' mantém a ordem de chegada entre ofertas da mesma data
+        pos = int(np.searchsorted(self.datas, dia, side="right"))
+        self.ids = np.insert(self.ids, pos, oferta_id)
+        self.datas = np.insert(self.datas, pos, dia)
+        self.unidade_ids = np.insert(self.unidade_ids, pos, unidade_id)
+        self.lats = np.insert(self.lats, pos, lat)
+        self.lons = np.insert(self.lons, pos, lon)
+        self.vagas = np.insert(self.vagas, pos, vagas)
+
+class InventarioVagas:
+    """
+    Índice em memória (por processo) das ofertas com vagas, agrupadas por procedimento.
+    É mantido pelo crud a cada nova oferta/marcação e ressincronizado periodicamente
+    com o banco, já que outros workers também alteram as vagas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_procedimento: dict[int, _OfertasDoProcedimento] = {}
+        self._procedimento_da_oferta: dict[int, int] = {}
+        self.pronto = False
+        self._parar = threading.Event()
+        self._thread = None
+
+    def sincronizar(self, db: Session):
+        """Reconstrói o índice inteiro a partir do banco, numa única consulta."""
+        linhas = db.query(
+            models.OfertaProgramada.id,
+            models.OfertaProgramada.procedimento_id,
+            models.OfertaProgramada.data_agendamento,
+            models.OfertaProgramada.unidade_id,
+            models.OfertaProgramada.vagas_disponiveis,
+        ).filter(
+            models.OfertaProgramada.data_agendamento >= date.today(),
+            models.OfertaProgramada.vagas_disponiveis > 0
+        ).order_by(
+            models.OfertaProgramada.procedimento_id,
+            models.OfertaProgramada.data_agendamento,
+            models.OfertaProgramada.id
+        ).all()
+
+        # Coordenadas das unidades a partir do cache de referência, sem JOIN
+        referencias.recarregar_se_expirado(db)
+        unidade_ids = [linha[3] for linha in linhas]
+        lats, lons = referencias.coordenadas(unidade_ids)
+        if np.isnan(lats).any():
+            referencias.carregar(db)
+            lats, lons = referencias.coordenadas(unidade_ids)
+
+        agrupadas: dict[int, list] = {}
+        for (oferta_id, procedimento_id, data_agendamento, unidade_id, vagas), lat, lon in zip(linhas, lats.tolist(), lons.tolist()):
+            agrupadas.setdefault(procedimento_id, []).append(
+                (oferta_id, _dia(data_agendamento), unidade_id, lat, lon, vagas)
+            )
+
+        por_procedimento = {
+            procedimento_id: _OfertasDoProcedimento(*zip(*ofertas))
+            for procedimento_id, ofertas in agrupadas.items()
+        }
+        procedimento_da_oferta = {
+            oferta[0]: procedimento_id
+            for procedimento_id, ofertas in agrupadas.items()
+            for oferta in ofertas
+        }
+
+        with self._lock:
+            self._por_procedimento = por_procedimento
+            self._procedimento_da_oferta = procedimento_da_oferta
+            self.pronto = True
+
+        logger.info("Inventário de vagas sincronizado: %s ofertas abertas em %s procedimentos.", len(linhas), len(por_procedimento))
+
+    def registrar_oferta(self, oferta: models.OfertaProgramada, unidade):
+        """Inclui uma oferta recém-criada no índice."""
+        if oferta.vagas_disponiveis <= 0 or oferta.data_agendamento < date.today():
+            return
+
+        with self._lock:
+            if oferta.id in self._procedimento_da_oferta:
+                return
+            linha = (oferta.id, _dia(oferta.data_agendamento), unidade.id,
+                     unidade.latitude, unidade.longitude, oferta.vagas_disponiveis)
+            ofertas = self._por_procedimento.get(oferta.procedimento_id)
+            if ofertas is None:
+                self._por_procedimento[oferta.procedimento_id] = _OfertasDoProcedimento(*zip(linha))
+            else:
+                ofertas.inserir(*linha)
+            self._procedimento_da_oferta[oferta.id] = oferta.procedimento_id
+
+    def atualizar_vagas(self, oferta_id: int, vagas: int):
+        """Atualiza as vagas restantes de uma oferta (ofertas sem vagas deixam de ser candidatas)."""
+        with self._lock:
+            procedimento_id = self._procedimento_da_oferta.get(oferta_id)
+            if procedimento_id is None:
+                return
+            ofertas = self._por_procedimento[procedimento_id]
+            ofertas.vagas[ofertas.ids == oferta_id] = vagas
+
+    def candidatos(self, procedimento_id: int, hoje: date):
+        """
+        Devolve as ofertas com vagas do procedimento a partir de hoje, no mesmo formato
+        de agent._buscar_candidatos.
+        """
+        with self._lock:
+            ofertas = self._por_procedimento.get(procedimento_id)
+            if ofertas is None:
+                return None
+            inicio = int(np.searchsorted(ofertas.datas, _dia(hoje), side="left"))
+            abertas = np.flatnonzero(ofertas.vagas[inicio:] > 0) + inicio
+            if len(abertas) == 0:
+                return None
+            return Candidatos(
+                ofertas.ids[abertas],
+                ofertas.datas[abertas],
+                ofertas.unidade_ids[abertas],
+                ofertas.lats[abertas],
+                ofertas.lons[abertas],
+                ofertas.vagas[abertas],
+            )
+
+    def iniciar_sincronizacao_periodica(self, session_factory, intervalo: float = INVENTARIO_SYNC_SEGUNDOS):
+        """Inicia uma thread que ressincroniza o índice com o banco a cada 'intervalo' segundos."""
+        if self._thread is not None or intervalo <= 0:
+            return
+
+        def _loop():
+            while not self._parar.wait(intervalo):
+                db = session_factory()
+                try:
+                    self.sincronizar(db)
+                except Exception as e:
+                    logger.error("Erro ao ressincronizar o inventário de vagas: %s", e)
+                finally:
+                    db.close()
+
+        self._parar.clear()
+        self._thread = threading.Thread(target=_loop, name="inventario-sync", daemon=True)
+        self._thread.start()
+
+    def parar_sincronizacao_periodica(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+# Instância única do processo, compartilhada pelo agente e pelo crud
+inventario = InventarioVagas()
@@ -1,52 +1,171 @@
 # Versão final e completa de services/regulation_service/src/main.py
 
-from typing import Annotated
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
+import asyncio
+import logging
+import os
+import threading
+from datetime import date
+from typing import Annotated, Literal
+from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Nossas importações
 from . import security, models, schemas, crud, agent, communication_client
-from .database import engine, SessionLocal
-from .logging_config import logger
+from .database import SessionLocal, AsyncSessionLocal, async_engine, telemetria_pools
+from .inventario import inventario
+from .referencias import referencias
+from .fila import reprocessador_fila
+from .outbox import despachante_outbox
+from .exportacao import EXPORTACAO_LOTE, exportar_async, resposta_exportacao
+from .paginacao import LISTAGEM_LIMITE_MAXIMO, LISTAGEM_LIMITE_PADRAO, codificar_cursor, decodificar_cursor
+from .metricas import instrumentar_app
+from .rastreamento import configurar_rastreamento, rastrear_app
+from .logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
 
 # --- Lógica de Inicialização ---
+setup_logging("regulation-service")
+configurar_rastreamento("regulation-service")
 app = FastAPI(
     title="Regulation Service",
     description="Serviço principal para a lógica de negócio da regulação de saúde.",
     version="1.0.0",
 )
+instrumentar_app(app)
+rastrear_app(app)
+security.instrumentar_recarga_chaves(app)
+
+# Intervalo entre tentativas de aquecer os caches enquanto o banco não responde
+AQUECIMENTO_RETENTATIVA_SEGUNDOS = float(os.getenv("AQUECIMENTO_RETENTATIVA_SEGUNDOS", "5"))
+
+# Sinaliza que os caches deste processo já foram carregados (usado pelo /pronto)
+caches_aquecidos = threading.Event()
+_parar_aquecimento = threading.Event()
+
+def _carregar_caches():
+    db = SessionLocal()
+    try:
+        referencias.carregar(db)
+        inventario.sincronizar(db)
+    finally:
+        db.close()
+
+def _aquecer_caches():
+    """
+    Carrega o cache de referência e o inventário e inicia as tarefas periódicas.
+    Roda em segundo plano, tentando de novo enquanto o banco não estiver pronto;
+    até terminar, o agente consulta o banco diretamente.
+    """
+    while not _parar_aquecimento.is_set():
+        try:
+            _carregar_caches()
+        except Exception as e:
+            logger.warning("Falha ao aquecer os caches (%s); nova tentativa em %ss.", e, AQUECIMENTO_RETENTATIVA_SEGUNDOS)
+            _parar_aquecimento.wait(AQUECIMENTO_RETENTATIVA_SEGUNDOS)
+            continue
+        if _parar_aquecimento.is_set():
+            return
+        inventario.iniciar_sincronizacao_periodica(SessionLocal)
+        reprocessador_fila.iniciar(SessionLocal)
+        caches_aquecidos.set()
+        logger.info("Caches aquecidos; serviço pronto.")
+        return
 
 @app.on_event("startup")
 def on_startup():
+    # Tabelas e dados iniciais não são criados aqui, e sim pelo comando de
+    # inicialização (python -m src.inicializacao), rodado uma vez por deploy
     logger.info("Evento de STARTUP acionado.")
-    try:
-        logger.info("Criando tabelas do banco de dados...")
-        models.Base.metadata.create_all(bind=engine)
-        logger.info("Tabelas verificadas/criadas com sucesso.")
-        
-        from .data_generator import generate_fake_data
-        db = SessionLocal()
-        try:
-            generate_fake_data(db)
-        finally:
-            db.close()
-    except Exception as e:
-        logger.error(f"Erro CRÍTICO durante a inicialização: {e}")
+    security.carregar_chaves()
+    threading.Thread(target=_aquecer_caches, name="aquecimento-caches", daemon=True).start()
+
+@app.on_event("startup")
+async def iniciar_cliente_comunicacao():
+    await communication_client.iniciar()
+    despachante_outbox.iniciar(SessionLocal)
+
+@app.on_event("shutdown")
+async def encerrar_cliente_comunicacao():
+    await despachante_outbox.parar()
+    await communication_client.encerrar()
+    await async_engine.dispose()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    _parar_aquecimento.set()
+    reprocessador_fila.parar()
+    inventario.parar_sincronizacao_periodica()
+
+# Status em que uma solicitação não pode mais ser agendada pelo lote
+STATUS_FINAIS = ["AGENDADA", "CONCLUIDA", "CANCELADA"]
 
 # --- Dependência para a sessão do BD ---
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 # --- Endpoints ---
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Regulation Service is running"}
 
+@app.get("/saude")
+async def read_saude():
+    """Liveness: o processo está de pé (não consulta o banco)."""
+    return {"ok": True}
+
+@app.get("/pronto")
+async def read_pronto():
+    """
+    Readiness: 200 quando os caches deste processo já foram carregados e o banco
+    responde; 503 enquanto isso não acontece.
+    """
+    estado = {
+        "caches": caches_aquecidos.is_set(),
+        "referencias_versao": referencias.versao,
+        "inventario": inventario.pronto,
+    }
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("SELECT 1"))
+        estado["banco"] = True
+    except Exception as e:
+        logger.warning("Readiness: banco indisponível (%s).", e)
+        estado["banco"] = False
+    pronto = estado["caches"] and estado["banco"]
+    return JSONResponse({"pronto": pronto, **estado}, status_code=200 if pronto else 503)
+
+@app.get("/pool")
+async def read_pool(auth_info: dict = Depends(security.get_current_user)):
+    """Uso dos pools de conexão: conexões em uso, espera por conexão, overflow e timeouts."""
+    return telemetria_pools()
+
+def _recarregar_referencias():
+    db = SessionLocal()
+    try:
+        referencias.carregar(db)
+    finally:
+        db.close()
+
+@app.post("/referencias/invalidar")
+async def invalidate_referencias(
+    auth_info: dict = Depends(security.get_current_user)
+):
+    """
+    Recarrega o cache de unidades e procedimentos deste processo (e o índice espacial).
+    Cada worker tem o seu cache; os demais se atualizam pelo TTL (REFERENCIAS_TTL_SEGUNDOS).
+    """
+    current_user = auth_info["payload"]
+    versao_anterior = referencias.versao
+    referencias.invalidar()
+    await asyncio.to_thread(_recarregar_referencias)
+    logger.info("Usuário '%s' invalidou o cache de referência (versão %s -> %s).", current_user.username, versao_anterior, referencias.versao)
+    return {"versao": referencias.versao}
+
 @app.get("/me")
 async def read_users_me(
     auth_info: dict = Depends(security.get_current_user)
@@ -55,143 +174,300 @@ async def read_users_me(
     return {"username": current_user.username}
 
 @app.post("/solicitacoes", response_model=schemas.SolicitacaoResponse)
-def create_new_solicitacao(
+async def create_new_solicitacao(
     solicitacao: schemas.SolicitacaoCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     auth_info: dict = Depends(security.get_current_user)
 ):
     current_user = auth_info["payload"]
-    logger.info(f"Usuário '{current_user.username}' criando nova solicitação para o paciente '{solicitacao.paciente_id}'.")
-    return crud.create_solicitacao(db=db, solicitacao=solicitacao)
+    logger.info("Usuário '%s' criando nova solicitação para o paciente '%s'.", current_user.username, solicitacao.paciente_id)
+    return await crud.create_solicitacao_async(db=db, solicitacao=solicitacao)
 
 @app.put("/solicitacoes/{solicitacao_id}/status", response_model=schemas.SolicitacaoResponse)
-def update_status_solicitacao(
+async def update_status_solicitacao(
     solicitacao_id: int,
     status_update: schemas.SolicitacaoStatusUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     auth_info: dict = Depends(security.get_current_user)
 ):
     current_user = auth_info["payload"]
-    token = auth_info["token_string"]
-    logger.info(f"Usuário '{current_user.username}' atualizando status da solicitação ID {solicitacao_id} para '{status_update.status}'.")
+    logger.info("Usuário '%s' atualizando status da solicitação ID %s para '%s'.", current_user.username, solicitacao_id, status_update.status)
     
     if status_update.status in ["NEGADA", "CANCELADA"] and not status_update.justificativa:
         raise HTTPException(status_code=400, detail="Justificativa é obrigatória para status NEGADA ou CANCELADA.")
 
-    db_solicitacao = crud.get_solicitacao(db=db, solicitacao_id=solicitacao_id)
+    db_solicitacao = await crud.get_solicitacao_async(db=db, solicitacao_id=solicitacao_id)
     if not db_solicitacao:
         raise HTTPException(status_code=404, detail="Solicitação não encontrada.")
     
     if status_update.status == "ACEITA":
-        logger.info(f"Status da solicitação {solicitacao_id} mudou para ACEITA. Acionando agente inteligente...")
-        melhor_oferta = agent.find_best_slot(db=db, solicitacao=db_solicitacao)
+        logger.info("Status da solicitação %s mudou para ACEITA. Acionando agente inteligente...", solicitacao_id)
+        final_solicitacao = await agent.schedule_best_slot_async(db=db, solicitacao=db_solicitacao)
         
-        if melhor_oferta:
-            final_solicitacao = crud.create_marcacao(db=db, solicitacao=db_solicitacao, oferta=melhor_oferta)
-            logger.info(f"Agente agendou com sucesso a solicitação {solicitacao_id}. Novo status: {final_solicitacao.status}")
-            
-            marcacao = db.query(models.Marcacao).filter(models.Marcacao.solicitacao_id == final_solicitacao.id).first()
-            if marcacao:
-                oferta = db.query(models.OfertaProgramada).get(marcacao.oferta_id)
-                unidade = db.query(models.Unidade).get(oferta.unidade_id)
-                procedimento = db.query(models.Procedimento).get(oferta.procedimento_id)
-
-                mensagem = (f"Seu agendamento para '{procedimento.nome}' foi confirmado para a data {oferta.data_agendamento.strftime('%d/%m/%Y')} "
-                            f"na unidade '{unidade.nome}'. Por favor, confirme o seu agendamento.")
-                
-                communication_client.send_notification(
-                    paciente_id=final_solicitacao.paciente_id,
-                    mensagem=mensagem,
-                    token=token
-                )
-
+        if final_solicitacao:
+            # A notificação ao paciente já foi gravada na outbox junto com a marcação
+            logger.info("Agente agendou com sucesso a solicitação %s. Novo status: %s", solicitacao_id, final_solicitacao.status)
             return final_solicitacao
         else:
             status_update.status = "EM FILA"
-            logger.warning(f"Agente não encontrou vagas para a solicitação {solicitacao_id}. Status movido para EM FILA.")
+            logger.warning("Agente não encontrou vagas para a solicitação %s. Status movido para EM FILA.", solicitacao_id)
             
-    updated_solicitacao = crud.update_solicitacao_status(
+    updated_solicitacao = await crud.update_solicitacao_status_async(
         db=db, solicitacao_id=solicitacao_id, status_update=status_update
     )
     
     return updated_solicitacao
 
+def _aprovar_lote(ids: list[int], estrategia: str):
+    """
+    Parte síncrona da aprovação em lote. A alocação é intensiva em CPU (NumPy/SciPy),
+    então roda numa thread com sessão própria em vez de ocupar o event loop.
+    """
+    db = SessionLocal()
+    try:
+        solicitacoes = db.query(models.Solicitacao).filter(models.Solicitacao.id.in_(ids)).all()
+        encontradas = {s.id for s in solicitacoes}
+        nao_encontradas = [i for i in ids if i not in encontradas]
+        ignoradas = [s.id for s in solicitacoes if s.status in STATUS_FINAIS]
+        elegiveis = [s for s in solicitacoes if s.status not in STATUS_FINAIS]
+        # Guardados antes do commit, que expira os objetos (evita um SELECT por solicitação depois)
+        dados = {s: s.id for s in elegiveis}
+
+        resultado = agent.schedule_batch(db, elegiveis, estrategia)
+        if resultado is None:
+            return None
+        alocacoes, sem_vaga = resultado
+        return schemas.AprovacaoLoteResponse(
+            agendadas=[dados[s] for s, _ in alocacoes],
+            em_fila=[dados[s] for s in sem_vaga],
+            ignoradas=ignoradas,
+            nao_encontradas=nao_encontradas,
+        )
+    finally:
+        db.close()
+
+@app.post("/solicitacoes/aprovar-lote", response_model=schemas.AprovacaoLoteResponse)
+async def approve_solicitacoes_batch(
+    lote: schemas.AprovacaoLoteRequest,
+    auth_info: dict = Depends(security.get_current_user)
+):
+    """
+    Aprova várias solicitações de uma vez. As ofertas são carregadas uma única vez,
+    as vagas são distribuídas entre todo o lote e todas as marcações são gravadas
+    numa única transação. As que ficarem sem vaga vão para EM FILA.
+    """
+    current_user = auth_info["payload"]
+    logger.info("Usuário '%s' aprovando lote de %s solicitações.", current_user.username, len(lote.solicitacao_ids))
+
+    if lote.estrategia not in agent.ESTRATEGIAS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Estratégia inválida. Use uma de: {', '.join(agent.ESTRATEGIAS_LOTE)}.")
+
+    ids = list(dict.fromkeys(lote.solicitacao_ids))
+    resposta = await asyncio.to_thread(_aprovar_lote, ids, lote.estrategia)
+    if resposta is None:
+        raise HTTPException(status_code=409, detail="Não foi possível reservar as vagas do lote. Tente novamente.")
+
+    logger.info("Lote concluído: %s agendadas, %s em fila.", len(resposta.agendadas), len(resposta.em_fila))
+    return resposta
+
 @app.post("/ofertas", response_model=schemas.OfertaResponse)
-def create_new_oferta(
+async def create_new_oferta(
     oferta: schemas.OfertaCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    auth_info: dict = Depends(security.get_current_user)
+):
+    current_user = auth_info["payload"]
+    logger.info("Usuário '%s' criando nova oferta.", current_user.username)
+    db_oferta = await crud.create_oferta_async(db=db, oferta=oferta)
+
+    # As novas vagas são oferecidas às solicitações EM FILA do procedimento, em segundo plano
+    reprocessador_fila.enfileirar(db_oferta.procedimento_id, db_oferta.vagas_disponiveis)
+    return db_oferta
+
+@app.get("/solicitacoes/{solicitacao_id}/marcacao", response_model=schemas.MarcacaoResponse)
+async def read_marcacao_da_solicitacao(
+    solicitacao_id: int,
+    db: AsyncSession = Depends(get_db),
+    auth_info: dict = Depends(security.get_current_user)
+):
+    """Marcação gerada para a solicitação (a mais recente, se houver mais de uma)."""
+    db_marcacao = await crud.get_marcacao_da_solicitacao_async(db, solicitacao_id=solicitacao_id)
+    if not db_marcacao:
+        raise HTTPException(status_code=404, detail="Solicitação sem marcação.")
+    return db_marcacao
+
+# --- Listagens (painel dos reguladores) ---
+# Paginadas por chave: 'cursor' é o proximo_cursor da página anterior (ver paginacao.py)
+
+def _chave_do_cursor(cursor: str | None, *tipos):
+    """Chave guardada no cursor, convertida campo a campo por 'tipos'; None sem cursor."""
+    if cursor is None:
+        return None
+    try:
+        return tuple(tipo(valor) for tipo, valor in zip(tipos, decodificar_cursor(cursor, len(tipos))))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+
+@app.get("/solicitacoes", response_model=schemas.SolicitacaoPagina)
+async def list_solicitacoes(
+    status: str | None = None,
+    procedimento_id: str | None = None,
+    unidade_solicitante_id_cnes: str | None = None,
+    desde: date | None = None,
+    ate: date | None = None,
+    limite: int = Query(LISTAGEM_LIMITE_PADRAO, ge=1, le=LISTAGEM_LIMITE_MAXIMO),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_db),
+    auth_info: dict = Depends(security.get_current_user)
+):
+    """Solicitações, das mais recentes para as mais antigas. 'desde'/'ate' filtram pela data de criação."""
+    chave = _chave_do_cursor(cursor, int)
+    consulta = crud.consulta_solicitacoes(status, procedimento_id, unidade_solicitante_id_cnes, desde, ate,
+                                          apos=chave[0] if chave else None)
+    linhas, ha_mais = await crud.get_pagina_async(db, consulta, limite)
+    return {"itens": linhas, "proximo_cursor": codificar_cursor(linhas[-1].id) if ha_mais else None}
+
+@app.get("/ofertas", response_model=schemas.OfertaPagina)
+async def list_ofertas(
+    procedimento_id: int | None = None,
+    unidade_id: int | None = None,
+    com_vagas: bool | None = None,
+    desde: date | None = None,
+    ate: date | None = None,
+    limite: int = Query(LISTAGEM_LIMITE_PADRAO, ge=1, le=LISTAGEM_LIMITE_MAXIMO),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_db),
+    auth_info: dict = Depends(security.get_current_user)
+):
+    """Ofertas em ordem de data de agendamento. com_vagas=true traz só as abertas; 'desde'/'ate' filtram pela data de agendamento."""
+    chave = _chave_do_cursor(cursor, date.fromisoformat, int)
+    consulta = crud.consulta_ofertas(procedimento_id, unidade_id, com_vagas, desde, ate, apos=chave)
+    linhas, ha_mais = await crud.get_pagina_async(db, consulta, limite)
+    proximo = codificar_cursor(linhas[-1].data_agendamento, linhas[-1].id) if ha_mais else None
+    return {"itens": linhas, "proximo_cursor": proximo}
+
+@app.get("/marcacoes", response_model=schemas.MarcacaoPagina)
+async def list_marcacoes(
+    status: str | None = None,
+    procedimento_id: int | None = None,
+    unidade_id: int | None = None,
+    desde: date | None = None,
+    ate: date | None = None,
+    limite: int = Query(LISTAGEM_LIMITE_PADRAO, ge=1, le=LISTAGEM_LIMITE_MAXIMO),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_db),
     auth_info: dict = Depends(security.get_current_user)
 ):
+    """
+    Marcações, das mais recentes para as mais antigas, com a unidade, o procedimento e
+    a data da oferta. 'status' é o status de confirmação do paciente; 'desde'/'ate'
+    filtram pela data de agendamento.
+    """
+    chave = _chave_do_cursor(cursor, int)
+    consulta = crud.consulta_marcacoes(status, procedimento_id, unidade_id, desde, ate,
+                                       apos=chave[0] if chave else None)
+    linhas, ha_mais = await crud.get_pagina_async(db, consulta, limite)
+    return {"itens": linhas, "proximo_cursor": codificar_cursor(linhas[-1].id) if ha_mais else None}
+
+# --- Exportações (auditoria) ---
+# A tabela inteira (ou o recorte filtrado) em NDJSON ou CSV, em streaming (ver exportacao.py)
+
+async def _exportar(consulta, formato: str):
+    # Sessão própria: o streaming continua depois que o endpoint retorna
+    async with AsyncSessionLocal() as db:
+        resultado = await db.stream(consulta.execution_options(yield_per=EXPORTACAO_LOTE))
+        async for pedaco in exportar_async(resultado.partitions(), list(resultado.keys()), formato):
+            yield pedaco
+
+@app.get("/exportacoes/solicitacoes")
+async def export_solicitacoes(
+    formato: Literal["ndjson", "csv"] = "ndjson",
+    status: str | None = None,
+    desde: date | None = None,
+    ate: date | None = None,
+    auth_info: dict = Depends(security.get_current_user)
+):
+    """Todas as solicitações (com justificativa e data de atualização), filtradas por status e pela data de criação."""
     current_user = auth_info["payload"]
-    logger.info(f"Usuário '{current_user.username}' criando nova oferta.")
-    return crud.create_oferta(db=db, oferta=oferta)
+    logger.info("Usuário '%s' exportando solicitações (%s).", current_user.username, formato)
+    consulta = crud.consulta_solicitacoes(status=status, desde=desde, ate=ate, colunas=crud.COLUNAS_EXPORTACAO_SOLICITACAO)
+    return resposta_exportacao(_exportar(consulta, formato), formato, "solicitacoes")
+
+@app.get("/exportacoes/marcacoes")
+async def export_marcacoes(
+    formato: Literal["ndjson", "csv"] = "ndjson",
+    status: str | None = None,
+    desde: date | None = None,
+    ate: date | None = None,
+    auth_info: dict = Depends(security.get_current_user)
+):
+    """Todas as marcações, com os dados da oferta, filtradas pelo status de confirmação e pela data de agendamento."""
+    current_user = auth_info["payload"]
+    logger.info("Usuário '%s' exportando marcações (%s).", current_user.username, formato)
+    consulta = crud.consulta_marcacoes(status=status, desde=desde, ate=ate)
+    return resposta_exportacao(_exportar(consulta, formato), formato, "marcacoes")
 
 @app.post("/marcacoes/{marcacao_id}/confirmar", response_model=schemas.SolicitacaoResponse)
-def confirm_marcacao(
+async def confirm_marcacao(
     marcacao_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     auth_info: dict = Depends(security.get_current_user)
 ):
     current_user = auth_info["payload"]
-    logger.info(f"Ação de confirmação para marcação {marcacao_id} pelo usuário '{current_user.username}'.")
+    logger.info("Ação de confirmação para marcação %s pelo usuário '%s'.", marcacao_id, current_user.username)
     
-    db_marcacao = crud.get_marcacao(db, marcacao_id=marcacao_id)
+    db_marcacao = await crud.get_marcacao_async(db, marcacao_id=marcacao_id)
     if not db_marcacao:
         raise HTTPException(status_code=404, detail="Marcação não encontrada.")
     
-    crud.update_marcacao_status_paciente(db, db_marcacao, "CONFIRMADO")
-    db_solicitacao = crud.get_solicitacao(db, db_marcacao.solicitacao_id)
-    logger.info(f"Marcação {marcacao_id} confirmada pelo paciente.")
+    await crud.update_marcacao_status_paciente_async(db, db_marcacao, "CONFIRMADO")
+    db_solicitacao = await crud.get_solicitacao_async(db, db_marcacao.solicitacao_id)
+    logger.info("Marcação %s confirmada pelo paciente.", marcacao_id)
     return db_solicitacao
 
 @app.post("/marcacoes/{marcacao_id}/negar", response_model=schemas.SolicitacaoResponse)
-def deny_marcacao(
+async def deny_marcacao(
     marcacao_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     auth_info: dict = Depends(security.get_current_user)
 ):
     current_user = auth_info["payload"]
-    logger.info(f"Ação de negação para marcação {marcacao_id} pelo usuário '{current_user.username}'.")
+    logger.info("Ação de negação para marcação %s pelo usuário '%s'.", marcacao_id, current_user.username)
 
-    db_marcacao = crud.get_marcacao(db, marcacao_id=marcacao_id)
+    db_marcacao = await crud.get_marcacao_async(db, marcacao_id=marcacao_id)
     if not db_marcacao:
         raise HTTPException(status_code=404, detail="Marcação não encontrada.")
 
-    db_solicitacao = crud.get_solicitacao(db, db_marcacao.solicitacao_id)
+    db_solicitacao = await crud.get_solicitacao_async(db, db_marcacao.solicitacao_id)
     status_update = schemas.SolicitacaoStatusUpdate(
         status="CANCELADA",
         justificativa="Agendamento recusado pelo paciente."
     )
-    crud.update_solicitacao_status(db, db_solicitacao.id, status_update)
-    logger.info(f"Marcação {marcacao_id} negada pelo paciente. Solicitação cancelada.")
-    return crud.get_solicitacao(db, db_marcacao.solicitacao_id)
+    await crud.update_solicitacao_status_async(db, db_solicitacao.id, status_update)
+    logger.info("Marcação %s negada pelo paciente. Solicitação cancelada.", marcacao_id)
+    return await crud.get_solicitacao_async(db, db_marcacao.solicitacao_id)
 
 @app.post("/marcacoes/{marcacao_id}/concluir", response_model=schemas.SolicitacaoResponse)
-def complete_marcacao(
+async def complete_marcacao(
     marcacao_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     auth_info: dict = Depends(security.get_current_user)
 ):
     current_user = auth_info["payload"]
-    token = auth_info["token_string"]
-    logger.info(f"Ação de conclusão para marcação {marcacao_id} pelo usuário '{current_user.username}'.")
+    logger.info("Ação de conclusão para marcação %s pelo usuário '%s'.", marcacao_id, current_user.username)
 
-    db_marcacao = crud.get_marcacao(db, marcacao_id=marcacao_id)
+    db_marcacao = await crud.get_marcacao_async(db, marcacao_id=marcacao_id)
     if not db_marcacao:
         raise HTTPException(status_code=404, detail="Marcação não encontrada.")
 
-    db_solicitacao = crud.get_solicitacao(db, db_marcacao.solicitacao_id)
+    db_solicitacao = await crud.get_solicitacao_async(db, db_marcacao.solicitacao_id)
     status_update = schemas.SolicitacaoStatusUpdate(status="CONCLUIDA")
-    crud.update_solicitacao_status(db, db_solicitacao.id, status_update)
-    logger.info(f"Marcação {marcacao_id} concluída.")
     
     mensagem = (f"Olá! Vimos que seu procedimento foi concluído. "
                 f"Gostaríamos de saber sua opinião sobre o atendimento.")
     
-    communication_client.send_notification(
-        paciente_id=db_solicitacao.paciente_id,
-        mensagem=mensagem,
-        token=token
-    )
+    # O pedido de avaliação vai para a outbox na mesma transação da conclusão
+    await crud.update_solicitacao_status_async(db, db_solicitacao.id, status_update, mensagem=mensagem)
+    logger.info("Marcação %s concluída.", marcacao_id)
     
-    return crud.get_solicitacao(db, db_marcacao.solicitacao_id)
\ No newline at end of file
+    return await crud.get_solicitacao_async(db, db_marcacao.solicitacao_id)
\ No newline at end of file
@@ -0,0 +1,147 @@
+# Em services/regulation_service/src/metricas.py
+# O mesmo arquivo está em src/ de cada serviço (auth, regulation, review e
+# communication); mantenha as cópias iguais.
+"""
+Métricas no formato do Prometheus, expostas em GET /metrics.
+
+    instrumentar_app(app)       latência por rota, requisições em andamento e o /metrics
+    instrumentar_engine(engine) quantidade e duração dos comandos SQL (engine síncrona ou assíncrona)
+
+As métricas de domínio (decisão do agente, envio de notificações, cache de
+tokens) ficam aqui para que todos os serviços usem os mesmos nomes; cada uma é
+observada por quem a mede.
+O serviço de origem vem dos rótulos job/instance do próprio Prometheus.
+
+Com mais de um worker por container, defina PROMETHEUS_MULTIPROC_DIR (um
+diretório gravável, vazio ao subir) para que o /metrics some todos os processos.
+"""
+
+import os
+import time
+
+from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+CAMINHO_METRICAS = "/metrics"
+
+BALDES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BALDES_BANCO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+BALDES_CANDIDATOS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+# Comandos SQL com rótulo próprio; o resto vira "OUTRO" (evita rótulos sem limite)
+OPERACOES_SQL = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "COPY"}
+
+# --- HTTP ---
+REQUISICOES = Histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP, por rota",
+    ["metodo", "rota", "status"], buckets=BALDES_LATENCIA,
+)
+EM_ANDAMENTO = Gauge(
+    "http_requests_in_progress", "Requisições HTTP sendo atendidas agora",
+    multiprocess_mode="livesum",
+)
+
+# --- Banco ---
+CONSULTAS_BANCO = Histogram(
+    "db_query_duration_seconds", "Duração dos comandos SQL, por operação",
+    ["operacao"], buckets=BALDES_BANCO,
+)
+ERROS_BANCO = Counter("db_query_errors_total", "Comandos SQL que terminaram em erro", ["operacao"])
+
+# --- Agente (regulation-service) ---
+DECISAO_AGENTE = Histogram(
+    "agent_decision_duration_seconds", "Tempo do agente para escolher as ofertas (ranqueamento ou alocação do lote)",
+    ["modo"], buckets=BALDES_LATENCIA,
+)
+CANDIDATOS_AGENTE = Histogram(
+    "agent_candidates", "Ofertas candidatas consideradas em cada decisão do agente",
+    ["modo"], buckets=BALDES_CANDIDATOS,
+)
+
+# --- Notificações ---
+ENVIO_NOTIFICACAO = Histogram(
+    "notification_send_duration_seconds", "Latência do envio de cada notificação",
+    buckets=BALDES_LATENCIA,
+)
+FALHAS_NOTIFICACAO = Counter("notification_send_failures_total", "Envios de notificação que falharam")
+
+# --- Cache de tokens verificados (security.py) ---
+TOKENS_CACHE = Counter("auth_token_cache_lookups_total", "Consultas ao cache de tokens verificados, por resultado", ["resultado"])
+TOKENS_CACHE_DESCARTES = Counter("auth_token_cache_evictions_total", "Tokens descartados do cache por falta de espaço (LRU)")
+TOKENS_CACHE_TAMANHO = Gauge("auth_token_cache_size", "Tokens verificados em cache", multiprocess_mode="livesum")
+RECARGAS_CHAVES = Counter("auth_key_reloads_total", "Recargas das chaves de segurança")
+
+def _rota(scope):
+    """Modelo da rota (ex.: /solicitacoes/{solicitacao_id}/status), para não criar um rótulo por id."""
+    rota = scope.get("route")
+    return getattr(rota, "path", None) or "nao_encontrada"
+
+class MiddlewareMetricas:
+    """Middleware ASGI que mede cada requisição HTTP (menos o próprio /metrics)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == CAMINHO_METRICAS:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def _send(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        EM_ANDAMENTO.inc()
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            EM_ANDAMENTO.dec()
+            REQUISICOES.labels(scope["method"], _rota(scope), str(status)).observe(time.perf_counter() - inicio)
+
+def exportar() -> bytes:
+    """Texto do /metrics, somando os processos quando PROMETHEUS_MULTIPROC_DIR estiver definido."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+        return generate_latest(registro)
+    return generate_latest(REGISTRY)
+
+def instrumentar_app(app: FastAPI):
+    """Adiciona o middleware de métricas e o endpoint /metrics ao app."""
+    app.add_middleware(MiddlewareMetricas)
+
+    @app.get(CAMINHO_METRICAS, include_in_schema=False)
+    def read_metrics():
+        return Response(exportar(), media_type=CONTENT_TYPE_LATEST)
+
+def _operacao(sql: str) -> str:
+    palavra = sql.lstrip().split(None, 1)[0].upper() if sql and sql.strip() else ""
+    return palavra if palavra in OPERACOES_SQL else "OUTRO"
+
+def instrumentar_engine(engine):
+    """Mede cada comando SQL da engine (para uma AsyncEngine, a engine síncrona por baixo dela)."""
+    from sqlalchemy import event
+
+    engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        inicio = conn.info["metricas_inicio"].pop()
+        CONSULTAS_BANCO.labels(_operacao(statement)).observe(time.perf_counter() - inicio)
+
+    @event.listens_for(engine, "handle_error")
+    def _erro(contexto):
+        inicios = contexto.connection.info.get("metricas_inicio") if contexto.connection is not None else None
+        if inicios:
+            inicios.pop()
+        ERROS_BANCO.labels(_operacao(contexto.statement or "")).inc()
@@ -1,9 +1,8 @@
 # Cole este código em services/regulation_service/src/models.py
 
-from sqlalchemy import Column, Integer, String, DateTime, func, Float, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, func, Float, Date, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .database import Base
-from .data_generator import generate_fake_data
 
 class Solicitacao(Base):
     __tablename__ = "solicitacoes"
@@ -14,7 +13,7 @@ class Solicitacao(Base):
     procedimento_id = Column(String, nullable=False)
     
     # Status da regulação
-    status = Column(String, default="PENDENTE") 
+    status = Column(String, default="PENDENTE")
     
     justificativa = Column(String, nullable=True)
     
@@ -22,6 +21,31 @@ class Solicitacao(Base):
     data_criacao = Column(DateTime(timezone=True), server_default=func.now())
     data_atualizacao = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Unidade e procedimento são referenciados pelos códigos (CNES e código do
+    # procedimento), não por chave estrangeira; as relações são só de leitura
+    unidade_solicitante = relationship(
+        "Unidade", primaryjoin="foreign(Solicitacao.unidade_solicitante_id_cnes) == Unidade.cnes_id",
+        viewonly=True, lazy="raise_on_sql"
+    )
+    procedimento = relationship(
+        "Procedimento", primaryjoin="foreign(Solicitacao.procedimento_id) == Procedimento.procedimento_id",
+        viewonly=True, lazy="raise_on_sql"
+    )
+
+    # Valores gerados pelo banco (data_criacao, data_atualizacao) voltam no próprio
+    # INSERT/UPDATE (RETURNING), sem precisar de um refresh depois do commit
+    __mapper_args__ = {"eager_defaults": True}
+
+    # Varredura da fila (status + procedimento, em ordem de id) e filtros por status.
+    # Os demais servem a listagem (GET /solicitacoes), que segue a ordem de id
+    __table_args__ = (
+        Index("ix_solicitacoes_status_procedimento", "status", "procedimento_id", "id"),
+        Index("ix_solicitacoes_lista_status", "status", "id"),
+        Index("ix_solicitacoes_lista_procedimento", "procedimento_id", "id"),
+        Index("ix_solicitacoes_lista_unidade", "unidade_solicitante_id_cnes", "id"),
+        Index("ix_solicitacoes_data_criacao", "data_criacao"),
+    )
+
     # Adicionaremos mais campos aqui conforme avançamos
 
 class Unidade(Base):
@@ -47,11 +71,65 @@ class OfertaProgramada(Base):
     vagas_disponiveis = Column(Integer, default=1)
     horario = Column(String)
 
+    unidade = relationship("Unidade", lazy="raise_on_sql")
+    procedimento = relationship("Procedimento", lazy="raise_on_sql")
+
+    # Índice parcial da consulta do agente: só as ofertas com vaga entram no índice,
+    # que continua pequeno mesmo com o histórico de ofertas esgotadas crescendo.
+    # Os demais servem a listagem (GET /ofertas), em ordem de data e id
+    __table_args__ = (
+        Index("ix_ofertas_abertas", "procedimento_id", "data_agendamento",
+              postgresql_where=vagas_disponiveis > 0, sqlite_where=vagas_disponiveis > 0),
+        Index("ix_ofertas_lista_data", "data_agendamento", "id"),
+        Index("ix_ofertas_lista_procedimento", "procedimento_id", "data_agendamento", "id"),
+        Index("ix_ofertas_lista_unidade", "unidade_id", "data_agendamento", "id"),
+    )
+
 class Marcacao(Base):
     __tablename__ = "marcacoes"
     id = Column(Integer, primary_key=True, index=True)
-    solicitacao_id = Column(Integer, ForeignKey("solicitacoes.id"), nullable=False)
+    solicitacao_id = Column(Integer, ForeignKey("solicitacoes.id"), index=True, nullable=False)
     oferta_id = Column(Integer, ForeignKey("ofertas_programadas.id"), nullable=False)
     data_criacao = Column(DateTime(timezone=True), server_default=func.now())
     # O status da confirmação do paciente que planejamos
-    status_confirmacao_paciente = Column(String, default="PENDENTE")
\ No newline at end of file
+    status_confirmacao_paciente = Column(String, default="PENDENTE")
+
+    solicitacao = relationship("Solicitacao", lazy="raise_on_sql")
+    oferta = relationship("OfertaProgramada", lazy="raise_on_sql")
+
+    __mapper_args__ = {"eager_defaults": True}
+
+    # Listagem (GET /marcacoes): por status em ordem de id, e a junção com a oferta
+    __table_args__ = (
+        Index("ix_marcacoes_lista_status", "status_confirmacao_paciente", "id"),
+        Index("ix_marcacoes_oferta_id", "oferta_id"),
+    )
+
+class NotificacaoOutbox(Base):
+    """
+    Notificações a enviar ao communication-service (padrão transactional outbox).
+    São gravadas na mesma transação da marcação/mudança de status e enviadas
+    depois pelo despachante em segundo plano (outbox.py).
+    """
+    __tablename__ = "notificacoes_outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    paciente_id = Column(String, nullable=False)
+    mensagem = Column(String, nullable=False)
+    # PENDENTE -> ENVIADA, ou FALHA depois de esgotar as tentativas
+    status = Column(String, default="PENDENTE", nullable=False)
+    tentativas = Column(Integer, default=0, nullable=False)
+    proxima_tentativa = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    ultimo_erro = Column(String, nullable=True)
+    # Trace da requisição que gerou a notificação; o envio continua o mesmo trace
+    traceparent = Column(String, nullable=True)
+    data_criacao = Column(DateTime(timezone=True), server_default=func.now())
+    data_envio = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Despachante: status = 'PENDENTE' AND proxima_tentativa <= agora ORDER BY id
+        Index("ix_outbox_pendentes", "proxima_tentativa", "id",
+              postgresql_where=status == "PENDENTE", sqlite_where=status == "PENDENTE"),
+        # Limpeza: status = 'ENVIADA' AND data_envio < corte
+        Index("ix_outbox_enviadas", "data_envio",
+              postgresql_where=status == "ENVIADA", sqlite_where=status == "ENVIADA"),
+    )
@@ -0,0 +1,40 @@
+# Em services/regulation_service/src/notificacoes.py
+
+from sqlalchemy.orm import Session
+from . import models
+from .referencias import referencias
+
+def mensagem_agendamento(nome_procedimento, data_agendamento, nome_unidade):
+    """Texto enviado ao paciente quando o agente confirma um agendamento."""
+    return (f"Seu agendamento para '{nome_procedimento}' foi confirmado para a data {data_agendamento.strftime('%d/%m/%Y')} "
+            f"na unidade '{nome_unidade}'. Por favor, confirme o seu agendamento.")
+
+def mensagens_de_agendamento(db: Session, alocacoes: list, pacientes: dict):
+    """
+    Monta as mensagens de um lote de alocações [(solicitação, id da oferta)] com uma
+    única consulta. 'pacientes' mapeia cada solicitação para o id do seu paciente.
+    Retorna uma lista de (paciente_id, mensagem).
+    """
+    if not alocacoes:
+        return []
+
+    # Nomes de unidade e procedimento vêm do cache de referência
+    referencias.recarregar_se_expirado(db)
+    detalhes = {}
+    for oferta_id, data_agendamento, unidade_id, procedimento_id in db.query(
+        models.OfertaProgramada.id,
+        models.OfertaProgramada.data_agendamento,
+        models.OfertaProgramada.unidade_id,
+        models.OfertaProgramada.procedimento_id,
+    ).filter(models.OfertaProgramada.id.in_({oferta_id for _, oferta_id in alocacoes})):
+        # Unidade ou procedimento que sumiu do cadastro: a mensagem sai com o id
+        unidade = referencias.unidade(unidade_id, db)
+        procedimento = referencias.procedimento(procedimento_id, db)
+        detalhes[oferta_id] = (data_agendamento, unidade.nome if unidade else str(unidade_id),
+                               procedimento.nome if procedimento else str(procedimento_id))
+
+    mensagens = []
+    for solicitacao, oferta_id in alocacoes:
+        data_agendamento, nome_unidade, nome_procedimento = detalhes[oferta_id]
+        mensagens.append((pacientes[solicitacao], mensagem_agendamento(nome_procedimento, data_agendamento, nome_unidade)))
+    return mensagens
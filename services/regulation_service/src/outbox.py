@@ -0,0 +1,234 @@
+# Em services/regulation_service/src/outbox.py
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from jose import jwt
+from opentelemetry import trace
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from . import models, communication_client, security
+from .rastreamento import contexto_de
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+# Configuração do despachante da outbox de notificações
+OUTBOX_INTERVALO_SEGUNDOS = float(os.getenv("OUTBOX_INTERVALO_SEGUNDOS", "1"))
+OUTBOX_LOTE = int(os.getenv("OUTBOX_LOTE", "100"))
+OUTBOX_MAX_TENTATIVAS = int(os.getenv("OUTBOX_MAX_TENTATIVAS", "8"))
+OUTBOX_BACKOFF_BASE_SEGUNDOS = float(os.getenv("OUTBOX_BACKOFF_BASE_SEGUNDOS", "2"))
+OUTBOX_BACKOFF_MAX_SEGUNDOS = float(os.getenv("OUTBOX_BACKOFF_MAX_SEGUNDOS", "300"))
+# Tempo durante o qual uma linha reservada fica invisível para os outros despachantes.
+# Se o processo morrer no meio do envio, ela volta a ser enviada depois disso.
+OUTBOX_RESERVA_SEGUNDOS = float(os.getenv("OUTBOX_RESERVA_SEGUNDOS", "60"))
+# Notificações ENVIADAS são apagadas depois de OUTBOX_RETENCAO_HORAS (0 desliga a limpeza),
+# em lotes de OUTBOX_LIMPEZA_LOTE linhas, a cada OUTBOX_LIMPEZA_INTERVALO_SEGUNDOS.
+# As que terminaram em FALHA ficam, para inspeção.
+OUTBOX_RETENCAO_HORAS = float(os.getenv("OUTBOX_RETENCAO_HORAS", "72"))
+OUTBOX_LIMPEZA_LOTE = int(os.getenv("OUTBOX_LIMPEZA_LOTE", "1000"))
+OUTBOX_LIMPEZA_INTERVALO_SEGUNDOS = float(os.getenv("OUTBOX_LIMPEZA_INTERVALO_SEGUNDOS", "300"))
+
+# Validade do token que o serviço usa para se autenticar no communication-service
+TOKEN_SERVICO_MINUTOS = 30
+
+def _agora():
+    return datetime.now(timezone.utc)
+
+def calcular_backoff(tentativas: int) -> float:
+    """Espera (em segundos) antes da próxima tentativa: base * 2^tentativas, com teto."""
+    return min(OUTBOX_BACKOFF_BASE_SEGUNDOS * (2 ** tentativas), OUTBOX_BACKOFF_MAX_SEGUNDOS)
+
+class DespachanteOutbox:
+    """
+    Envia em segundo plano as notificações gravadas na outbox.
+    A cada ciclo reserva um lote de linhas PENDENTES (com SKIP LOCKED, para que
+    vários workers possam despachar ao mesmo tempo sem enviar a mesma linha),
+    envia todas concorrentemente pelo cliente compartilhado e grava o resultado.
+    Falhas são reagendadas com backoff exponencial; depois de OUTBOX_MAX_TENTATIVAS
+    a linha vai para FALHA. A entrega é "pelo menos uma vez".
+    Periodicamente, apaga as linhas ENVIADAS mais antigas que a retenção, para
+    que a tabela não cresça sem limite.
+    """
+
+    def __init__(self, tamanho_lote: int = OUTBOX_LOTE, intervalo: float = OUTBOX_INTERVALO_SEGUNDOS):
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self._tarefa: asyncio.Task | None = None
+        self._token = None
+        self._token_expira_em = None
+        self._chaves_token = None
+
+    def _token_servico(self):
+        """Token JWT do próprio serviço, reaproveitado até perto de expirar ou até as chaves serem recarregadas."""
+        agora = _agora()
+        chaves = security.carregar_chaves()
+        if chaves is None:
+            raise RuntimeError("Chaves de segurança não encontradas para gerar o token de serviço.")
+        if self._token is None or chaves is not self._chaves_token or agora >= self._token_expira_em - timedelta(minutes=1):
+            secret_key, algorithm = chaves
+            self._chaves_token = chaves
+            self._token_expira_em = agora + timedelta(minutes=TOKEN_SERVICO_MINUTOS)
+            self._token = jwt.encode(
+                {"sub": "regulation_service", "exp": self._token_expira_em}, secret_key, algorithm=algorithm
+            )
+        return self._token
+
+    def reservar_lote(self, db: Session):
+        """
+        Reserva até 'tamanho_lote' notificações prontas para envio, empurrando a
+        próxima tentativa para depois do prazo de reserva.
+        Retorna [(id, paciente_id, mensagem, tentativas, traceparent)].
+        """
+        agora = _agora()
+        linhas = db.query(models.NotificacaoOutbox).filter(
+            models.NotificacaoOutbox.status == "PENDENTE",
+            models.NotificacaoOutbox.proxima_tentativa <= agora
+        ).order_by(models.NotificacaoOutbox.id).limit(self.tamanho_lote).with_for_update(skip_locked=True).all()
+
+        reservadas = []
+        for linha in linhas:
+            linha.proxima_tentativa = agora + timedelta(seconds=OUTBOX_RESERVA_SEGUNDOS)
+            reservadas.append((linha.id, linha.paciente_id, linha.mensagem, linha.tentativas, linha.traceparent))
+        db.commit()
+        return reservadas
+
+    def registrar_resultados(self, db: Session, resultados: list):
+        """Grava o resultado dos envios: [(id, tentativas anteriores, erro ou None)]."""
+        agora = _agora()
+        for notificacao_id, tentativas, erro in resultados:
+            linha = db.get(models.NotificacaoOutbox, notificacao_id)
+            if linha is None:
+                continue
+            linha.tentativas = tentativas + 1
+            if erro is None:
+                linha.status = "ENVIADA"
+                linha.data_envio = agora
+                linha.ultimo_erro = None
+            else:
+                linha.ultimo_erro = erro[:500]
+                if linha.tentativas >= OUTBOX_MAX_TENTATIVAS:
+                    linha.status = "FALHA"
+                    logger.error("Notificação %s descartada após %s tentativas: %s", notificacao_id, linha.tentativas, erro)
+                else:
+                    linha.proxima_tentativa = agora + timedelta(seconds=calcular_backoff(tentativas))
+        db.commit()
+
+    def limpar_enviadas(self, db: Session, limite: int = OUTBOX_LIMPEZA_LOTE) -> int:
+        """Apaga até 'limite' notificações ENVIADAS há mais de OUTBOX_RETENCAO_HORAS. Retorna quantas."""
+        corte = _agora() - timedelta(hours=OUTBOX_RETENCAO_HORAS)
+        ids = select(models.NotificacaoOutbox.id).where(
+            models.NotificacaoOutbox.status == "ENVIADA",
+            models.NotificacaoOutbox.data_envio < corte,
+        ).limit(limite)
+        apagadas = db.execute(
+            delete(models.NotificacaoOutbox).where(models.NotificacaoOutbox.id.in_(ids.scalar_subquery())),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        db.commit()
+        return apagadas
+
+    async def limpar(self, session_factory) -> int:
+        """Apaga, lote a lote, todas as notificações ENVIADAS fora da retenção. Retorna quantas."""
+        def _limpar():
+            db = session_factory()
+            try:
+                return self.limpar_enviadas(db)
+            finally:
+                db.close()
+
+        total = 0
+        while True:
+            apagadas = await asyncio.to_thread(_limpar)
+            total += apagadas
+            if apagadas < OUTBOX_LIMPEZA_LOTE:
+                break
+        if total:
+            logger.info("Outbox: %s notificações enviadas apagadas (retenção de %s h).", total, OUTBOX_RETENCAO_HORAS)
+        return total
+
+    async def _enviar(self, notificacao_id: int, paciente_id: str, mensagem: str, token: str, traceparent: str | None):
+        # O envio entra no trace da requisição que gravou a notificação
+        with tracer.start_as_current_span("outbox.enviar", context=contexto_de(traceparent),
+                                          attributes={"notificacao.id": notificacao_id}) as span:
+            try:
+                await communication_client.enviar(paciente_id, mensagem, token)
+                return None
+            except Exception as e:
+                span.record_exception(e)
+                span.set_status(trace.StatusCode.ERROR)
+                return str(e) or e.__class__.__name__
+
+    async def despachar(self, session_factory) -> int:
+        """Executa um ciclo: reserva, envia e registra um lote. Retorna quantas linhas foram processadas."""
+        def _reservar():
+            db = session_factory()
+            try:
+                return self.reservar_lote(db)
+            finally:
+                db.close()
+
+        def _registrar(resultados):
+            db = session_factory()
+            try:
+                self.registrar_resultados(db, resultados)
+            finally:
+                db.close()
+
+        reservadas = await asyncio.to_thread(_reservar)
+        if not reservadas:
+            return 0
+
+        token = self._token_servico()
+        erros = await asyncio.gather(*(
+            self._enviar(notificacao_id, paciente_id, mensagem, token, traceparent)
+            for notificacao_id, paciente_id, mensagem, _, traceparent in reservadas
+        ))
+        resultados = [
+            (notificacao_id, tentativas, erro)
+            for (notificacao_id, _, _, tentativas, _), erro in zip(reservadas, erros)
+        ]
+        await asyncio.to_thread(_registrar, resultados)
+
+        falhas = sum(erro is not None for erro in erros)
+        logger.info("Outbox: %s notificações enviadas, %s com falha.", len(reservadas) - falhas, falhas)
+        return len(reservadas)
+
+    def iniciar(self, session_factory):
+        """Inicia o laço de despacho no event loop corrente. Chamado no startup do app."""
+        if self._tarefa is not None:
+            return
+
+        async def _loop():
+            proxima_limpeza = time.monotonic()
+            while True:
+                if OUTBOX_RETENCAO_HORAS > 0 and time.monotonic() >= proxima_limpeza:
+                    proxima_limpeza = time.monotonic() + OUTBOX_LIMPEZA_INTERVALO_SEGUNDOS
+                    try:
+                        await self.limpar(session_factory)
+                    except Exception as e:
+                        logger.error("Erro ao limpar a outbox de notificações: %s", e)
+                try:
+                    processadas = await self.despachar(session_factory)
+                except Exception as e:
+                    logger.error("Erro ao despachar a outbox de notificações: %s", e)
+                    processadas = 0
+                # Lote cheio: provavelmente há mais linhas esperando, então não dorme
+                if processadas < self.tamanho_lote:
+                    await asyncio.sleep(self.intervalo)
+
+        self._tarefa = asyncio.get_running_loop().create_task(_loop())
+
+    async def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+
+# Instância única do processo, iniciada junto com o cliente de comunicação
+despachante_outbox = DespachanteOutbox()
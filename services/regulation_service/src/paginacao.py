@@ -0,0 +1,28 @@
+# Em services/regulation_service/src/paginacao.py
+"""
+Cursor das listagens paginadas por chave (keyset).
+
+O cursor é a chave de ordenação da última linha da página, em JSON e base64
+(opaco para o cliente). A próxima página continua a partir dela com
+WHERE chave > / < :ultima, que o índice resolve direto, em vez de OFFSET,
+que lê e descarta todas as linhas das páginas anteriores.
+"""
+
+import base64
+import json
+import os
+
+LISTAGEM_LIMITE_PADRAO = int(os.getenv("LISTAGEM_LIMITE_PADRAO", "50"))
+LISTAGEM_LIMITE_MAXIMO = int(os.getenv("LISTAGEM_LIMITE_MAXIMO", "500"))
+
+def codificar_cursor(*chave) -> str:
+    """Cursor a partir da chave da última linha (datas viram texto ISO)."""
+    texto = json.dumps(chave, default=lambda valor: valor.isoformat(), separators=(",", ":"))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+def decodificar_cursor(cursor: str, tamanho: int) -> list:
+    """Chave guardada no cursor. ValueError se o cursor não for um dos nossos."""
+    chave = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    if not isinstance(chave, list) or len(chave) != tamanho:
+        raise ValueError("Cursor inválido.")
+    return chave
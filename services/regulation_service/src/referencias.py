@@ -0,0 +1,225 @@
+# Em services/regulation_service/src/referencias.py
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+import numpy as np
+from sqlalchemy.orm import Session
+from . import models
+from .indice_espacial import indice_unidades
+
+logger = logging.getLogger(__name__)
+
+# Validade (em segundos) do cache de referência. 0 = só recarrega quando invalidado.
+REFERENCIAS_TTL_SEGUNDOS = float(os.getenv("REFERENCIAS_TTL_SEGUNDOS", "0"))
+# Por quanto tempo uma chave que não existe no banco é lembrada como ausente,
+# e quantas delas são lembradas no máximo (as mais antigas saem primeiro)
+REFERENCIAS_AUSENTES_TTL_SEGUNDOS = float(os.getenv("REFERENCIAS_AUSENTES_TTL_SEGUNDOS", "30"))
+REFERENCIAS_AUSENTES_MAX = int(os.getenv("REFERENCIAS_AUSENTES_MAX", "10000"))
+
+class UnidadeRef(NamedTuple):
+    """Cópia imutável de uma unidade, segura para ser compartilhada entre threads."""
+    id: int
+    cnes_id: str
+    nome: str
+    latitude: float
+    longitude: float
+
+class ProcedimentoRef(NamedTuple):
+    """Cópia imutável de um procedimento."""
+    id: int
+    procedimento_id: str
+    nome: str
+
+def _unidade_ref(u: models.Unidade):
+    return UnidadeRef(u.id, u.cnes_id, u.nome, u.latitude, u.longitude)
+
+def _procedimento_ref(p: models.Procedimento):
+    return ProcedimentoRef(p.id, p.procedimento_id, p.nome)
+
+class _Tabelas(NamedTuple):
+    """
+    Um retrato das tabelas de referência; trocado inteiro a cada recarga.
+    Uma chave lida do banco entra nos dicionários deste retrato e num novo
+    retrato com os arrays refeitos (_replace).
+    """
+    versao: int
+    unidades_por_cnes: dict
+    unidades_por_id: dict
+    procedimentos_por_codigo: dict
+    procedimentos_por_id: dict
+    # Coordenadas das unidades em arrays, ordenados por id
+    ids: np.ndarray
+    lats: np.ndarray
+    lons: np.ndarray
+
+def _montar(versao, unidades, procedimentos):
+    unidades = sorted(unidades, key=lambda u: u.id)
+    return _Tabelas(
+        versao,
+        {u.cnes_id: u for u in unidades},
+        {u.id: u for u in unidades},
+        {p.procedimento_id: p for p in procedimentos},
+        {p.id: p for p in procedimentos},
+        np.array([u.id for u in unidades], dtype=np.int64),
+        np.array([u.latitude for u in unidades], dtype=np.float64),
+        np.array([u.longitude for u in unidades], dtype=np.float64),
+    )
+
+class CacheReferencias:
+    """
+    Cache (por processo) das tabelas de referência, Unidade e Procedimento, que
+    quase nunca mudam. É carregado no startup; as consultas do agente são
+    respondidas daqui, sem ir ao banco. Cada recarga gera uma nova versão.
+    Uma chave que não está no cache é buscada no banco e incluída (read-through),
+    então unidades e procedimentos novos aparecem sem esperar a próxima recarga.
+    Uma chave que também não está no banco fica marcada como ausente por
+    REFERENCIAS_AUSENTES_TTL_SEGUNDOS, para não voltar ao banco a cada consulta.
+
+    O que um leitor concorrente enxerga: a recarga troca o retrato inteiro. O
+    read-through não troca os dicionários; insere a chave nova neles (uma
+    atribuição por chave, atômica sob o GIL) e troca só os arrays de
+    coordenadas, junto com a versão, por um novo retrato. Quem guardou o
+    retrato antigo pode ver nos dicionários uma chave que ainda não está nos
+    seus arrays, mas os arrays estão sempre inteiros (os antigos ou os novos) e
+    uma entrada já existente nunca é alterada.
+    """
+
+    def __init__(self, ttl: float = REFERENCIAS_TTL_SEGUNDOS, ttl_ausentes: float = REFERENCIAS_AUSENTES_TTL_SEGUNDOS):
+        self.ttl = ttl
+        self.ttl_ausentes = ttl_ausentes
+        self._lock = threading.Lock()
+        self._tabelas = _montar(0, [], [])
+        self._ausentes: OrderedDict[tuple, float] = OrderedDict()
+        self._carregado_em = None
+
+    @property
+    def versao(self):
+        return self._tabelas.versao
+
+    @property
+    def pronto(self):
+        return self._carregado_em is not None
+
+    @property
+    def expirado(self):
+        """True se o cache ainda não foi carregado ou passou do TTL."""
+        if self._carregado_em is None:
+            return True
+        return self.ttl > 0 and time.monotonic() - self._carregado_em > self.ttl
+
+    def carregar(self, db: Session):
+        """(Re)carrega as duas tabelas inteiras e reconstrói o índice espacial das unidades."""
+        unidades = [_unidade_ref(u) for u in db.query(models.Unidade).all()]
+        procedimentos = [_procedimento_ref(p) for p in db.query(models.Procedimento).all()]
+        with self._lock:
+            self._tabelas = _montar(self._tabelas.versao + 1, unidades, procedimentos)
+            self._ausentes = OrderedDict()
+            self._carregado_em = time.monotonic()
+            tabelas = self._tabelas
+        indice_unidades.construir(tabelas.ids, tabelas.lats, tabelas.lons)
+        logger.info("Cache de referência carregado (versão %s): %s unidades, %s procedimentos.", tabelas.versao, len(unidades), len(procedimentos))
+
+    def recarregar_se_expirado(self, db: Session):
+        if self.expirado:
+            self.carregar(db)
+
+    def invalidar(self):
+        """Marca o cache como expirado; a próxima consulta que receber uma sessão recarrega tudo."""
+        with self._lock:
+            self._ausentes = OrderedDict()
+            self._carregado_em = None
+
+    def _incluir_unidade(self, unidade: UnidadeRef) -> UnidadeRef:
+        """Inclui uma unidade lida do banco nas tabelas e no índice espacial, sem reconstruí-los."""
+        with self._lock:
+            t = self._tabelas
+            if unidade.id in t.unidades_por_id:
+                return t.unidades_por_id[unidade.id]
+            t.unidades_por_cnes[unidade.cnes_id] = unidade
+            t.unidades_por_id[unidade.id] = unidade
+            pos = int(np.searchsorted(t.ids, unidade.id))
+            self._tabelas = t._replace(
+                versao=t.versao + 1,
+                ids=np.insert(t.ids, pos, unidade.id),
+                lats=np.insert(t.lats, pos, unidade.latitude),
+                lons=np.insert(t.lons, pos, unidade.longitude),
+            )
+        indice_unidades.adicionar(unidade.id, unidade.latitude, unidade.longitude)
+        return unidade
+
+    def _incluir_procedimento(self, procedimento: ProcedimentoRef) -> ProcedimentoRef:
+        with self._lock:
+            t = self._tabelas
+            if procedimento.id in t.procedimentos_por_id:
+                return t.procedimentos_por_id[procedimento.id]
+            t.procedimentos_por_codigo[procedimento.procedimento_id] = procedimento
+            t.procedimentos_por_id[procedimento.id] = procedimento
+            self._tabelas = t._replace(versao=t.versao + 1)
+        return procedimento
+
+    def _buscar(self, chave: tuple, buscar):
+        """Linha do banco para uma chave que faltou no cache, ou None (e a chave fica marcada como ausente)."""
+        expira_em = self._ausentes.get(chave)
+        if expira_em is not None and expira_em > time.monotonic():
+            return None
+        linha = buscar()
+        if linha is None and self.ttl_ausentes > 0:
+            with self._lock:
+                self._ausentes[chave] = time.monotonic() + self.ttl_ausentes
+                self._ausentes.move_to_end(chave)
+                while len(self._ausentes) > REFERENCIAS_AUSENTES_MAX:
+                    self._ausentes.popitem(last=False)
+        return linha
+
+    # --- Consultas ---
+    # Sem sessão, respondem só com o que está em cache. Com sessão, o que faltar
+    # é buscado no banco (read-through).
+
+    def unidade_por_cnes(self, cnes_id: str, db: Session | None = None):
+        unidade = self._tabelas.unidades_por_cnes.get(cnes_id)
+        if unidade is None and db is not None:
+            linha = self._buscar(("cnes", cnes_id), lambda: db.query(models.Unidade).filter(models.Unidade.cnes_id == cnes_id).first())
+            if linha is not None:
+                unidade = self._incluir_unidade(_unidade_ref(linha))
+        return unidade
+
+    def unidade(self, unidade_id: int, db: Session | None = None):
+        unidade = self._tabelas.unidades_por_id.get(unidade_id)
+        if unidade is None and db is not None:
+            linha = self._buscar(("unidade", unidade_id), lambda: db.get(models.Unidade, unidade_id))
+            if linha is not None:
+                unidade = self._incluir_unidade(_unidade_ref(linha))
+        return unidade
+
+    def procedimento_por_codigo(self, codigo: str, db: Session | None = None):
+        procedimento = self._tabelas.procedimentos_por_codigo.get(codigo)
+        if procedimento is None and db is not None:
+            linha = self._buscar(("codigo", codigo), lambda: db.query(models.Procedimento).filter(models.Procedimento.procedimento_id == codigo).first())
+            if linha is not None:
+                procedimento = self._incluir_procedimento(_procedimento_ref(linha))
+        return procedimento
+
+    def procedimento(self, procedimento_id: int, db: Session | None = None):
+        procedimento = self._tabelas.procedimentos_por_id.get(procedimento_id)
+        if procedimento is None and db is not None:
+            linha = self._buscar(("procedimento", procedimento_id), lambda: db.get(models.Procedimento, procedimento_id))
+            if linha is not None:
+                procedimento = self._incluir_procedimento(_procedimento_ref(linha))
+        return procedimento
+
+    def coordenadas(self, unidade_ids):
+        """Latitudes e longitudes (arrays) das unidades informadas; NaN para as desconhecidas."""
+        t = self._tabelas
+        unidade_ids = np.asarray(unidade_ids, dtype=np.int64)
+        if len(t.ids) == 0:
+            return np.full(len(unidade_ids), np.nan), np.full(len(unidade_ids), np.nan)
+        pos = np.minimum(np.searchsorted(t.ids, unidade_ids), len(t.ids) - 1)
+        encontrada = t.ids[pos] == unidade_ids
+        return np.where(encontrada, t.lats[pos], np.nan), np.where(encontrada, t.lons[pos], np.nan)
+
+# Instância única do processo, usada pelo agente, pelo crud e pelo inventário
+referencias = CacheReferencias()
@@ -1,8 +1,12 @@
 # Cole este código em services/regulation_service/src/schemas.py
 
-from pydantic import BaseModel
+import os
+from pydantic import BaseModel, Field
 from datetime import datetime, date
 
+# Máximo de solicitações por aprovação em lote; lotes maiores são recusados com 422
+APROVACAO_LOTE_MAX = int(os.getenv("APROVACAO_LOTE_MAX", "1000"))
+
 # Schema para os dados recebidos na criação de uma solicitação (entrada da API)
 class SolicitacaoCreate(BaseModel):
     paciente_id: str
@@ -41,7 +45,48 @@ class OfertaResponse(BaseModel):
     procedimento_id: int
     data_agendamento: date
     vagas_disponiveis: int
-    horario: str
+    horario: str | None = None # Ofertas geradas pelo data_generator não têm horário
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class MarcacaoResponse(BaseModel):
+    id: int
+    solicitacao_id: int
+    oferta_id: int
+    status_confirmacao_paciente: str
+    data_criacao: datetime
+
+    class Config:
+        from_attributes = True
+
+# Marcação com os dados da oferta, para as listagens
+class MarcacaoDetalhada(MarcacaoResponse):
+    unidade_id: int
+    procedimento_id: int
+    data_agendamento: date
+    horario: str | None
+
+# Páginas das listagens. proximo_cursor é None na última página
+class SolicitacaoPagina(BaseModel):
+    itens: list[SolicitacaoResponse]
+    proximo_cursor: str | None
+
+class OfertaPagina(BaseModel):
+    itens: list[OfertaResponse]
+    proximo_cursor: str | None
+
+class MarcacaoPagina(BaseModel):
+    itens: list[MarcacaoDetalhada]
+    proximo_cursor: str | None
+
+# Schema para a aprovação de várias solicitações de uma vez
+class AprovacaoLoteRequest(BaseModel):
+    solicitacao_ids: list[int] = Field(..., min_length=1, max_length=APROVACAO_LOTE_MAX)
+    estrategia: str = "prioridade" # "prioridade" (gulosa) ou "custo_minimo" (alocação global)
+
+class AprovacaoLoteResponse(BaseModel):
+    agendadas: list[int]
+    em_fila: list[int]
+    ignoradas: list[int] # Já estavam agendadas, concluídas ou canceladas
+    nao_encontradas: list[int]
\ No newline at end of file
@@ -1,5 +1,6 @@
 # Cole este código em services/review_service/src/crud.py
 
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from . import models, schemas
 
@@ -9,4 +10,16 @@ def create_review(db: Session, review: schemas.ReviewCreate):
     db.add(db_review)
     db.commit()
     db.refresh(db_review)
-    return db_review
\ No newline at end of file
+    return db_review
+
+def consulta_reviews(nota_min: int | None = None, nota_max: int | None = None, paciente_id: str | None = None):
+    """Avaliações filtradas, em ordem de id, lidas como tuplas (sem o ORM) para a exportação."""
+    review = models.Review
+    consulta = select(review.id, review.marcacao_id, review.paciente_id, review.nota, review.comentario)
+    if nota_min is not None:
+        consulta = consulta.where(review.nota >= nota_min)
+    if nota_max is not None:
+        consulta = consulta.where(review.nota <= nota_max)
+    if paciente_id is not None:
+        consulta = consulta.where(review.paciente_id == paciente_id)
+    return consulta.order_by(review.id)
@@ -1,22 +1,122 @@
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from sqlalchemy import create_engine, exc
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from .metricas import instrumentar_engine
+from .rastreamento import rastrear_engine
 
 # Carrega as variáveis de ambiente para conexão com o BD
 POSTGRES_USER = os.getenv("POSTGRES_USER", "admin")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "admin")
 POSTGRES_DB = os.getenv("POSTGRES_DB", "sus_hackathon_db")
-DB_HOST = "db_postgres" # Usamos o nome do serviço do docker-compose
-DB_PORT = "5432"
+DB_HOST = os.getenv("DB_HOST", "db_postgres") # Por padrão, o nome do serviço do docker-compose
+DB_PORT = os.getenv("DB_PORT", "5432")
+
+# Configuração do pool de conexões
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Espera máxima por uma conexão livre
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "sim")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Segundos; -1 desliga
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 = sem limite
 
 SQLALCHEMY_DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{DB_HOST}:{DB_PORT}/{POSTGRES_DB}"
 
+class TelemetriaPool:
+    """
+    Contadores de uso do pool de conexões de uma engine: quantas conexões foram
+    pedidas, quanto tempo se esperou por elas, quantas precisaram abrir conexões
+    além do pool_size (overflow) e quantas desistiram por timeout.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.overflows = 0
+        self.timeouts = 0
+
+    def registrar(self, espera: float, overflow: bool = False, timeout: bool = False):
+        with self._lock:
+            if timeout:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+            self.overflows += overflow
+
+    def resumo(self, pool):
+        with self._lock:
+            return {
+                "tamanho": pool.size(),
+                "em_uso": pool.checkedout(),
+                "livres": pool.checkedin(),
+                "overflow_atual": max(pool.overflow(), 0),
+                "checkouts": self.checkouts,
+                "espera_media_ms": round(1000 * self.espera_total / self.checkouts, 3) if self.checkouts else 0.0,
+                "espera_max_ms": round(1000 * self.espera_max, 3),
+                "eventos_overflow": self.overflows,
+                "timeouts": self.timeouts,
+            }
+
+def _pool_com_telemetria(base):
+    """
+    Subclasse do pool que mede a espera de cada checkout. A telemetria fica na
+    classe (e não na instância) para sobreviver ao pool.recreate() do engine.dispose().
+    """
+    class PoolComTelemetria(base):
+        telemetria = TelemetriaPool()
+
+        def _do_get(self):
+            inicio = time.perf_counter()
+            overflow_antes = self.overflow()
+            try:
+                conexao = super()._do_get()
+            except exc.TimeoutError:
+                self.telemetria.registrar(time.perf_counter() - inicio, timeout=True)
+                raise
+            overflow_depois = self.overflow()
+            self.telemetria.registrar(time.perf_counter() - inicio,
+                                      overflow=overflow_depois > 0 and overflow_depois > overflow_antes)
+            return conexao
+
+    return PoolComTelemetria
+
+def _opcoes_pool(base):
+    return {
+        "poolclass": _pool_com_telemetria(base),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+# O statement_timeout é aplicado pelo próprio Postgres em cada conexão
+_connect_args = {}
+if DB_STATEMENT_TIMEOUT_MS > 0:
+    _connect_args = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+
 # Cria a "engine" de conexão do SQLAlchemy
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=_connect_args, **_opcoes_pool(QueuePool))
 
 # Cria uma fábrica de sessões (SessionLocal) para interagir com o BD
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Quantidade e duração dos comandos SQL, no /metrics e nos traces
+instrumentar_engine(engine)
+rastrear_engine(engine)
+
+def telemetria_pools():
+    """Estado e contadores dos pools de conexão deste serviço."""
+    return {
+        "sync": engine.pool.telemetria.resumo(engine.pool),
+    }
+
 # Base declarativa que será usada pelos nossos modelos de tabela
 Base = declarative_base()
\ No newline at end of file
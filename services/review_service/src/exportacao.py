@@ -0,0 +1,59 @@
+# Em services/review_service/src/exportacao.py
+# O mesmo arquivo está em src/ do regulation e do review; mantenha as cópias iguais.
+"""
+Exportação de tabelas inteiras em NDJSON ou CSV, em streaming.
+
+A consulta é lida por um cursor do lado do servidor em partições de
+EXPORTACAO_LOTE linhas (yield_per), e cada partição vira um pedaço da
+resposta assim que chega. Só uma partição fica em memória por vez, seja qual
+for o tamanho da tabela. As linhas não passam pelo ORM: são tuplas das colunas.
+"""
+
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+
+from fastapi.responses import StreamingResponse
+
+EXPORTACAO_LOTE = int(os.getenv("EXPORTACAO_LOTE", "1000"))
+
+FORMATOS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+def _texto(valor):
+    return valor.isoformat() if isinstance(valor, (date, datetime)) else valor
+
+def _ndjson(colunas, linhas) -> str:
+    return "".join(
+        json.dumps(dict(zip(colunas, linha)), ensure_ascii=False, default=_texto) + "\n" for linha in linhas
+    )
+
+def _csv(linhas) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows([_texto(valor) for valor in linha] for linha in linhas)
+    return buffer.getvalue()
+
+def _pedaco(formato, colunas, linhas) -> str:
+    return _ndjson(colunas, linhas) if formato == "ndjson" else _csv(linhas)
+
+def exportar(particoes, colunas, formato: str):
+    """Pedaços do arquivo a partir das partições (listas de linhas) de um resultado com yield_per."""
+    if formato == "csv":
+        yield _csv([colunas])
+    for linhas in particoes:
+        yield _pedaco(formato, colunas, linhas)
+
+async def exportar_async(particoes, colunas, formato: str):
+    """Versão assíncrona de exportar, para as partições de um AsyncResult (AsyncSession.stream)."""
+    if formato == "csv":
+        yield _csv([colunas])
+    async for linhas in particoes:
+        yield _pedaco(formato, colunas, linhas)
+
+def resposta_exportacao(pedacos, formato: str, nome: str):
+    """StreamingResponse para download, com o nome do arquivo (ex.: solicitacoes.csv)."""
+    return StreamingResponse(
+        pedacos, media_type=FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nome}.{formato}"'},
+    )
@@ -0,0 +1,41 @@
+# Em services/review_service/src/inicializacao.py
+"""
+Inicialização do banco do review-service.
+
+Comando único, rodado uma vez por deploy antes de subir os workers (no
+docker-compose, o serviço review_init). Antes a tabela era criada na
+importação do main.py, por todo worker e toda réplica.
+
+Uso (a partir de services/review_service):
+    python -m src.inicializacao
+"""
+
+import argparse
+import logging
+
+from sqlalchemy import create_engine
+
+from . import models
+from .database import SQLALCHEMY_DATABASE_URL
+from .logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+def inicializar(url: str = SQLALCHEMY_DATABASE_URL):
+    """Cria as tabelas que ainda não existem."""
+    engine = create_engine(url)
+    try:
+        models.Base.metadata.create_all(bind=engine)
+    finally:
+        engine.dispose()
+    logger.info("Tabelas verificadas/criadas com sucesso.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Cria as tabelas do review-service.")
+    parser.add_argument("--url", default=SQLALCHEMY_DATABASE_URL, help="URL SQLAlchemy (padrão: a do serviço)")
+    args = parser.parse_args()
+    setup_logging("review-init")
+    inicializar(args.url)
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,40 @@
 # Cole este código em services/review_service/src/main.py
 
-from typing import Annotated
-from fastapi import FastAPI, Depends, HTTPException
+import logging
+from typing import Annotated, Literal
+from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 # Nossas importações
 from . import security, models, schemas, crud
-from .database import engine, SessionLocal
-from .logging_config import logger
+from .database import SessionLocal, telemetria_pools
+from .exportacao import EXPORTACAO_LOTE, exportar, resposta_exportacao
+from .metricas import instrumentar_app
+from .rastreamento import configurar_rastreamento, rastrear_app
+from .logging_config import setup_logging
+
+logger = logging.getLogger(__name__)
 
 # --- Lógica de Inicialização ---
-# Cria a tabela 'reviews' quando o serviço inicia
-models.Base.metadata.create_all(bind=engine)
+# A tabela 'reviews' é criada pelo comando de inicialização (python -m src.inicializacao),
+# rodado uma vez por deploy, e não mais na importação deste módulo
 
+setup_logging("review-service")
+configurar_rastreamento("review-service")
 app = FastAPI(
     title="Review Service",
     description="Serviço para coletar avaliações de pacientes.",
     version="1.0.0"
 )
+instrumentar_app(app)
+rastrear_app(app)
+security.instrumentar_recarga_chaves(app)
+
+@app.on_event("startup")
+def on_startup():
+    security.carregar_chaves()
 
 # --- Dependência para a sessão do BD ---
 def get_db():
@@ -27,19 +44,67 @@ def get_db():
     finally:
         db.close()
 
+@app.get("/saude")
+def read_saude():
+    """Liveness: o processo está de pé (não consulta o banco)."""
+    return {"ok": True}
+
+@app.get("/pronto")
+def read_pronto(db: Session = Depends(get_db)):
+    """Readiness: 200 quando o banco responde, 503 caso contrário."""
+    try:
+        db.execute(text("SELECT 1"))
+    except Exception as e:
+        logger.warning("Readiness: banco indisponível (%s).", e)
+        return JSONResponse({"pronto": False, "banco": False}, status_code=503)
+    return {"pronto": True, "banco": True}
+
+@app.get("/pool")
+def read_pool(auth_info: dict = Depends(security.get_current_user)):
+    """Uso do pool de conexões: conexões em uso, espera por conexão, overflow e timeouts."""
+    return telemetria_pools()
+
 # --- Endpoint Principal ---
 @app.post("/reviews", response_model=schemas.ReviewResponse)
 def submit_review(
     review: schemas.ReviewCreate,
     db: Session = Depends(get_db),
-    current_user: security.TokenData = Depends(security.get_current_user)
+    auth_info: dict = Depends(security.get_current_user)
 ):
     """
     Submete uma nova avaliação para um agendamento concluído.
     - Requer autenticação.
     """
-    logger.info(f"Usuário '{current_user.username}' submetendo avaliação para a marcação ID {review.marcacao_id}.")
+    current_user = auth_info["payload"]
+    logger.info("Usuário '%s' submetendo avaliação para a marcação ID %s.", current_user.username, review.marcacao_id)
     
     # Em um sistema real, verificaríamos se a marcação realmente existe e se pertence ao paciente
     
-    return crud.create_review(db=db, review=review)
\ No newline at end of file
+    return crud.create_review(db=db, review=review)
+
+# --- Exportação (auditoria) ---
+def _exportar(consulta, formato: str):
+    # Sessão própria: o streaming continua depois que o endpoint retorna
+    db = SessionLocal()
+    try:
+        resultado = db.execute(consulta.execution_options(yield_per=EXPORTACAO_LOTE))
+        yield from exportar(resultado.partitions(), list(resultado.keys()), formato)
+    finally:
+        db.close()
+
+@app.get("/exportacoes/reviews")
+def export_reviews(
+    formato: Literal["ndjson", "csv"] = "ndjson",
+    nota_min: int | None = Query(None, ge=1, le=5),
+    nota_max: int | None = Query(None, ge=1, le=5),
+    paciente_id: str | None = None,
+    auth_info: dict = Depends(security.get_current_user)
+):
+    """
+    Todas as avaliações, em NDJSON ou CSV, em streaming (ver exportacao.py).
+    A tabela não tem data nem status; os filtros são a nota e o paciente.
+    """
+    current_user = auth_info["payload"]
+    logger.info("Usuário '%s' exportando avaliações (%s).", current_user.username, formato)
+    consulta = crud.consulta_reviews(nota_min, nota_max, paciente_id)
+    return resposta_exportacao(_exportar(consulta, formato), formato, "reviews")
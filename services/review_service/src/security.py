@@ -1,12 +1,25 @@
 # Cole este código em TODOS os seus arquivos security.py
 # (regulation-service, communication-service, review-service)
 
+import hashlib
+import logging
 import os
-from fastapi import Depends, HTTPException, status
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Depends, FastAPI, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from pydantic import BaseModel
 
+from .metricas import RECARGAS_CHAVES, TOKENS_CACHE, TOKENS_CACHE_DESCARTES, TOKENS_CACHE_TAMANHO
+
+logger = logging.getLogger(__name__)
+
+# Configuração do cache de tokens já verificados
+TOKEN_CACHE_MAX = int(os.getenv("TOKEN_CACHE_MAX", "10000"))
+TOKEN_CACHE_TTL_SEGUNDOS = float(os.getenv("TOKEN_CACHE_TTL_SEGUNDOS", "300"))
+
 # --- Modelo Pydantic (continua o mesmo) ---
 class TokenData(BaseModel):
     username: str | None = None
@@ -14,36 +27,147 @@ class TokenData(BaseModel):
 # --- Esquema de Segurança (continua o mesmo) ---
 security_scheme = HTTPBearer()
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security_scheme)):
+# --- Chaves de segurança ---
+# Lidas uma única vez (no startup ou no primeiro uso) em vez de a cada requisição.
+# Com SECRET_KEY_FILE (ex.: um secret do Docker), a chave vem do arquivo, que
+# pode ser trocado numa rotação; POST /seguranca/recarregar-chaves faz o processo relê-lo.
+_chaves: tuple[str, str] | None = None
+
+def _ler_secret_key():
+    caminho = os.getenv("SECRET_KEY_FILE")
+    if caminho:
+        with open(caminho) as f:
+            return f.read().strip()
+    return os.getenv("SECRET_KEY")
+
+def carregar_chaves():
+    """Lê a chave secreta e o JWT_ALGORITHM, se ainda não foram lidos."""
+    global _chaves
+    if _chaves is None:
+        secret_key = _ler_secret_key()
+        algorithm = os.getenv("JWT_ALGORITHM")
+        if secret_key and algorithm:
+            _chaves = (secret_key, algorithm)
+    return _chaves
+
+def recarregar_chaves():
+    """Relê as chaves (ex.: após uma rotação) e descarta os tokens em cache."""
+    global _chaves
+    _chaves = None
+    cache_tokens.limpar()
+    RECARGAS_CHAVES.inc()
+    return carregar_chaves()
+
+class CacheTokens:
     """
-    Dependência de segurança que lê as variáveis de ambiente no momento da execução.
+    Cache LRU, limitado em tamanho, dos tokens já verificados, indexado pelo hash
+    do token. Cada entrada vale até o menor entre o 'exp' do token e o TTL do
+    cache, então um token expirado nunca é aceito a partir do cache.
+    Acertos, falhas, descartes e tamanho vão para o /metrics (auth_token_cache_*).
     """
-    # --- LEITURA TARDIA DAS VARIÁVEIS DE AMBIENTE ---
-    # Movemos a leitura para DENTRO da função.
-    secret_key = os.getenv("SECRET_KEY")
-    algorithm = os.getenv("JWT_ALGORITHM")
+
+    def __init__(self, tamanho_max: int = TOKEN_CACHE_MAX, ttl: float = TOKEN_CACHE_TTL_SEGUNDOS):
+        self.tamanho_max = tamanho_max
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas: OrderedDict[bytes, tuple[TokenData, float]] = OrderedDict()
+        self._acertos = TOKENS_CACHE.labels("acerto")
+        self._falhas = TOKENS_CACHE.labels("falha")
+
+    @staticmethod
+    def _chave(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def obter(self, token: str):
+        """Devolve o TokenData do token se ele estiver em cache e válido, senão None."""
+        chave = self._chave(token)
+        agora = time.time()
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[1] > agora:
+                self._entradas.move_to_end(chave)
+                self._acertos.inc()
+                return entrada[0]
+            if entrada is not None:
+                del self._entradas[chave]
+                TOKENS_CACHE_TAMANHO.set(len(self._entradas))
+            self._falhas.inc()
+            return None
+
+    def guardar(self, token: str, token_data: TokenData, exp: float | None):
+        if self.tamanho_max <= 0:
+            return
+        expira_em = time.time() + self.ttl
+        if exp is not None:
+            expira_em = min(expira_em, float(exp))
+        chave = self._chave(token)
+        with self._lock:
+            self._entradas[chave] = (token_data, expira_em)
+            self._entradas.move_to_end(chave)
+            descartados = len(self._entradas) - self.tamanho_max
+            for _ in range(descartados):
+                self._entradas.popitem(last=False)
+            if descartados > 0:
+                TOKENS_CACHE_DESCARTES.inc(descartados)
+            TOKENS_CACHE_TAMANHO.set(len(self._entradas))
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            TOKENS_CACHE_TAMANHO.set(0)
+
+# Instância única do processo
+cache_tokens = CacheTokens()
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security_scheme)):
+    """
+    Dependência de segurança (assíncrona: roda direto no event loop, sem passar
+    pelo threadpool). Tokens já verificados são atendidos pelo cache;
+    os demais passam pela verificação completa do JWT.
+    """
+    chaves = carregar_chaves()
 
     # Adicionamos uma verificação para garantir que as chaves foram carregadas
-    if not secret_key or not algorithm:
+    if chaves is None:
         raise HTTPException(
             status_code=500,
             detail="Configuração interna do servidor incompleta (chaves de segurança não encontradas)."
         )
+    secret_key, algorithm = chaves
 
     token = credentials.credentials
-    
+
+    token_data = cache_tokens.obter(token)
+    if token_data is not None:
+        return {"payload": token_data, "token_string": token}
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Token inválido ou expirado",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, secret_key, algorithms=[algorithm]) # Usamos as variáveis locais
+        payload = jwt.decode(token, secret_key, algorithms=[algorithm])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    
-    return {"payload": token_data, "token_string": token}
\ No newline at end of file
+
+    cache_tokens.guardar(token, token_data, payload.get("exp"))
+    return {"payload": token_data, "token_string": token}
+
+def instrumentar_recarga_chaves(app: FastAPI):
+    """Adiciona ao app o POST /seguranca/recarregar-chaves, autenticado com a chave atual."""
+
+    @app.post("/seguranca/recarregar-chaves")
+    async def reload_keys(auth_info: dict = Depends(get_current_user)):
+        """
+        Relê a chave de segurança deste processo e esvazia o cache de tokens.
+        Cada worker tem as suas chaves; chame uma vez por worker.
+        """
+        if recarregar_chaves() is None:
+            raise HTTPException(status_code=500, detail="Chaves de segurança não encontradas após a recarga.")
+        logger.info("Usuário '%s' recarregou as chaves de segurança.", auth_info["payload"].username)
+        return {"recarregadas": True}
@@ -1,11 +1,52 @@
-# Cole este código completo em simulator.py
+# Em simulador.py
+"""
+Gerador de carga do ecossistema (simulador de uso).
 
+Cada chegada é a jornada completa de um paciente, passando por todos os atores:
+    solicitante  cria a solicitação
+    regulador    aprova (ACEITA) ou nega
+    paciente     consulta a marcação e confirma ou recusa o agendamento
+    unidade      conclui o atendimento
+    paciente     avalia o atendimento (review-service)
+Em paralelo, o gerador de ofertas publica novas vagas.
+
+As chegadas são em laço aberto (processo de Poisson, --taxa jornadas/s): o
+ritmo não depende de o sistema estar dando conta. --concorrencia limita as
+requisições em voo; o tempo esperando por uma vaga entra na latência, que é
+contada a partir do instante em que a requisição deveria ter saído, para que
+a fila do lado do cliente não esconda a lentidão do sistema.
+
+Ao final mostra e grava (--saida) um relatório JSON com vazão, taxa de erro e
+latências p50/p95/p99 por endpoint, calculadas a partir de histogramas no
+estilo HDR.
+
+Com --gravar, cada requisição emitida vai para um arquivo JSONL; com
+--reproduzir, um arquivo desses é reemitido contra os serviços, em tempo real,
+N vezes mais rápido ou na velocidade máxima, com os mesmos intervalos entre
+chegadas e os ids trocados pelos criados na nova execução. Serve para
+reproduzir incidentes e comparar versões com exatamente o mesmo tráfego (os
+serviços devem ter os mesmos dados de referência, ex.: src.gerador_massa com a
+mesma seed).
+
+Uso:
+    python simulador.py --taxa 20 --duracao 120 --concorrencia 200 --saida relatorio.json
+    python simulador.py --taxa 0.01 --taxa-ofertas 0.003 --pausa-media 60   # ritmo de demonstração
+    python simulador.py --taxa 20 --duracao 120 --gravar trafego.jsonl
+    python simulador.py --reproduzir trafego.jsonl --velocidade 4 --saida relatorio_v2.json
+"""
+
+import argparse
 import asyncio
-import httpx
-import random
+import json
 import logging
-from faker import Faker
-from datetime import date, timedelta, datetime
+import math
+import random
+import sys
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+import httpx
 
 # --- Configuração ---
 logging.basicConfig(
@@ -14,122 +55,539 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 logger = logging.getLogger("SIMULATOR")
+# Uma linha de log por requisição atrapalharia a própria medição
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 API_AUTH_URL = "http://localhost:8000"
 API_REGULATION_URL = "http://localhost:8001"
 API_REVIEW_URL = "http://localhost:8002"
-API_COMMUNICATION_URL = "http://localhost:8003" # Adicionado para chamadas diretas se necessário
 
 REGULADOR_USER = "regulador"
 REGULADOR_PASSWORD = "hackathon_password"
 
-fake = Faker('pt_BR')
+# Comportamento dos atores
+PROB_NEGAR = 0.10       # regulador nega a solicitação
+PROB_CONFIRMAR = 0.75   # paciente confirma o agendamento...
+PROB_RECUSAR = 0.15     # ...ou recusa (no resto dos casos não responde)
+PROB_AVALIAR = 0.80     # paciente avalia depois da conclusão
+CONCORRENCIA_PADRAO = 100
+JUSTIFICATIVAS = ["Dados incompletos.", "Prioridade baixa.", "Encaminhamento incorreto."]
+
+# Endpoints exercitados: serviço de destino, tipo do {id} da rota, tipo do "id" devolvido
+# na resposta e campos do corpo que carregam ids. Na reprodução de um tráfego gravado,
+# os tipos dizem como trocar os ids da gravação pelos ids criados na nova execução.
+ENDPOINTS = {
+    "POST /solicitacoes": ("regulation", None, "solicitacao", {}),
+    "PUT /solicitacoes/{id}/status": ("regulation", "solicitacao", None, {}),
+    "GET /solicitacoes/{id}/marcacao": ("regulation", "solicitacao", "marcacao", {}),
+    "POST /marcacoes/{id}/confirmar": ("regulation", "marcacao", None, {}),
+    "POST /marcacoes/{id}/negar": ("regulation", "marcacao", None, {}),
+    "POST /marcacoes/{id}/concluir": ("regulation", "marcacao", None, {}),
+    "POST /ofertas": ("regulation", None, "oferta", {}),
+    "POST /reviews": ("review", None, None, {"marcacao_id": "marcacao"}),
+}
+
+class HistogramaLatencia:
+    """
+    Histograma de latências no estilo HDR: baldes log-lineares com 3 dígitos
+    significativos (erro relativo abaixo de 0,1%), de 1 µs até horas, com
+    memória proporcional só ao número de baldes ocupados.
+    """
+
+    SUB_BALDES = 2048
+    METADE = SUB_BALDES // 2
 
-class APIClient:
-    """Um cliente para interagir com nossa arquitetura de microsserviços."""
     def __init__(self):
-        self._client = httpx.AsyncClient(timeout=30.0)
+        self.contagens = Counter()
+        self.total = 0
+        self.soma_us = 0
+        self.maximo_us = 0
+
+    @classmethod
+    def _indice(cls, valor_us: int):
+        if valor_us < cls.SUB_BALDES:
+            return valor_us
+        magnitude = valor_us.bit_length() - 11
+        return cls.SUB_BALDES + (magnitude - 1) * cls.METADE + ((valor_us >> magnitude) - cls.METADE)
+
+    @classmethod
+    def _valor(cls, indice: int):
+        """Maior valor (µs) que cai no balde."""
+        if indice < cls.SUB_BALDES:
+            return indice
+        magnitude, resto = divmod(indice - cls.SUB_BALDES, cls.METADE)
+        magnitude += 1
+        return ((resto + cls.METADE + 1) << magnitude) - 1
+
+    def registrar(self, segundos: float):
+        valor_us = max(int(segundos * 1_000_000), 0)
+        self.contagens[self._indice(valor_us)] += 1
+        self.total += 1
+        self.soma_us += valor_us
+        self.maximo_us = max(self.maximo_us, valor_us)
+
+    def juntar(self, outro: "HistogramaLatencia"):
+        self.contagens.update(outro.contagens)
+        self.total += outro.total
+        self.soma_us += outro.soma_us
+        self.maximo_us = max(self.maximo_us, outro.maximo_us)
+
+    def percentil(self, p: float):
+        """Latência (µs) abaixo da qual estão p% das medidas."""
+        if not self.total:
+            return 0
+        alvo = max(math.ceil(p / 100 * self.total), 1)
+        acumulado = 0
+        for indice in sorted(self.contagens):
+            acumulado += self.contagens[indice]
+            if acumulado >= alvo:
+                return min(self._valor(indice), self.maximo_us)
+        return self.maximo_us
+
+    def resumo(self):
+        """Latências em milissegundos."""
+        ms = lambda us: round(us / 1000, 3)
+        return {
+            "p50": ms(self.percentil(50)),
+            "p95": ms(self.percentil(95)),
+            "p99": ms(self.percentil(99)),
+            "max": ms(self.maximo_us),
+            "media": ms(self.soma_us / self.total) if self.total else 0.0,
+        }
+
+    def baldes(self):
+        """[[limite superior em µs, contagem], ...] dos baldes ocupados."""
+        return [[self._valor(i), self.contagens[i]] for i in sorted(self.contagens)]
+
+class MetricasEndpoint:
+    def __init__(self):
+        self.histograma = HistogramaLatencia()
+        self.erros = 0
+        self.status = Counter()
+
+    def relatorio(self, janela: float):
+        requisicoes = self.histograma.total
+        return {
+            "requisicoes": requisicoes,
+            "erros": self.erros,
+            "taxa_erro": round(self.erros / requisicoes, 4) if requisicoes else 0.0,
+            "vazao_rps": round(requisicoes / janela, 2),
+            "latencia_ms": self.histograma.resumo(),
+            "status": dict(sorted(self.status.items())),
+            "histograma_us": self.histograma.baldes(),
+        }
+
+class GravadorTrafego:
+    """
+    Grava cada requisição emitida em JSONL: uma linha de cabeçalho com a
+    configuração e uma linha por requisição, na ordem em que terminaram, com o
+    instante previsto de envio ('t', segundos desde o início, e 'ts', época),
+    endpoint, id da rota, corpo, status, latência e o id devolvido na resposta.
+    """
+
+    VERSAO = 1
+
+    def __init__(self, caminho: str, config: dict):
+        self._arquivo = open(caminho, "w", encoding="utf-8")
+        self.requisicoes = 0
+        self._escrever({"tipo": "cabecalho", "versao": self.VERSAO,
+                        "gravado_em": datetime.now(timezone.utc).isoformat(), "config": config})
+
+    def _escrever(self, linha: dict):
+        self._arquivo.write(json.dumps(linha, ensure_ascii=False) + "\n")
+
+    def registrar(self, endpoint, t, id_rota, corpo, status, latencia, resposta_id):
+        self.requisicoes += 1
+        self._escrever({
+            "tipo": "requisicao", "t": round(t, 6), "ts": round(time.time() - latencia, 6),
+            "endpoint": endpoint, "id": id_rota, "corpo": corpo, "status": status,
+            "latencia_ms": round(latencia * 1000, 3), "resposta_id": resposta_id,
+        })
+
+    def fechar(self):
+        self._arquivo.close()
+
+def ler_trafego(caminho: str):
+    """Lê um arquivo gravado com --gravar. Retorna (cabeçalho, requisições em ordem de envio)."""
+    cabecalho, registros = {}, []
+    with open(caminho, encoding="utf-8") as f:
+        for numero, linha in enumerate(f, 1):
+            if not linha.strip():
+                continue
+            registro = json.loads(linha)
+            if registro.get("tipo") == "cabecalho":
+                cabecalho = registro
+            elif registro.get("endpoint") in ENDPOINTS:
+                registros.append(registro)
+            else:
+                logger.warning(f"{caminho}:{numero}: endpoint desconhecido ({registro.get('endpoint')}); linha ignorada.")
+    registros.sort(key=lambda r: r["t"])
+    return cabecalho, registros
+
+class Simulador:
+    """Dispara as jornadas e o gerador de ofertas e coleta as métricas por endpoint."""
+
+    def __init__(self, args):
+        self.args = args
+        self.rnd = random.Random(args.seed)
         self.token = None
+        self.metricas: dict[str, MetricasEndpoint] = {}
+        self.jornadas = Counter()
+        self.reproducao = Counter()
+        self.janela = args.duracao
+        self._limite = asyncio.Semaphore(args.concorrencia)
+        limites = httpx.Limits(max_connections=args.concorrencia, max_keepalive_connections=args.concorrencia)
+        self._client = httpx.AsyncClient(timeout=args.timeout, limits=limites)
+        self._proximo_paciente = 0
+        self.inicio = self.inicio_medicao = self.fim_medicao = None
+        self.gravador = None
+        self._urls = {"regulation": args.regulation_url, "review": args.review_url}
 
-    async def authenticate(self):
-        """Obtém um token de autenticação e o armazena."""
+    async def autenticar(self):
+        """Obtém um token de autenticação (fora das medidas)."""
         logger.info("[AUTH] Tentando autenticar...")
         try:
             response = await self._client.post(
-                f"{API_AUTH_URL}/token",
+                f"{self.args.auth_url}/token",
                 data={"username": REGULADOR_USER, "password": REGULADOR_PASSWORD}
             )
             response.raise_for_status()
             self.token = response.json()["access_token"]
             logger.info("[AUTH] Autenticação bem-sucedida.")
-        except httpx.RequestError as e:
+        except httpx.HTTPError as e:
             logger.error(f"[AUTH] Erro ao autenticar: {e}")
-            self.token = None
 
-    @property
-    def _headers(self):
-        if not self.token:
-            raise Exception("Cliente não autenticado.")
-        return {"Authorization": f"Bearer {self.token}"}
+    def _medir(self, endpoint, previsto, latencia, status, ok):
+        if not (self.inicio_medicao <= previsto < self.fim_medicao):
+            return
+        metricas = self.metricas.setdefault(endpoint, MetricasEndpoint())
+        metricas.histograma.registrar(latencia)
+        metricas.status[status] += 1
+        if not ok:
+            metricas.erros += 1
 
-    async def make_request(self, method, url, **kwargs):
-        """Helper para fazer requisições autenticadas."""
-        try:
-            response = await self._client.request(method, url, headers=self._headers, **kwargs)
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            logger.error(f"Erro na requisição para {url}: {e.response.status_code} - {e.response.text}")
-        except httpx.RequestError as e:
-            logger.error(f"Erro de conexão para {url}: {e}")
-        return None
-
-# --- Atores Assíncronos ---
-
-async def solicitante_e_regulador_actor(client: APIClient, state: dict):
-    """ATOR 1 & 2: Cria uma solicitação e imediatamente a aprova ou nega."""
-    while True:
-        logger.info("[SOLICITANTE] Ator iniciado...")
-        payload = {
-            "paciente_id": f"PACIENTE_{fake.unique.random_int(min=1000, max=9999)}",
-            "unidade_solicitante_id_cnes": f"CNES_{random.randint(1, 10)}",
-            "procedimento_id": f"PROC_{random.randint(1, 4)}"
-        }
-        solicitacao = await client.make_request("post", f"{API_REGULATION_URL}/solicitacoes", json=payload)
-        
-        if solicitacao:
-            logger.info(f"[REGULADOR] Analisando solicitação {solicitacao['id']}...")
-            if random.random() < 0.10: # 10% de chance de negar
-                justificativas = ["Dados incompletos.", "Prioridade baixa.", "Encaminhamento incorreto."]
-                await client.make_request(
-                    "put", f"{API_REGULATION_URL}/solicitacoes/{solicitacao['id']}/status",
-                    json={"status": "NEGADA", "justificativa": random.choice(justificativas)}
-                )
-            else:
-                await client.make_request(
-                    "put", f"{API_REGULATION_URL}/solicitacoes/{solicitacao['id']}/status",
-                    json={"status": "ACEITA"}
+    async def requisitar(self, endpoint: str, previsto: float | None = None, id_rota: int | None = None, json=None):
+        """
+        Faz uma requisição autenticada a um dos ENDPOINTS e mede a latência desde
+        'previsto' (o instante em que ela deveria ter saído). Com --gravar, a
+        requisição vai para o arquivo de tráfego. Retorna o JSON da resposta, ou
+        None em caso de erro.
+        """
+        previsto = time.perf_counter() if previsto is None else previsto
+        metodo, rota = endpoint.split(" ", 1)
+        url = self._urls[ENDPOINTS[endpoint][0]] + rota.replace("{id}", str(id_rota))
+        dados = None
+        async with self._limite:
+            try:
+                response = await self._client.request(
+                    metodo, url, headers={"Authorization": f"Bearer {self.token}"}, json=json
                 )
-        await asyncio.sleep(120) # A cada 2 minutos
-
-async def gerador_de_ofertas_actor(client: APIClient, state: dict):
-    """ATOR 3: Cria novas ofertas de vagas periodicamente."""
-    while True:
-        logger.info("[GERADOR DE OFERTAS] Ator iniciado...")
-        for _ in range(random.randint(2, 5)): # Cria de 2 a 5 novas ofertas
-            payload = {
-                "unidade_id": random.randint(1, 10),
-                "procedimento_id": random.randint(1, 4),
-                "data_agendamento": (date.today() + timedelta(days=random.randint(1, 45))).isoformat(),
-                "vagas_disponiveis": random.randint(10, 20),
-                "horario": f"{random.randint(8, 17):02d}:{random.choice(['00', '30'])}"
-            }
-            await client.make_request("post", f"{API_REGULATION_URL}/ofertas", json=payload)
-        logger.info("[GERADOR DE OFERTAS] Novas ofertas criadas.")
-        await asyncio.sleep(300) # A cada 5 minutos
-
-# ... (outros atores seguiriam o mesmo padrão) ...
-
-async def main():
-    """Função principal que inicia todos os atores."""
-    client = APIClient()
-    await client.authenticate()
-    
-    if not client.token:
+                status, ok = str(response.status_code), response.status_code < 400
+                dados = response.json() if ok else None
+            except (httpx.HTTPError, ValueError) as e:
+                status, ok = type(e).__name__, False
+        latencia = time.perf_counter() - previsto
+        self._medir(endpoint, previsto, latencia, status, ok)
+        if self.gravador:
+            self.gravador.registrar(endpoint, previsto - self.inicio, id_rota, json, status, latencia,
+                                    dados.get("id") if isinstance(dados, dict) else None)
+        if not ok:
+            logger.debug(f"{endpoint}: {status}")
+        return dados
+
+    async def _pausa(self):
+        """Tempo de 'pensar' do ator antes do próximo passo; devolve o instante previsto do passo."""
+        if self.args.pausa_media > 0:
+            await asyncio.sleep(self.rnd.expovariate(1 / self.args.pausa_media))
+        return time.perf_counter()
+
+    # --- Atores ---
+
+    async def jornada(self, previsto: float):
+        """Uma solicitação do início ao fim: solicitante, regulador, paciente, unidade e avaliação."""
+        rnd = self.rnd
+        self.jornadas["iniciadas"] += 1
+        self._proximo_paciente += 1
+        paciente_id = f"PACIENTE_SIM_{self.args.seed}_{self._proximo_paciente}"
+
+        # Solicitante
+        solicitacao = await self.requisitar("POST /solicitacoes", previsto, json={
+            "paciente_id": paciente_id,
+            "unidade_solicitante_id_cnes": f"CNES_{rnd.randint(1, self.args.unidades)}",
+            "procedimento_id": f"PROC_{rnd.randint(1, self.args.procedimentos)}",
+        })
+        if not solicitacao:
+            self.jornadas["interrompidas"] += 1
+            return
+        sid = solicitacao["id"]
+
+        # Regulador
+        previsto = await self._pausa()
+        if rnd.random() < PROB_NEGAR:
+            await self.requisitar("PUT /solicitacoes/{id}/status", previsto, sid,
+                                  json={"status": "NEGADA", "justificativa": rnd.choice(JUSTIFICATIVAS)})
+            self.jornadas["negadas"] += 1
+            return
+        resultado = await self.requisitar("PUT /solicitacoes/{id}/status", previsto, sid, json={"status": "ACEITA"})
+        if not resultado or resultado["status"] != "AGENDADA":
+            self.jornadas["em_fila" if resultado else "interrompidas"] += 1
+            return
+
+        # Paciente: descobre a marcação e responde
+        previsto = await self._pausa()
+        marcacao = await self.requisitar("GET /solicitacoes/{id}/marcacao", previsto, sid)
+        if not marcacao:
+            self.jornadas["interrompidas"] += 1
+            return
+        mid = marcacao["id"]
+        sorteio = rnd.random()
+        if sorteio >= PROB_CONFIRMAR + PROB_RECUSAR:
+            self.jornadas["sem_resposta"] += 1
+            return
+        previsto = await self._pausa()
+        if sorteio >= PROB_CONFIRMAR:
+            await self.requisitar("POST /marcacoes/{id}/negar", previsto, mid)
+            self.jornadas["recusadas"] += 1
+            return
+        if not await self.requisitar("POST /marcacoes/{id}/confirmar", previsto, mid):
+            self.jornadas["interrompidas"] += 1
+            return
+
+        # Unidade conclui o atendimento
+        previsto = await self._pausa()
+        if not await self.requisitar("POST /marcacoes/{id}/concluir", previsto, mid):
+            self.jornadas["interrompidas"] += 1
+            return
+
+        # Paciente avalia
+        if rnd.random() < PROB_AVALIAR:
+            previsto = await self._pausa()
+            await self.requisitar("POST /reviews", previsto, json={
+                "marcacao_id": mid, "paciente_id": paciente_id,
+                "nota": rnd.randint(1, 5), "comentario": "Avaliação gerada pelo simulador.",
+            })
+        self.jornadas["concluidas"] += 1
+
+    async def oferta(self, previsto: float):
+        """Gerador de ofertas: publica uma nova agenda com vagas."""
+        rnd = self.rnd
+        await self.requisitar("POST /ofertas", previsto, json={
+            "unidade_id": rnd.randint(1, self.args.unidades),
+            "procedimento_id": rnd.randint(1, self.args.procedimentos),
+            "data_agendamento": (date.today() + timedelta(days=rnd.randint(1, 45))).isoformat(),
+            "vagas_disponiveis": rnd.randint(10, 20),
+            "horario": f"{rnd.randint(8, 17):02d}:{rnd.choice(['00', '30'])}",
+        })
+
+    async def _chegadas(self, taxa: float, ator, tarefas: set):
+        """Processo de Poisson em laço aberto: dispara 'ator' sem esperar as chegadas anteriores."""
+        if taxa <= 0:
+            return
+        proxima = time.perf_counter()
+        while True:
+            proxima += self.rnd.expovariate(taxa)
+            if proxima >= self.fim_medicao:
+                return
+            await asyncio.sleep(max(proxima - time.perf_counter(), 0))
+            tarefa = asyncio.create_task(ator(proxima))
+            tarefas.add(tarefa)
+            tarefa.add_done_callback(tarefas.discard)
+
+    async def _drenar(self, tarefas: set):
+        """Espera as tarefas em andamento terminarem; cancela as que passarem do prazo. Retorna quantas foram canceladas."""
+        if not tarefas:
+            return 0
+        _, pendentes = await asyncio.wait(set(tarefas), timeout=self.args.drenagem)
+        for tarefa in pendentes:
+            tarefa.cancel()
+        return len(pendentes)
+
+    async def executar(self):
+        inicio = self.inicio = time.perf_counter()
+        self.inicio_medicao = inicio + self.args.aquecimento
+        self.fim_medicao = self.inicio_medicao + self.args.duracao
+        tarefas = set()
+        logger.info(f"🚀 Carga: {self.args.taxa} jornadas/s e {self.args.taxa_ofertas} ofertas/s por "
+                    f"{self.args.aquecimento + self.args.duracao:.0f}s (concorrência máxima {self.args.concorrencia}).")
+        await asyncio.gather(
+            self._chegadas(self.args.taxa, self.jornada, tarefas),
+            self._chegadas(self.args.taxa_ofertas, self.oferta, tarefas),
+        )
+        self.jornadas["canceladas_no_fim"] += await self._drenar(tarefas)
+
+    async def reproduzir(self, registros: list[dict], velocidade: float):
+        """
+        Reemite um tráfego gravado, respeitando os intervalos entre as requisições
+        divididos por 'velocidade' (0 = o mais rápido possível, limitado por
+        --concorrencia). Requisições sobre a mesma entidade (solicitação,
+        marcação, oferta) saem na ordem da gravação, cada uma depois que a
+        anterior terminou. Os ids criados na gravação são trocados pelos criados
+        agora, e uma requisição é pulada se a que criaria o seu id falhou. Ids que
+        o tráfego não criou (dados pré-existentes) são usados como estão.
+        """
+        criados_na_gravacao = {
+            (ENDPOINTS[r["endpoint"]][2], r["resposta_id"])
+            for r in registros if ENDPOINTS[r["endpoint"]][2] and r.get("resposta_id") is not None
+        }
+        novos_ids = {}
+
+        def _referencias(registro):
+            """[(tipo, id gravado, campo do corpo ou None para o {id} da rota)]"""
+            _, tipo_rota, _, campos = ENDPOINTS[registro["endpoint"]]
+            corpo = registro.get("corpo") or {}
+            refs = [(tipo_rota, registro["id"], None)] if tipo_rota and registro.get("id") is not None else []
+            return refs + [(tipo, corpo[campo], campo) for campo, tipo in campos.items() if corpo.get(campo) is not None]
+
+        async def _uma(registro, previsto, anteriores):
+            if anteriores and not all(t.done() for t in anteriores):
+                await asyncio.wait(anteriores)
+                # O tempo esperando a requisição anterior da mesma jornada não é latência desta
+                previsto = max(previsto, time.perf_counter())
+
+            id_rota, corpo = registro.get("id"), registro.get("corpo")
+            corpo = dict(corpo) if corpo is not None else None
+            for tipo, gravado, campo in _referencias(registro):
+                if (tipo, gravado) not in criados_na_gravacao:
+                    continue
+                novo = novos_ids.get((tipo, gravado))
+                if novo is None:
+                    self.reproducao["puladas"] += 1
+                    return
+                if campo is None:
+                    id_rota = novo
+                else:
+                    corpo[campo] = novo
+
+            self.reproducao["reemitidas"] += 1
+            dados = await self.requisitar(registro["endpoint"], previsto, id_rota, json=corpo)
+            tipo_resposta = ENDPOINTS[registro["endpoint"]][2]
+            if tipo_resposta and registro.get("resposta_id") is not None and isinstance(dados, dict):
+                novos_ids[(tipo_resposta, registro["resposta_id"])] = dados.get("id")
+
+        inicio = self.inicio = self.inicio_medicao = time.perf_counter()
+        self.fim_medicao = math.inf
+        tarefas = set()
+        ultima_por_entidade = {}
+        logger.info(f"🔁 Reproduzindo {len(registros)} requisições "
+                    f"({f'{velocidade}x' if velocidade > 0 else 'velocidade máxima'}, concorrência máxima {self.args.concorrencia}).")
+        t0 = registros[0]["t"] if registros else 0.0
+        for registro in registros:
+            previsto = inicio + ((registro["t"] - t0) / velocidade if velocidade > 0 else 0.0)
+            await asyncio.sleep(max(previsto - time.perf_counter(), 0))
+
+            entidades = {(tipo, gravado) for tipo, gravado, _ in _referencias(registro)}
+            tipo_resposta = ENDPOINTS[registro["endpoint"]][2]
+            if tipo_resposta and registro.get("resposta_id") is not None:
+                entidades.add((tipo_resposta, registro["resposta_id"]))
+            anteriores = {ultima_por_entidade[e] for e in entidades if e in ultima_por_entidade}
+
+            tarefa = asyncio.create_task(_uma(registro, previsto, anteriores))
+            for entidade in entidades:
+                ultima_por_entidade[entidade] = tarefa
+            tarefas.add(tarefa)
+            tarefa.add_done_callback(tarefas.discard)
+        self.reproducao["canceladas_no_fim"] += await self._drenar(tarefas)
+        self.janela = max(time.perf_counter() - inicio, 1e-9)
+
+    async def fechar(self):
+        await self._client.aclose()
+        if self.gravador:
+            self.gravador.fechar()
+
+    def relatorio(self):
+        janela = self.janela
+        total = MetricasEndpoint()
+        for m in self.metricas.values():
+            total.histograma.juntar(m.histograma)
+            total.erros += m.erros
+            total.status.update(m.status)
+        return {
+            "config": {k: v for k, v in vars(self.args).items() if k != "saida"},
+            "modo": "reproducao" if self.args.reproduzir else "carga",
+            "janela_medicao_s": round(janela, 3),
+            "jornadas": dict(self.jornadas),
+            "reproducao": dict(self.reproducao),
+            "requisicoes_gravadas": self.gravador.requisicoes if self.gravador else 0,
+            "total": total.relatorio(janela),
+            "endpoints": {nome: m.relatorio(janela) for nome, m in sorted(self.metricas.items())},
+        }
+
+def imprimir_resumo(relatorio):
+    linhas = [f"{'endpoint':<34} {'req':>7} {'req/s':>8} {'erro %':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+    for nome, r in [*relatorio["endpoints"].items(), ("TOTAL", relatorio["total"])]:
+        lat = r["latencia_ms"]
+        linhas.append(f"{nome:<34} {r['requisicoes']:>7} {r['vazao_rps']:>8.1f} {100 * r['taxa_erro']:>7.2f} "
+                      f"{lat['p50']:>9.1f} {lat['p95']:>9.1f} {lat['p99']:>9.1f}")
+    print("\n".join(linhas), file=sys.stderr)
+    if relatorio["modo"] == "reproducao":
+        print(f"reprodução: {relatorio['reproducao']}", file=sys.stderr)
+    else:
+        print(f"jornadas: {relatorio['jornadas']}", file=sys.stderr)
+
+async def main(args):
+    """Função principal: gera carga (ou reproduz um tráfego gravado) e emite o relatório."""
+    cabecalho, registros = ler_trafego(args.reproduzir) if args.reproduzir else ({}, None)
+    if args.concorrencia is None:
+        # Na reprodução, o padrão é a mesma concorrência máxima da gravação
+        args.concorrencia = cabecalho.get("config", {}).get("concorrencia") or CONCORRENCIA_PADRAO
+
+    simulador = Simulador(args)
+    await simulador.autenticar()
+
+    if not simulador.token:
         logger.fatal("Não foi possível autenticar. Encerrando o simulador.")
-        return
+        await simulador.fechar()
+        return 1
+
+    if args.gravar:
+        config = {k: v for k, v in vars(args).items() if k not in ("saida", "gravar")}
+        simulador.gravador = GravadorTrafego(args.gravar, config)
+    try:
+        if registros is not None:
+            await simulador.reproduzir(registros, args.velocidade)
+        else:
+            await simulador.executar()
+    finally:
+        await simulador.fechar()
+    if args.gravar:
+        logger.info(f"{simulador.gravador.requisicoes} requisições gravadas em {args.gravar}.")
 
-    state = {"marcacoes_pendentes": [], "marcacoes_concluidas": []} 
+    relatorio = simulador.relatorio()
+    imprimir_resumo(relatorio)
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+        logger.info(f"Relatório gravado em {args.saida}.")
+    else:
+        print(json.dumps(relatorio, ensure_ascii=False))
+    return 0
 
-    logger.info("🚀 Iniciando todos os atores do simulador...")
-    # Cria e inicia as tarefas
-    task1 = asyncio.create_task(solicitante_e_regulador_actor(client, state))
-    task2 = asyncio.create_task(gerador_de_ofertas_actor(client, state))
-    
-    await asyncio.gather(task1, task2)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Gerador de carga (laço aberto) do ecossistema de regulação.")
+    parser.add_argument("--taxa", type=float, default=5.0, help="Jornadas de paciente iniciadas por segundo (Poisson)")
+    parser.add_argument("--taxa-ofertas", type=float, default=0.5, help="Ofertas publicadas por segundo (Poisson)")
+    parser.add_argument("--concorrencia", type=int, help=f"Máximo de requisições em voo (padrão: {CONCORRENCIA_PADRAO}, "
+                                                          "ou o da gravação ao reproduzir)")
+    parser.add_argument("--duracao", type=float, default=60, help="Segundos de medição")
+    parser.add_argument("--aquecimento", type=float, default=5, help="Segundos iniciais fora das medidas")
+    parser.add_argument("--drenagem", type=float, default=30, help="Segundos para as jornadas em andamento terminarem")
+    parser.add_argument("--pausa-media", type=float, default=0.5, help="Pausa média (s) entre os passos de uma jornada")
+    parser.add_argument("--timeout", type=float, default=30, help="Timeout (s) de cada requisição")
+    parser.add_argument("--unidades", type=int, default=10, help="Unidades existentes (CNES_1..N)")
+    parser.add_argument("--procedimentos", type=int, default=4, help="Procedimentos existentes (PROC_1..N)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--auth-url", default=API_AUTH_URL)
+    parser.add_argument("--regulation-url", default=API_REGULATION_URL)
+    parser.add_argument("--review-url", default=API_REVIEW_URL)
+    parser.add_argument("--saida", help="Arquivo do relatório JSON (padrão: stdout)")
+    parser.add_argument("--gravar", metavar="ARQUIVO", help="Grava cada requisição emitida (JSONL) para reprodução")
+    parser.add_argument("--reproduzir", metavar="ARQUIVO", help="Reemite um tráfego gravado em vez de gerar carga")
+    parser.add_argument("--velocidade", type=float, default=1.0,
+                        help="Na reprodução: 1 = tempo real, N = N vezes mais rápido, 0 = o mais rápido possível")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        sys.exit(asyncio.run(main(parse_args())))
     except KeyboardInterrupt:
         logger.info("Simulador encerrado pelo usuário.")